@@ -100,4 +100,7 @@ if __name__ == '__main__':
     app.exec()
     # Сброс stdout (метод OutputBuffer класса)
     sys.stdout.reset()
+    if TRACE:
+        for statistic in tracemalloc.take_snapshot().statistics('lineno')[:10]:
+            print_d(statistic)
     tracemalloc.stop()
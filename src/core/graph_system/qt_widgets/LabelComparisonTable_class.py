@@ -0,0 +1,72 @@
+from typing import Optional, List
+
+import numpy as np
+
+from PyQt6 import QtCore
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem
+
+from src.function_lib.label_comparison import LabelComparison
+
+
+class LabelComparisonTable(QWidget):
+    """
+    Окно сравнения разбиений: ARI над диагональю, NMI под диагональю
+    """
+    runSelected = QtCore.pyqtSignal(int)
+
+    def __init__(self, *args, **kwargs):
+        super(LabelComparisonTable, self).__init__(*args, **kwargs)
+        self.setWindowTitle("Сравнение запусков")
+        self.resize(700, 400)
+        self.run_indexes: List[int] = []
+
+        self.label_info = QLabel("", self)
+        self.label_info.setWordWrap(True)
+        self.table = QTableWidget(self)
+        self.table.cellDoubleClicked.connect(self.on_cell_double_clicked)
+
+        self.widget_layout = QVBoxLayout(self)
+        self.widget_layout.addWidget(self.label_info)
+        self.widget_layout.addWidget(self.table)
+
+    def set_result(self,
+                   names: List[str],
+                   run_indexes: List[int],
+                   ari: np.ndarray,
+                   nmi: np.ndarray,
+                   last: Optional[LabelComparison]) -> None:
+        """
+        :param names: Подписи запусков
+        :param run_indexes: Номера запусков в истории
+        :param ari: Матрица ARI (k, k)
+        :param nmi: Матрица NMI (k, k)
+        :param last: Сравнение последнего запуска с предыдущим
+        """
+        self.run_indexes = run_indexes
+        self.table.clear()
+        self.table.setRowCount(len(names))
+        self.table.setColumnCount(len(names))
+        self.table.setHorizontalHeaderLabels([str(position + 1) for position in range(len(names))])
+        self.table.setVerticalHeaderLabels([f"{position + 1}: {name}" for position, name in enumerate(names)])
+        for row in range(len(names)):
+            for column in range(len(names)):
+                if row == column:
+                    item = QTableWidgetItem("-")
+                else:
+                    value: float = ari[row, column] if row < column else nmi[row, column]
+                    item = QTableWidgetItem(f"{value:.3f}")
+                    item.setToolTip("ARI" if row < column else "NMI")
+                    # От красного (0) к зелёному (1)
+                    item.setBackground(QColor.fromHsvF(max(0.0, min(1.0, value)) / 3, 0.5, 0.9))
+                item.setFlags(item.flags() & ~QtCore.Qt.ItemFlag.ItemIsEditable)
+                self.table.setItem(row, column, item)
+        self.table.resizeColumnsToContents()
+        text: str = "Над диагональю - ARI, под диагональю - NMI. Двойной щелчок - показать запуск строки."
+        if last is not None:
+            text += f"\nПоследний запуск против предыдущего: {last}"
+        self.label_info.setText(text)
+
+    def on_cell_double_clicked(self, row: int, _: int) -> None:
+        if row < len(self.run_indexes):
+            self.runSelected.emit(self.run_indexes[row])
@@ -1,22 +1,27 @@
 import math
 import random
+from typing import Optional
 
 import numpy as np
 
 from PyQt6 import QtCore
-from PyQt6.QtCore import pyqtSlot, QEvent
+from PyQt6.QtCore import pyqtSlot, QEvent, QObject, Qt
 from PyQt6.QtGui import QPaintEvent, QPainter, QBrush, QColor, QMouseEvent, QFontMetrics
 from PyQt6.QtWidgets import QWidget, QToolTip, QLabel, QVBoxLayout
 import pyqtgraph as pg
 import pyqtgraph.opengl as gl
 
 from src.core.log_system import print_d
+from src.function_lib.rasterizer import Camera
+from src.function_lib.point_picking import ScreenIndex
 
 
 class PointGraph3D(QWidget):
     valueChanged = QtCore.pyqtSignal(int)
     onMouseRelease = QtCore.pyqtSignal()
     onMousePress = QtCore.pyqtSignal()
+    # Индекс точки под курсором, -1 - курсор не над точкой
+    pointHovered = QtCore.pyqtSignal(int)
 
     def __init__(self, *args, **kwargs):
         super(PointGraph3D, self).__init__(*args, **kwargs)
@@ -37,3 +42,70 @@ class PointGraph3D(QWidget):
         self.widget_layout = QVBoxLayout(self)
         self.widget_layout.addWidget(self.view)
 
+        # Индекс точек на экране строится при первом наведении после изменения камеры, размера или точек
+        self.pick_points: Optional[np.ndarray] = None
+        self.pick_index: Optional[ScreenIndex] = None
+        self.pick_key: Optional[tuple] = None
+        self.hovered_point: int = -1
+        self.view.setMouseTracking(True)
+        self.view.installEventFilter(self)
+
+    def camera(self) -> Camera:
+        opts: dict = self.view.opts
+        center = opts['center']
+        return Camera(distance=opts['distance'], elevation=opts['elevation'], azimuth=opts['azimuth'],
+                      center=(center.x(), center.y(), center.z()), fov=opts['fov'])
+
+    def set_pick_points(self, points: Optional[np.ndarray]) -> None:
+        """
+        Точки для выбора курсором. Индекс сбрасывается, только если изменился сам массив
+
+        :param points: Точки (N, 3) или None
+        :return: None
+        """
+        if points is self.pick_points:
+            return
+        self.pick_points = points
+        self.pick_index = None
+        self.set_hovered_point(-1)
+
+    def screen_index(self) -> Optional[ScreenIndex]:
+        if self.pick_points is None or not self.pick_points.shape[0]:
+            return None
+        camera: Camera = self.camera()
+        key: tuple = (camera.distance, camera.elevation, camera.azimuth, camera.center, camera.fov,
+                      self.view.width(), self.view.height())
+        if self.pick_index is None or key != self.pick_key:
+            self.pick_index = ScreenIndex(self.pick_points, camera, self.view.width(), self.view.height())
+            self.pick_key = key
+        return self.pick_index
+
+    def pick_point(self, x: float, y: float) -> int:
+        """
+        Точка под экранной позицией виджета `view`
+
+        :param x: Позиция по горизонтали
+        :param y: Позиция по вертикали
+        :return: Индекс точки или -1
+        """
+        index: Optional[ScreenIndex] = self.screen_index()
+        point: Optional[int] = index.nearest(x, y) if index is not None else None
+        return point if point is not None else -1
+
+    def set_hovered_point(self, point: int) -> None:
+        if point != self.hovered_point:
+            self.hovered_point = point
+            self.pointHovered.emit(point)
+
+    def eventFilter(self, obj: QObject, event: QEvent) -> bool:
+        if obj is self.view:
+            if event.type() == QEvent.Type.MouseMove:
+                # При вращении и сдвиге камеры точка не выбирается
+                if event.buttons() == Qt.MouseButton.NoButton:
+                    self.set_hovered_point(self.pick_point(event.position().x(), event.position().y()))
+                else:
+                    self.set_hovered_point(-1)
+            elif event.type() in (QEvent.Type.Leave, QEvent.Type.Wheel):
+                self.set_hovered_point(-1)
+        return super(PointGraph3D, self).eventFilter(obj, event)
+
@@ -0,0 +1,59 @@
+from typing import Optional
+
+import numpy as np
+
+from PyQt6 import QtCore
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel
+import pyqtgraph as pg
+
+from src.function_lib.threshold_sweep import ThresholdSweepResult
+
+
+class ThresholdSweepPlot(QWidget):
+    """
+    Окно с кривыми перебора порогов: количество кластеров, размеры кластеров и стабильность меток
+    """
+    thresholdSelected = QtCore.pyqtSignal(float)
+
+    def __init__(self, *args, **kwargs):
+        super(ThresholdSweepPlot, self).__init__(*args, **kwargs)
+        self.setWindowTitle("Перебор порогов")
+        self.resize(700, 600)
+        self.result: Optional[ThresholdSweepResult] = None
+
+        self.label_info = QLabel("", self)
+
+        self.plot_count = pg.PlotWidget(title="Количество кластеров")
+        self.plot_count.setLogMode(y=True)
+        self.plot_count.addLegend()
+        self.plot_stability = pg.PlotWidget(title="Стабильность (ARI с предыдущим порогом)")
+        self.plot_stability.setXLink(self.plot_count)
+        self.plot_stability.setYRange(0, 1.05)
+
+        self.threshold_line = pg.InfiniteLine(angle=90, movable=True)
+        self.threshold_line.sigPositionChangeFinished.connect(self.on_threshold_line_moved)
+        self.plot_count.addItem(self.threshold_line)
+
+        self.widget_layout = QVBoxLayout(self)
+        self.widget_layout.addWidget(self.label_info)
+        self.widget_layout.addWidget(self.plot_count)
+        self.widget_layout.addWidget(self.plot_stability)
+
+    def set_result(self, result: ThresholdSweepResult, elapsed: float, current_threshold: float) -> None:
+        self.result = result
+        quantiles: np.ndarray = result.size_quantiles((0.5, 1.0))
+        self.plot_count.clear()
+        self.plot_count.addItem(self.threshold_line)
+        self.plot_count.plot(result.thresholds, result.cluster_count, pen='y', name="кластеров")
+        self.plot_count.plot(result.thresholds, quantiles[:, 0], pen='c', name="медианный размер")
+        self.plot_count.plot(result.thresholds, quantiles[:, 1], pen='m', name="максимальный размер")
+        self.plot_stability.clear()
+        self.plot_stability.plot(result.thresholds, result.stability, pen='g')
+        self.threshold_line.setValue(current_threshold)
+        self.label_info.setText(f"Порогов: {result.thresholds.shape[0]}, время: {elapsed:.2f} с. "
+                                f"Переместите линию, чтобы выбрать порог.")
+
+    def on_threshold_line_moved(self) -> None:
+        if self.result is not None:
+            position: int = int(np.abs(self.result.thresholds - self.threshold_line.value()).argmin())
+            self.thresholdSelected.emit(float(self.result.thresholds[position]))
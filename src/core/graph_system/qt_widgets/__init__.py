@@ -1 +1,3 @@
 from .PointGraph3D_class import PointGraph3D
+from .ThresholdSweepPlot_class import ThresholdSweepPlot
+from .LabelComparisonTable_class import LabelComparisonTable
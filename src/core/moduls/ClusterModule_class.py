@@ -1,27 +1,49 @@
 import gc
 import math
+import os
 import random
 import re
+import time
 from datetime import datetime
-from typing import Optional, Union, List, TYPE_CHECKING
+from typing import Optional, Union, List, Dict, Tuple, TYPE_CHECKING
 
 import numpy as np
 
 from PyQt6 import QtCore, QtWidgets
 from PyQt6.QtCore import pyqtSlot, QEvent, Qt
-from PyQt6.QtGui import QPaintEvent, QPainter, QBrush, QColor, QMouseEvent, QFontMetrics, QResizeEvent, QFont, QKeyEvent
+from PyQt6.QtGui import QPaintEvent, QPainter, QBrush, QColor, QMouseEvent, QFontMetrics, QResizeEvent, QFont, \
+    QKeyEvent, QCursor
 from PyQt6.QtWidgets import QWidget, QToolTip, QLabel, QVBoxLayout, QPushButton, QScrollBar, QSlider, QCheckBox, \
-    QTextEdit, QTableView, QInputDialog, QComboBox, QSpinBox
+    QTextEdit, QTableView, QInputDialog, QComboBox, QSpinBox, QFileDialog, QMessageBox
 
-from src.core.graph_system.qt_widgets import PointGraph3D
-from src.core.log_system import print_e, print_traceback, print_d
-from src.function_lib.cluster import clusterization_threshold
+from src.core.graph_system.qt_widgets import PointGraph3D, ThresholdSweepPlot, LabelComparisonTable
+from src.core.log_system import print_e, print_traceback, print_d, print_i
+from src.core.thread_system import FunctionWorker
+from src.function_lib.cluster import clusterization_threshold, clusterization_threshold_append, ClusterState, \
+    make_cluster_state
+from src.function_lib.mahalanobis import CovarianceClusterState, feature_variance
+from src.function_lib.threshold_sweep import threshold_sweep, ThresholdSweepResult
+from src.function_lib.cluster_metrics import cluster_quality, ClusterQualityMetrics
+from src.function_lib.threshold_search import search_threshold, ThresholdSearchResult
+from src.function_lib.session_io import SessionSnapshot, save_session, load_session, is_mapped_from
+from src.function_lib.dataset_generator import SyntheticDataset
+from src.function_lib.sample_assign import sample_assign_clusterization, draw_sample, SampleAssignResult
+from src.function_lib.run_history import RunHistory, RunRecord
+from src.function_lib.rasterizer import Camera, render_points, save_png, export_threshold_frames, FrameExport, \
+    label_colors
+from src.function_lib.assignment_trace import AssignmentTrace, record_trace
+from src.function_lib.label_comparison import compare_labels, pairwise_comparison, align_colors
+from src.function_lib.memory_budget import MemoryBudget, MemoryBudgetError, MemoryReport, track_memory, \
+    buffer_sizes, MEGABYTE
 from src.core.graph_system import TableModelNumpy
-from src.enums import ClusterizationDataMethod
+from src.enums import ClusterizationDataMethod, SyntheticClusterShape, DistanceMetric, UnmatchedPointPolicy
 
 if TYPE_CHECKING:
     from src.forms.MainForm_class import MainForm
 
+# Количество последних запусков истории в окне сравнения
+COMPARE_RUNS = 12
+
 
 class ClusterModule(QWidget):
     valueChanged = QtCore.pyqtSignal(int)
@@ -43,9 +65,18 @@ class ClusterModule(QWidget):
         self.px_mode: bool = self.mf.settings.graph_settings.px_mode
 
         self.cluster_threshold: float = 5.0
+        # Состояние последней прямой (FORWARD) кластеризации для дополнения новыми точками
+        self.clusters: Optional[np.ndarray] = None
+        self.cluster_colors: Optional[np.ndarray] = None
+        self.cluster_state: Optional[ClusterState] = None
+        self.cluster_params: Optional[tuple] = None
 
         self.graph_system = PointGraph3D(self)
         self.graph_system.move(self.left_zone, 30)
+        self.graph_system.pointHovered.connect(self.show_point_info)
+        # Статистика кластеров для подсказки, если метки получены не прямым проходом
+        self.hover_state: Optional[ClusterState] = None
+        self.hover_state_labels: Optional[np.ndarray] = None
 
         self.label_point_size = QLabel("Размер точек:", self)
         self.label_point_size.move(self.left_zone + 10, 10)
@@ -67,6 +98,21 @@ class ClusterModule(QWidget):
         self.checkbox_px_mode.stateChanged.connect(self.set_px_mode)
         self.set_px_mode(0)
 
+        # Пошаговый просмотр последовательного прохода
+        self.button_replay = QPushButton("Пошагово", self)
+        self.button_replay.resize(90, 22)
+        self.button_replay.move(self.checkbox_px_mode.x() + self.checkbox_px_mode.width() + 10, 5)
+        self.button_replay.clicked.connect(self.record_replay)
+        self.slider_replay = QSlider(Qt.Orientation.Horizontal, self)
+        self.slider_replay.resize(200, 22)
+        self.slider_replay.move(self.button_replay.x() + self.button_replay.width() + 10, 5)
+        self.slider_replay.setEnabled(False)
+        self.slider_replay.valueChanged.connect(self.seek_replay)
+        self.label_replay = QLabel("", self)
+        self.label_replay.move(self.slider_replay.x() + self.slider_replay.width() + 10, 10)
+        self.replay_trace: Optional[AssignmentTrace] = None
+        self.replay_worker: Optional[FunctionWorker] = None
+
         self.data_title_label = QLabel(" == Данные ==", self)
         self.data_title_label.setFont(QFont('Arial', 16))
         self.data_title_label.move(5, 20)
@@ -83,10 +129,37 @@ class ClusterModule(QWidget):
         self.button_generate.move(self.button_parse.x() + self.button_parse.width() + 20,
                                   self.text_field_point_input.y() + self.text_field_point_input.height() + 10)
         self.button_generate.clicked.connect(self.generate_points)
+        self.generator_shape_dict = {
+            SyntheticClusterShape.UNIFORM: "Равномерный шум",
+            SyntheticClusterShape.BLOBS: "Гауссовы облака",
+            SyntheticClusterShape.ANISOTROPIC: "Анизотропные кластеры",
+            SyntheticClusterShape.VARIED_DENSITY: "Кластеры разной плотности"
+        }
+        # Истинные метки сгенерированных данных (0 - шум)
+        self.truth_labels: Optional[np.ndarray] = None
+
+        self.button_save_session = QPushButton("Сохранить сессию", self)
+        self.button_save_session.move(10, self.button_parse.y() + self.button_parse.height() + 10)
+        self.button_save_session.clicked.connect(self.save_session)
+
+        self.button_load_session = QPushButton("Загрузить сессию", self)
+        self.button_load_session.move(self.button_save_session.x() + self.button_save_session.width() + 20,
+                                      self.button_save_session.y())
+        self.button_load_session.clicked.connect(self.load_session)
+
+        self.button_export_png = QPushButton("Экспорт PNG", self)
+        self.button_export_png.move(10, self.button_save_session.y() + self.button_save_session.height() + 10)
+        self.button_export_png.clicked.connect(self.export_snapshot)
+
+        self.button_export_frames = QPushButton("Кадры по порогам", self)
+        self.button_export_frames.move(self.button_export_png.x() + self.button_export_png.width() + 20,
+                                       self.button_export_png.y())
+        self.button_export_frames.clicked.connect(self.export_threshold_frames)
+        self.export_worker: Optional[FunctionWorker] = None
 
         self.label_cluster_title = QLabel(" == Кластеризация ==", self)
         self.label_cluster_title.setFont(QFont('Arial', 16))
-        self.label_cluster_title.move(5, self.button_parse.y() + self.button_parse.height() + 20)
+        self.label_cluster_title.move(5, self.button_export_png.y() + self.button_export_png.height() + 20)
 
         self.label_cluster_threshold = QLabel(f"Порог кластеризации ({self.cluster_threshold}): ", self)
         self.label_cluster_threshold.setFont(QFont('Arial', 10))
@@ -111,7 +184,10 @@ class ClusterModule(QWidget):
         self.cluster_data_method_dict = {
             ClusterizationDataMethod.FORWARD: "Прямой",
             ClusterizationDataMethod.REVERSE: "Обратный",
-            ClusterizationDataMethod.SHUFFLE: "Случайны"
+            ClusterizationDataMethod.SHUFFLE: "Случайны",
+            ClusterizationDataMethod.NEIGHBOR_GRAPH: "Граф соседей",
+            ClusterizationDataMethod.SAMPLE_ASSIGN: "Выборка (приближённо)",
+            ClusterizationDataMethod.SHARDED: "Параллельно по областям"
         }
         self.combobox_cluster_data_method = QComboBox(self)
         for value in self.cluster_data_method_dict.values():
@@ -130,6 +206,13 @@ class ClusterModule(QWidget):
         self.spinbox_cluster_seed.move(self.label_cluster_seed.width() + 20,
                                        self.combobox_cluster_data_method.y() + self.combobox_cluster_data_method.height() + 10)
 
+        self.checkbox_mahalanobis = QCheckBox("Ковариация", self)
+        self.checkbox_mahalanobis.setToolTip("Расстояние Махаланобиса с полной ковариационной матрицей кластера.\n"
+                                             "Только для прямого, обратного и случайного перебора")
+        self.checkbox_mahalanobis.adjustSize()
+        self.checkbox_mahalanobis.move(self.combobox_cluster_data_method.x() + self.combobox_cluster_data_method.width()
+                                       + 10, self.combobox_cluster_data_method.y() + 5)
+
         self.button_cluster = QPushButton("Выполнить", self)
         self.button_cluster.move(10, self.spinbox_cluster_seed.y() + self.spinbox_cluster_seed.height() + 10)
         self.button_cluster.clicked.connect(self.calc_clusterization)
@@ -139,10 +222,83 @@ class ClusterModule(QWidget):
                                     self.spinbox_cluster_seed.y() + self.spinbox_cluster_seed.height() + 10)
         self.checkbox_auto_run.setChecked(True)
 
+        self.button_history_back = QPushButton("◀", self)
+        self.button_history_back.resize(30, self.button_cluster.height())
+        self.button_history_back.move(self.checkbox_auto_run.x() + self.checkbox_auto_run.width() + 20,
+                                      self.button_cluster.y())
+        self.button_history_back.clicked.connect(self.history_back)
+        self.button_history_forward = QPushButton("▶", self)
+        self.button_history_forward.resize(30, self.button_cluster.height())
+        self.button_history_forward.move(self.button_history_back.x() + self.button_history_back.width() + 5,
+                                         self.button_cluster.y())
+        self.button_history_forward.clicked.connect(self.history_forward)
+        self.label_history = QLabel("", self)
+        self.label_history.setFont(QFont('Arial', 10))
+        self.label_history.move(self.button_history_forward.x() + self.button_history_forward.width() + 10,
+                                self.button_cluster.y() + 5)
+        self.run_history = RunHistory(self.mf.settings.cluster_settings.history_memory_mb * MEGABYTE)
+        self.update_history_label()
+
         self.cluster_table = QTableView(self)
         self.cluster_table.move(10, self.button_cluster.y() + self.button_cluster.height() + 10)
         self.cluster_table.resize(self.left_zone - 10, 65)
 
+        self.button_sweep = QPushButton("Перебор порогов", self)
+        self.button_sweep.move(10, self.cluster_table.y() + self.cluster_table.height() + 10)
+        self.button_sweep.clicked.connect(self.run_threshold_sweep)
+        self.sweep_worker: Optional[FunctionWorker] = None
+        self.sweep_start_time: float = 0.0
+        self.sweep_plot: Optional[ThresholdSweepPlot] = None
+
+        self.button_compare = QPushButton("Сравнить запуски", self)
+        self.button_compare.move(self.button_sweep.x() + self.button_sweep.width() + 10, self.button_sweep.y())
+        self.button_compare.clicked.connect(self.run_comparison)
+        self.compare_worker: Optional[FunctionWorker] = None
+        self.compare_table: Optional[LabelComparisonTable] = None
+
+        self.label_search_count = QLabel("Кластеров от", self)
+        self.label_search_count.setFont(QFont('Arial', 10))
+        self.label_search_count.adjustSize()
+        self.label_search_count.move(10, self.button_sweep.y() + self.button_sweep.height() + 15)
+        self.spinbox_search_min = QSpinBox(self)
+        self.spinbox_search_min.setRange(1, 1_000_000)
+        self.spinbox_search_min.setValue(3)
+        self.spinbox_search_min.move(self.label_search_count.x() + self.label_search_count.width() + 5,
+                                     self.button_sweep.y() + self.button_sweep.height() + 10)
+        self.label_search_count_to = QLabel("до", self)
+        self.label_search_count_to.setFont(QFont('Arial', 10))
+        self.label_search_count_to.adjustSize()
+        self.label_search_count_to.move(self.spinbox_search_min.x() + self.spinbox_search_min.width() + 5,
+                                        self.label_search_count.y())
+        self.spinbox_search_max = QSpinBox(self)
+        self.spinbox_search_max.setRange(1, 1_000_000)
+        self.spinbox_search_max.setValue(3)
+        self.spinbox_search_max.move(self.label_search_count_to.x() + self.label_search_count_to.width() + 5,
+                                     self.spinbox_search_min.y())
+        self.button_search = QPushButton("Подобрать порог", self)
+        self.button_search.move(self.spinbox_search_max.x() + self.spinbox_search_max.width() + 10,
+                                self.spinbox_search_min.y())
+        self.button_search.clicked.connect(self.run_threshold_search)
+        self.search_worker: Optional[FunctionWorker] = None
+
+        self.label_memory = QLabel("", self)
+        self.label_memory.setFont(QFont('Arial', 10))
+        self.label_memory.move(10, self.button_search.y() + self.button_search.height() + 10)
+        self.memory_report: Optional[MemoryReport] = None
+
+        # Отчёт приближённого режима - до метрик, которые занимают несколько строк
+        self.label_sample_report = QLabel("", self)
+        self.label_sample_report.setFont(QFont('Arial', 10))
+        self.label_sample_report.setWordWrap(True)
+        self.label_sample_report.resize(self.left_zone - 20, 35)
+        self.label_sample_report.move(10, self.label_memory.y() + 25)
+
+        self.label_cluster_metrics = QLabel("", self)
+        self.label_cluster_metrics.setFont(QFont('Arial', 10))
+        self.label_cluster_metrics.move(10, self.label_sample_report.y() + self.label_sample_report.height() + 5)
+        self.metrics_worker: Optional[FunctionWorker] = None
+        self.metrics_pending: Optional[tuple] = None
+
         # Task #5 (25)
         self.text_field_point_input.setText("""(20,3,19), (7,18,4), (-5,-5,2), (15,19,20), (11,19,-20), (-3,8,-30), 
         (17,5,13), (6, 15,3), (-8,-3,4), (11,13,18), (18,17,-15), (-4,7,-34), (-6,0,1), (20,10,20), (14,3, 16), 
@@ -163,9 +319,13 @@ class ClusterModule(QWidget):
             list_of_str = all_text.split('S')
             list_of_points = [str_object.split(',') for str_object in list_of_str]
             points = np.array(list_of_points).astype(float)
-            self.clear_point()
-            for point in points:
-                self.add_point(point)
+            if self.points is not None and self.points.shape[0] <= points.shape[0] \
+                    and np.array_equal(self.points, points[:self.points.shape[0]]):
+                # Введённые точки продолжают текущий набор - добавляются только новые
+                self.add_points(points[self.points.shape[0]:])
+            else:
+                self.clear_point()
+                self.add_points(points)
         except Exception as e:
             print_e()
             print_traceback()
@@ -174,6 +334,8 @@ class ClusterModule(QWidget):
                   color: Optional[Union[np.ndarray, List[float]]] = None) -> None:
         if color is None:
             color = [random.random(), random.random(), random.random(), 1.]
+        self.truth_labels = None
+        self.clear_history()
         if self.points is None:
             self.points = np.array([point])
             self.colors = np.array([color])
@@ -184,10 +346,32 @@ class ClusterModule(QWidget):
             self.sizes = np.append(self.sizes, [self.point_size])
         self.update_point_data()
 
+    def add_points(self, points: np.ndarray, colors: Optional[np.ndarray] = None) -> None:
+        if points.shape[0] == 0:
+            return
+        self.truth_labels = None
+        self.clear_history()
+        if colors is None:
+            colors = np.random.rand(points.shape[0], 4)
+            colors[:, 3] = 1.0
+        sizes: np.ndarray = np.zeros(points.shape[0]) + self.point_size
+        if self.points is None:
+            self.points = np.array(points, dtype=float)
+            self.colors = colors
+            self.sizes = sizes
+        else:
+            self.points = np.append(self.points, points, axis=0)
+            self.colors = np.append(self.colors, colors, axis=0)
+            self.sizes = np.append(self.sizes, sizes)
+        self.update_point_data()
+
     def clear_point(self) -> None:
         self.points = None
         self.colors = None
         self.sizes = None
+        self.truth_labels = None
+        self.reset_cluster_state()
+        self.clear_history()
         gc.collect()
         self.update_point_data()
 
@@ -213,6 +397,34 @@ class ClusterModule(QWidget):
 
     def update_point_data(self) -> None:
         self.set_scatter_plot_parameters(self.points, self.sizes, self.colors, self.px_mode)
+        self.graph_system.set_pick_points(self.points)
+
+    def hover_cluster_state(self) -> Optional[ClusterState]:
+        if self.cluster_state is not None and self.cluster_state.size == int(self.clusters.max()):
+            return self.cluster_state
+        if self.hover_state_labels is not self.clusters:
+            clustered: np.ndarray = self.clusters > 0
+            self.hover_state = ClusterState.from_labels(self.points[clustered], self.clusters[clustered],
+                                                        int(self.clusters.max()))
+            self.hover_state_labels = self.clusters
+        return self.hover_state
+
+    @pyqtSlot(int)
+    def show_point_info(self, point: int) -> None:
+        if point < 0 or self.points is None or point >= self.points.shape[0]:
+            QToolTip.hideText()
+            return
+        text: str = f"Точка {point}: ({', '.join(f'{value:.3f}' for value in self.points[point])})"
+        if self.clusters is not None and self.clusters.shape[0] == self.points.shape[0]:
+            cluster: int = int(self.clusters[point])
+            if cluster == 0:
+                text += "\nБез кластера"
+            else:
+                state: ClusterState = self.hover_cluster_state()
+                mean: str = ", ".join(f"{value:.3f}" for value in state.means[cluster - 1])
+                std: str = ", ".join(f"{value:.3f}" for value in state.std[cluster - 1])
+                text += f"\nКластер {cluster}: точек {state.counts[cluster - 1]}\nСреднее: ({mean})\nСКО: ({std})"
+        QToolTip.showText(QCursor.pos(), text, self.graph_system)
 
     def set_scatter_plot_parameters(self, pos: Optional[np.ndarray],
                                     size: np.ndarray,
@@ -232,23 +444,124 @@ class ClusterModule(QWidget):
         if self.checkbox_auto_run.isChecked():
             self.calc_clusterization()
 
+    def current_data_method(self) -> ClusterizationDataMethod:
+        return list(self.cluster_data_method_dict.keys())[
+            list(self.cluster_data_method_dict.values()).index(self.combobox_cluster_data_method.currentText())
+        ]
+
+    def current_metric(self, data_method: ClusterizationDataMethod) -> DistanceMetric:
+        if self.checkbox_mahalanobis.isChecked() and data_method in (ClusterizationDataMethod.FORWARD,
+                                                                     ClusterizationDataMethod.REVERSE,
+                                                                     ClusterizationDataMethod.SHUFFLE):
+            return DistanceMetric.MAHALANOBIS
+        return DistanceMetric.DIAGONAL
+
+    def current_random_seed(self) -> Optional[int]:
+        random_seed: int = self.spinbox_cluster_seed.value()
+        return random_seed if random_seed != -1 else None
+
+    def reset_cluster_state(self) -> None:
+        self.clusters = None
+        self.cluster_colors = None
+        self.cluster_state = None
+        self.cluster_params = None
+
     @pyqtSlot()
+    def show_unmatched(self, count: int, fraction: float, policy: UnmatchedPointPolicy) -> None:
+        """
+        Отображение точек вне порога до их обработки (повторная кластеризация может быть долгой)
+
+        :param count: Количество точек вне порога
+        :param fraction: Доля точек вне выборки
+        :param policy: Способ обработки
+        """
+        text: str = f"Вне порога {count} точек ({fraction:.2%}), обработка: {policy.name}"
+        print_i(text)
+        self.label_sample_report.setText(text)
+        self.label_sample_report.repaint()
+
     def calc_clusterization(self) -> None:
         if self.points is not None:
-            random_seed: Optional[int] = self.spinbox_cluster_seed.value()
-            data_method: ClusterizationDataMethod = list(self.cluster_data_method_dict.keys())[
-                list(self.cluster_data_method_dict.values()).index(self.combobox_cluster_data_method.currentText())
-            ]
-
-            clusters = clusterization_threshold(self.points,
-                                                self.cluster_threshold,
-                                                data_method=data_method,
-                                                random_seed=random_seed if random_seed != -1 else None)
+            start_time: float = time.perf_counter()
+            previous: Optional[Tuple[np.ndarray, np.ndarray]] = None
+            data_method: ClusterizationDataMethod = self.current_data_method()
+            metric: DistanceMetric = self.current_metric(data_method)
+            params: tuple = (self.cluster_threshold, data_method, self.current_random_seed(), metric)
+            if data_method is ClusterizationDataMethod.FORWARD and self.cluster_params == params \
+                    and self.clusters.shape[0] <= self.points.shape[0]:
+                # Точки только добавлялись в конец - распределяются лишь новые
+                with track_memory("append") as report:
+                    clusters = clusterization_threshold_append(self.points, self.cluster_threshold,
+                                                               self.clusters, self.cluster_state)
+            else:
+                budget = MemoryBudget(self.mf.settings.cluster_settings.memory_budget_mb * MEGABYTE,
+                                      self.mf.settings.cluster_settings.memory_budget_policy)
+                try:
+                    report = budget.plan(self.points.shape[0], self.points.shape[1], data_method,
+                                         expected_clusters=int(self.clusters.max()) if self.clusters is not None
+                                         and self.clusters.size else None,
+                                         in_use=sum(self.buffer_sizes().values()),
+                                         fallback_method=ClusterizationDataMethod.SAMPLE_ASSIGN
+                                         if metric is DistanceMetric.DIAGONAL else None,
+                                         sample_size=self.mf.settings.cluster_settings.sample_size)
+                except MemoryBudgetError as e:
+                    print_e(e)
+                    self.label_memory.setText(f"Память: запуск отклонён, {e}")
+                    self.label_memory.adjustSize()
+                    return
+                if report.data_method is not None:
+                    # Полный проход не укладывается в ограничение памяти - приближённый режим
+                    data_method = report.data_method
+                if self.clusters is not None and self.cluster_colors is not None \
+                        and self.clusters.shape[0] == self.points.shape[0]:
+                    previous = (self.clusters, self.cluster_colors)
+                self.reset_cluster_state()
+                state = make_cluster_state(self.points, metric)
+                with track_memory("clusterization", report):
+                    if data_method is ClusterizationDataMethod.SAMPLE_ASSIGN:
+                        sample_result: SampleAssignResult = sample_assign_clusterization(
+                            self.points, self.cluster_threshold,
+                            sample_size=self.mf.settings.cluster_settings.sample_size,
+                            random_seed=params[2],
+                            unmatched_policy=self.mf.settings.cluster_settings.unmatched_policy,
+                            on_unmatched=self.show_unmatched)
+                        clusters = sample_result.labels
+                    else:
+                        try:
+                            clusters = clusterization_threshold(
+                                self.points, self.cluster_threshold, data_method=data_method, random_seed=params[2],
+                                state=state, compact=report.compact, metric=metric,
+                                workers=self.mf.settings.cluster_settings.workers or None)
+                        except ValueError as e:
+                            # Например, граф соседства для многомерных данных при слишком большом пороге
+                            print_e(e)
+                            self.label_memory.setText(f"Запуск отклонён: {e}")
+                            self.label_memory.adjustSize()
+                            return
+                self.label_sample_report.setText(f"Приближённо: {sample_result}"
+                                                 if data_method is ClusterizationDataMethod.SAMPLE_ASSIGN else "")
+                if data_method is ClusterizationDataMethod.FORWARD:
+                    self.cluster_state = state
+                    self.cluster_params = params
             np.random.seed(None)
-            max_colors = clusters.max()
-            colors = np.random.rand(max_colors, 4)
-            colors[:, 3] = 1.0
+            if previous is not None:
+                # Кластеры, сопоставленные кластерам прошлого запуска, сохраняют их цвета
+                colors = align_colors(previous[0], previous[1], clusters)
+            else:
+                max_colors = clusters.max()
+                colors = np.random.rand(max_colors, 4)
+                colors[:, 3] = 1.0
+                if self.cluster_colors is not None:
+                    # Цвета уже существующих кластеров сохраняются
+                    colors[:self.cluster_colors.shape[0]] = self.cluster_colors
+            self.clusters = clusters
+            self.cluster_colors = colors
+            self.run_history.add(clusters, self.cluster_threshold, data_method, params[2],
+                                 time.perf_counter() - start_time, colors, metric)
+            self.update_history_label()
             point_colors = colors[clusters - 1]
+            # Точки без кластера (приближённый режим с пометкой шума) - серые
+            point_colors[clusters == 0] = (0.5, 0.5, 0.5, 0.5)
             self.colors = point_colors
             self.update_point_data()
 
@@ -256,16 +569,200 @@ class ClusterModule(QWidget):
             self.cluster_table.setModel(model)
             self.cluster_table.resizeColumnsToContents()
 
+            report.buffers = self.buffer_sizes()
+            self.show_memory_report(report)
+
+            self.update_cluster_metrics(clusters, self.cluster_state)
+
             print_d(clusters)
 
+    def buffer_sizes(self) -> Dict[str, int]:
+        return buffer_sizes(points=self.points, colors=self.colors, sizes=self.sizes, clusters=self.clusters,
+                            cluster_colors=self.cluster_colors, truth_labels=self.truth_labels,
+                            cluster_state=self.cluster_state)
+
+    def show_memory_report(self, report: MemoryReport) -> None:
+        self.memory_report = report
+        self.label_memory.setText(f"Память: {report}")
+        self.label_memory.adjustSize()
+        self.label_memory.setToolTip("\n".join(f"{name}: {size / MEGABYTE:.2f} МБ"
+                                               for name, size in report.buffers.items()))
+        print_d(report)
+        for site in report.top_sites:
+            print_d(site)
+
+    def calc_cluster_metrics(self, points: np.ndarray, clusters: np.ndarray, state: Optional[ClusterState]) -> None:
+        """
+        Расчёт метрик качества в отдельном потоке. Пока идёт расчёт, сохраняется только последний запрос.
+
+        :param points: Точки
+        :param clusters: Метки кластеров
+        :param state: Копия статистики кластеров или None
+        :return: None
+        """
+        if self.metrics_worker is not None and self.metrics_worker.isRunning():
+            self.metrics_pending = (points, clusters, state)
+            return
+        self.label_cluster_metrics.setText("Метрики: расчёт...")
+        self.label_cluster_metrics.adjustSize()
+        self.metrics_worker = FunctionWorker(cluster_quality, points, clusters, state)
+        self.metrics_worker.resultReady.connect(self.on_cluster_metrics_ready)
+        self.metrics_worker.finished.connect(self.on_cluster_metrics_finished)
+        self.metrics_worker.start()
+
+    @pyqtSlot(object)
+    def on_cluster_metrics_ready(self, metrics: ClusterQualityMetrics) -> None:
+        if self.metrics_pending is not None:
+            return
+        low, high = metrics.silhouette_ci
+        self.label_cluster_metrics.setText(f"Кластеров: {metrics.n_clusters}\n"
+                                           f"Инерция: {metrics.inertia:.4g}\n"
+                                           f"Дэвис-Боулдин: {'≈' if metrics.davies_bouldin_approximate else ''}"
+                                           f"{metrics.davies_bouldin:.4f}\n"
+                                           f"Силуэт: {metrics.silhouette:.4f} [{low:.4f}; {high:.4f}] "
+                                           f"(выборка {metrics.silhouette_sample_size})")
+        self.label_cluster_metrics.adjustSize()
+
+    @pyqtSlot()
+    def on_cluster_metrics_finished(self) -> None:
+        if self.metrics_pending is not None:
+            pending: tuple = self.metrics_pending
+            self.metrics_pending = None
+            self.calc_cluster_metrics(*pending)
+
+    def threshold_input(self) -> Tuple[np.ndarray, ClusterizationDataMethod]:
+        """
+        Точки и метод для перебора и подбора порога. В приближённом режиме кластеры определяются выборкой,
+        поэтому перебор идёт по той же выборке в её порядке. Для параллельного режима - прямой порядок
+
+        :return: Копия точек и метод пред-обработки данных
+        """
+        data_method: ClusterizationDataMethod = self.current_data_method()
+        if data_method is ClusterizationDataMethod.SAMPLE_ASSIGN:
+            sample: np.ndarray = draw_sample(self.points.shape[0], self.mf.settings.cluster_settings.sample_size,
+                                             self.current_random_seed())
+            return np.asarray(self.points[sample], dtype=float), ClusterizationDataMethod.FORWARD
+        if data_method is ClusterizationDataMethod.SHARDED:
+            return self.points.copy(), ClusterizationDataMethod.FORWARD
+        return self.points.copy(), data_method
+
+    @pyqtSlot()
+    def run_threshold_sweep(self) -> None:
+        if self.points is None or (self.sweep_worker is not None and self.sweep_worker.isRunning()):
+            return
+        thresholds: np.ndarray = np.arange(self.slider_cluster_threshold.minimum(),
+                                           self.slider_cluster_threshold.maximum() + 1) / 10
+        self.button_sweep.setEnabled(False)
+        self.sweep_start_time = time.perf_counter()
+        points, data_method = self.threshold_input()
+        self.sweep_worker = FunctionWorker(threshold_sweep, points, thresholds,
+                                           data_method=data_method,
+                                           random_seed=self.current_random_seed())
+        self.sweep_worker.resultReady.connect(self.on_threshold_sweep_ready)
+        self.sweep_worker.finished.connect(lambda: self.button_sweep.setEnabled(True))
+        self.sweep_worker.start()
+
+    @pyqtSlot(object)
+    def on_threshold_sweep_ready(self, result: ThresholdSweepResult) -> None:
+        if self.sweep_plot is None:
+            self.sweep_plot = ThresholdSweepPlot()
+            self.sweep_plot.thresholdSelected.connect(self.set_threshold_value)
+        self.sweep_plot.set_result(result, time.perf_counter() - self.sweep_start_time, self.cluster_threshold)
+        self.sweep_plot.show()
+        self.sweep_plot.raise_()
+
+    @pyqtSlot()
+    def run_comparison(self) -> None:
+        """
+        Сравнение последних запусков из истории (до `COMPARE_RUNS`) в отдельном потоке
+        """
+        if self.compare_worker is not None and self.compare_worker.isRunning():
+            return
+        if len(self.run_history) < 2:
+            QToolTip.showText(self.button_compare.mapToGlobal(self.button_compare.rect().bottomLeft()),
+                              "Для сравнения нужно хотя бы два запуска", self.button_compare)
+            return
+        run_indexes: List[int] = list(range(max(0, len(self.run_history) - COMPARE_RUNS), len(self.run_history)))
+        records: List[RunRecord] = [self.run_history.get(index) for index in run_indexes]
+        names: List[str] = [f"порог {record.threshold}, {self.cluster_data_method_dict[record.data_method]}"
+                            + (f", seed {record.random_seed}" if record.data_method is ClusterizationDataMethod.SHUFFLE
+                               else "") for record in records]
+        label_sets: List[np.ndarray] = [record.labels() for record in records]
+
+        def compare() -> tuple:
+            ari, nmi = pairwise_comparison(label_sets)
+            return names, run_indexes, ari, nmi, compare_labels(label_sets[-2], label_sets[-1])
+
+        self.button_compare.setEnabled(False)
+        self.compare_worker = FunctionWorker(compare)
+        self.compare_worker.resultReady.connect(self.on_comparison_ready)
+        self.compare_worker.errorRaised.connect(print_e)
+        self.compare_worker.finished.connect(lambda: self.button_compare.setEnabled(True))
+        self.compare_worker.start()
+
+    @pyqtSlot(object)
+    def on_comparison_ready(self, result: tuple) -> None:
+        if self.compare_table is None:
+            self.compare_table = LabelComparisonTable()
+            self.compare_table.runSelected.connect(self.show_history_run)
+        self.compare_table.set_result(*result)
+        self.compare_table.show()
+        self.compare_table.raise_()
+
+    @pyqtSlot(int)
+    def show_history_run(self, index: int) -> None:
+        if 0 <= index < len(self.run_history):
+            self.show_history_record(self.run_history.step(index - self.run_history.current))
+
+    @pyqtSlot()
+    def run_threshold_search(self) -> None:
+        if self.points is None or (self.search_worker is not None and self.search_worker.isRunning()):
+            return
+        min_clusters: int = self.spinbox_search_min.value()
+        max_clusters: int = max(min_clusters, self.spinbox_search_max.value())
+        thresholds: np.ndarray = np.arange(self.slider_cluster_threshold.minimum(),
+                                           self.slider_cluster_threshold.maximum() + 1) / 10
+        self.button_search.setEnabled(False)
+        points, data_method = self.threshold_input()
+        self.search_worker = FunctionWorker(search_threshold, points, min_clusters, max_clusters,
+                                            thresholds=thresholds,
+                                            data_method=data_method,
+                                            random_seed=self.current_random_seed(),
+                                            start_threshold=self.cluster_threshold)
+        self.search_worker.resultReady.connect(self.on_threshold_search_ready)
+        self.search_worker.finished.connect(lambda: self.button_search.setEnabled(True))
+        self.search_worker.start()
+
+    @pyqtSlot(object)
+    def on_threshold_search_ready(self, result: ThresholdSearchResult) -> None:
+        print_d(f"Threshold search: {result.threshold} -> {result.cluster_count} clusters, found={result.found}, "
+                f"passes={result.passes}, points={result.points_processed}")
+        if not result.found:
+            QToolTip.showText(self.button_search.mapToGlobal(self.button_search.rect().bottomLeft()),
+                              f"Точного попадания нет, ближайший порог {result.threshold} "
+                              f"({result.cluster_count} кластеров)", self.button_search)
+        self.set_threshold_value(result.threshold)
+
+    @pyqtSlot(float)
+    def set_threshold_value(self, threshold: float) -> None:
+        self.slider_cluster_threshold.setValue(int(round(threshold * 10)))
+
     @pyqtSlot()
     def generate_points(self) -> None:
         try:
             text, ok = QInputDialog.getText(self, 'Генерация точек', 'Сколько точек сгенерировать?')
             if ok:
+                shape_name, ok = QInputDialog.getItem(self, 'Генерация точек', 'Вид данных:',
+                                                      list(self.generator_shape_dict.values()), 0, False)
+            if ok:
+                shape: SyntheticClusterShape = list(self.generator_shape_dict.keys())[
+                    list(self.generator_shape_dict.values()).index(shape_name)
+                ]
                 self.clear_point()
                 point_size = int(text)
-                self.points = (np.random.rand(point_size, 3) - 0.5) * 40.0
+                dataset = SyntheticDataset(point_size, shape=shape, cluster_std=2.0,
+                                           noise_fraction=0.05 if shape is not SyntheticClusterShape.UNIFORM else 1.0)
+                self.points, self.truth_labels = dataset.generate()
                 self.colors = np.random.rand(point_size, 4)
                 self.colors[:, 3] = 1.0
                 self.sizes = np.zeros((point_size)) + self.point_size  # noqa
@@ -273,6 +770,330 @@ class ClusterModule(QWidget):
         except Exception as e:
             print_e(e)
 
+    @pyqtSlot()
+    def save_session(self) -> None:
+        if self.points is None:
+            return
+        try:
+            path, _ = QFileDialog.getSaveFileName(self, "Сохранить сессию", self.mf.settings.system_settings.last_folder,
+                                                  "Сессия (*.cvses)")
+            if path:
+                self.release_session_file(path)
+                save_session(path, SessionSnapshot(points=self.points,
+                                                   labels=self.clusters,
+                                                   colors=self.colors,
+                                                   cluster_colors=self.cluster_colors,
+                                                   truth_labels=self.truth_labels,
+                                                   threshold=self.cluster_threshold,
+                                                   data_method=self.current_data_method(),
+                                                   random_seed=self.current_random_seed(),
+                                                   metric=self.current_metric(self.current_data_method())))
+                self.mf.settings.system_settings.last_folder = os.path.dirname(path)
+        except PermissionError as e:
+            print_e(e)
+            QMessageBox.warning(self, "Сохранить сессию", f"Файл занят, сохраните сессию в другой файл.\n{e}")
+        except Exception as e:
+            print_e(e)
+            print_traceback()
+
+    def release_session_file(self, path: str) -> None:
+        """
+        Копирование в память массивов, отображённых из файла сессии, чтобы файл можно было заменить
+        (в Windows отображённый файл заменить нельзя)
+
+        :param path: Путь к файлу сессии
+        :return: None
+        """
+        mapped: List[str] = [name for name in ('points', 'clusters', 'colors', 'cluster_colors', 'truth_labels')
+                             if is_mapped_from(getattr(self, name), path)]
+        if not mapped:
+            return
+        for name in mapped:
+            setattr(self, name, np.array(getattr(self, name)))
+        self.update_point_data()
+        gc.collect()
+
+    @pyqtSlot()
+    def load_session(self) -> None:
+        try:
+            path, _ = QFileDialog.getOpenFileName(self, "Загрузить сессию", self.mf.settings.system_settings.last_folder,
+                                                  "Сессия (*.cvses)")
+            if path:
+                self.apply_session(load_session(path))
+                self.mf.settings.system_settings.last_folder = os.path.dirname(path)
+        except Exception as e:
+            print_e(e)
+            print_traceback()
+
+    def apply_session(self, snapshot: SessionSnapshot) -> None:
+        """
+        Применение загруженной сессии: точки и метки используются без копирования и без повторной кластеризации
+
+        :param snapshot: Данные сессии
+        :return: None
+        """
+        self.clear_point()
+        point_count: int = snapshot.points.shape[0]
+        self.points = snapshot.points
+        if snapshot.colors is not None:
+            self.colors = snapshot.colors
+        else:
+            self.colors = np.random.rand(point_count, 4)
+            self.colors[:, 3] = 1.0
+        self.sizes = np.zeros(point_count) + self.point_size
+        self.truth_labels = snapshot.truth_labels
+
+        self.set_cluster_params(snapshot.threshold, snapshot.data_method, snapshot.random_seed)
+        if snapshot.labels is not None and snapshot.labels.shape[0] == point_count:
+            self.apply_labels(snapshot.labels, snapshot.cluster_colors, snapshot.data_method, snapshot.random_seed,
+                              snapshot.metric)
+        self.update_point_data()
+
+    def set_cluster_params(self, threshold: float, data_method: ClusterizationDataMethod,
+                           random_seed: Optional[int]) -> None:
+        """
+        Параметры кластеризации в виджетах без автовыполнения кластеризации
+        """
+        for widget in (self.slider_cluster_threshold, self.combobox_cluster_data_method, self.spinbox_cluster_seed):
+            widget.blockSignals(True)
+        self.slider_cluster_threshold.setValue(int(round(threshold * 10)))
+        self.cluster_threshold = threshold
+        self.label_cluster_threshold.setText(f"Порог кластеризации ({self.cluster_threshold}): ")
+        self.label_cluster_threshold.adjustSize()
+        self.combobox_cluster_data_method.setCurrentText(self.cluster_data_method_dict[data_method])
+        self.spinbox_cluster_seed.setValue(random_seed if random_seed is not None else -1)
+        for widget in (self.slider_cluster_threshold, self.combobox_cluster_data_method, self.spinbox_cluster_seed):
+            widget.blockSignals(False)
+
+    def apply_labels(self, labels: np.ndarray, cluster_colors: Optional[np.ndarray],
+                     data_method: ClusterizationDataMethod, random_seed: Optional[int],
+                     metric: DistanceMetric = DistanceMetric.DIAGONAL) -> None:
+        """
+        Применение готовых меток без повторной кластеризации
+
+        :param labels: Метки (N,), начиная с 1
+        :param cluster_colors: Цвета кластеров
+        :param data_method: Метод, которым получены метки
+        :param random_seed: Seed, с которым получены метки
+        :param metric: Мера расстояния, которой получены метки
+        :return: None
+        """
+        self.clusters = labels
+        self.cluster_colors = cluster_colors
+        self.cluster_state = None
+        self.cluster_params = None
+        state: Optional[ClusterState] = None
+        if data_method is ClusterizationDataMethod.FORWARD:
+            # Статистика восстанавливается по меткам, чтобы новые точки можно было дополнять
+            if metric is DistanceMetric.MAHALANOBIS:
+                state = CovarianceClusterState.from_labels(self.points, self.clusters,
+                                                           prior=feature_variance(self.points))
+            else:
+                state = ClusterState.from_labels(self.points, self.clusters)
+            self.cluster_state = state
+            if metric is self.current_metric(data_method):
+                # Иначе следующий запуск с другой мерой не должен дополнять эти метки
+                self.cluster_params = (self.cluster_threshold, data_method, random_seed, metric)
+        model = TableModelNumpy(self.clusters.reshape((1, -1)))
+        self.cluster_table.setModel(model)
+        self.update_cluster_metrics(self.clusters, state)
+
+    def update_cluster_metrics(self, clusters: np.ndarray, state: Optional[ClusterState]) -> None:
+        if clusters.size and clusters.min() == 0:
+            # Метрики считаются только по точкам с кластером
+            clustered: np.ndarray = clusters > 0
+            self.calc_cluster_metrics(self.points[clustered], clusters[clustered], None)
+        else:
+            self.calc_cluster_metrics(self.points, clusters, state.copy() if state is not None else None)
+
+    @pyqtSlot()
+    def record_replay(self) -> None:
+        if self.points is None or (self.replay_worker is not None and self.replay_worker.isRunning()):
+            return
+        data_method: ClusterizationDataMethod = self.current_data_method()
+        if data_method not in (ClusterizationDataMethod.FORWARD, ClusterizationDataMethod.REVERSE,
+                               ClusterizationDataMethod.SHUFFLE):
+            self.label_replay.setText("Пошагово: только прямой, обратный и случайный перебор")
+            self.label_replay.adjustSize()
+            return
+        self.button_replay.setEnabled(False)
+        self.label_replay.setText("Пошагово: запись...")
+        self.label_replay.adjustSize()
+        self.replay_worker = FunctionWorker(record_trace, self.points, self.cluster_threshold,
+                                            data_method=data_method,
+                                            random_seed=self.current_random_seed(),
+                                            metric=self.current_metric(data_method))
+        self.replay_worker.resultReady.connect(self.on_replay_ready)
+        self.replay_worker.errorRaised.connect(print_e)
+        self.replay_worker.finished.connect(lambda: self.button_replay.setEnabled(True))
+        self.replay_worker.start()
+
+    @pyqtSlot(object)
+    def on_replay_ready(self, trace: AssignmentTrace) -> None:
+        if self.points is None or len(trace) != self.points.shape[0]:
+            return
+        self.replay_trace = trace
+        self.slider_replay.blockSignals(True)
+        self.slider_replay.setRange(0, len(trace))
+        self.slider_replay.setValue(0)
+        self.slider_replay.blockSignals(False)
+        self.slider_replay.setEnabled(True)
+        self.seek_replay(0)
+
+    @pyqtSlot(int)
+    def seek_replay(self, step: int) -> None:
+        """
+        Показ состояния прохода после `step` шагов: назначенные точки окрашены по кластерам, остальные серые,
+        последняя назначенная точка увеличена. Цвета и размеры модуля не меняются
+        """
+        trace: Optional[AssignmentTrace] = self.replay_trace
+        if trace is None:
+            return
+        labels: np.ndarray = trace.labels_at(step)
+        assigned: np.ndarray = labels > 0
+        colors: np.ndarray = np.empty((labels.shape[0], 4))
+        colors[assigned] = label_colors(labels[assigned], cluster_colors=self.cluster_colors)
+        colors[~assigned] = (0.5, 0.5, 0.5, 0.3)
+        sizes: np.ndarray = np.array(self.sizes, dtype=float).reshape(-1)
+        text: str = f"Шаг {step}/{len(trace)}"
+        if step:
+            point: int = int(trace.point_index[step - 1])
+            cluster: int = int(trace.cluster[step - 1])
+            sizes[point] *= 3
+            state: ClusterState = trace.state_at(step)
+            mean: str = ", ".join(f"{value:.2f}" for value in state.means[cluster - 1])
+            text += f": точка {point} -> кластер {cluster} из {state.size}, проверено {trace.examined[step - 1]}, " \
+                    f"мин. расстояние {trace.best_distance[step - 1]:.3g}, среднее ({mean})"
+        self.label_replay.setText(text)
+        self.label_replay.adjustSize()
+        self.set_scatter_plot_parameters(self.points, sizes, colors, self.px_mode)
+
+    def reset_replay(self) -> None:
+        self.replay_trace = None
+        self.slider_replay.setEnabled(False)
+        self.label_replay.setText("")
+
+    @pyqtSlot()
+    def history_back(self) -> None:
+        self.show_history_record(self.run_history.step(-1))
+
+    @pyqtSlot()
+    def history_forward(self) -> None:
+        self.show_history_record(self.run_history.step(1))
+
+    def show_history_record(self, record: Optional[RunRecord]) -> None:
+        """
+        Показ запуска из истории: параметры, метки и цвета кластеров того запуска
+        """
+        if record is None or self.points is None:
+            return
+        labels: np.ndarray = record.labels()
+        cluster_colors: np.ndarray = record.cluster_colors.astype(float)
+        self.set_cluster_params(record.threshold, record.data_method, record.random_seed)
+        self.apply_labels(labels, cluster_colors, record.data_method, record.random_seed, record.metric)
+        self.colors = cluster_colors[labels - 1]
+        self.colors[labels == 0] = (0.5, 0.5, 0.5, 0.5)
+        self.update_point_data()
+        self.update_history_label()
+
+    def clear_history(self) -> None:
+        # Метки прошлых запусков и запись прохода относятся к другому набору точек
+        self.run_history.clear()
+        self.update_history_label()
+        self.reset_replay()
+
+    def update_history_label(self) -> None:
+        history: RunHistory = self.run_history
+        if not len(history):
+            self.label_history.setText("0/0")
+        else:
+            record: RunRecord = history.get(history.current)
+            self.label_history.setText(f"{history.current + 1}/{len(history)}")
+            method: str = self.cluster_data_method_dict[record.data_method]
+            self.label_history.setToolTip(f"История запусков. Порог {record.threshold}, {method}, "
+                                          f"кластеров {record.cluster_count}, {record.elapsed * 1000:.0f} мс\n"
+                                          f"Память истории: {history.nbytes / MEGABYTE:.2f} МБ")
+        self.label_history.adjustSize()
+        self.button_history_back.setEnabled(history.current > 0)
+        self.button_history_forward.setEnabled(history.current < len(history) - 1)
+
+    def current_camera(self) -> Camera:
+        return self.graph_system.camera()
+
+    def export_running(self) -> bool:
+        return self.export_worker is not None and self.export_worker.isRunning()
+
+    def start_export_worker(self, function, *args, **kwargs) -> None:
+        self.button_export_png.setEnabled(False)
+        self.button_export_frames.setEnabled(False)
+        self.export_worker = FunctionWorker(function, *args, **kwargs)
+        self.export_worker.resultReady.connect(self.on_export_ready)
+        self.export_worker.errorRaised.connect(print_e)
+        self.export_worker.finished.connect(lambda: (self.button_export_png.setEnabled(True),
+                                                     self.button_export_frames.setEnabled(True)))
+        self.export_worker.start()
+
+    @pyqtSlot()
+    def export_snapshot(self) -> None:
+        """
+        Экспорт текущего вида в PNG программной отрисовкой без OpenGL. Отрисовка и сжатие выполняются в потоке,
+        размер кадра и камера берутся из окна графика
+
+        :return: None
+        """
+        if self.points is None or self.export_running():
+            return
+        os.makedirs('data/local', exist_ok=True)
+        path: str = f'data/local/render_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.png'
+        points, colors = self.points.copy(), self.colors.copy()
+        camera: Camera = self.current_camera()
+        width, height = self.graph_system.view.width(), self.graph_system.view.height()
+        point_size: int = max(1, int(round(self.point_size))) if self.px_mode else 2
+
+        def render() -> str:
+            save_png(path, render_points(points, colors, camera, width, height, point_size))
+            return path
+
+        self.start_export_worker(render)
+
+    @pyqtSlot()
+    def export_threshold_frames(self) -> None:
+        if self.points is None or self.export_running():
+            return
+        text, ok = QInputDialog.getText(self, 'Кадры по порогам', 'Пороги (начало, конец, шаг):', text="1, 20, 1")
+        if not ok:
+            return
+        try:
+            start, stop, step = (float(value) for value in text.split(','))
+            if not step > 0:
+                raise ValueError(f"Threshold step must be positive, got {step}")
+            thresholds: np.ndarray = np.arange(start, stop + step / 2, step)
+        except ValueError as e:
+            print_e(e)
+            return
+        out_dir: str = f'data/local/frames_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+        if self.current_data_method() is ClusterizationDataMethod.SAMPLE_ASSIGN:
+            # Кадры - все точки с метками приближённого режима, как в основном окне, а не только выборка
+            points, data_method = self.points.copy(), ClusterizationDataMethod.SAMPLE_ASSIGN
+        else:
+            points, data_method = self.threshold_input()
+        self.start_export_worker(export_threshold_frames, points, thresholds, out_dir,
+                                 self.current_camera(), self.graph_system.view.width(),
+                                 self.graph_system.view.height(),
+                                 point_size=max(1, int(round(self.point_size))) if self.px_mode else 2,
+                                 data_method=data_method,
+                                 random_seed=self.current_random_seed(),
+                                 sample_size=self.mf.settings.cluster_settings.sample_size,
+                                 unmatched_policy=self.mf.settings.cluster_settings.unmatched_policy)
+
+    @pyqtSlot(object)
+    def on_export_ready(self, result: Union[str, FrameExport]) -> None:
+        if isinstance(result, FrameExport):
+            print_d(f"Exported {len(result.paths)} frames to {os.path.dirname(result.paths[0])}"
+                    if result.paths else "No frames exported")
+        else:
+            print_d(f"Exported snapshot {result}")
+
     def take_screenshot(self) -> None:
         screen = QtWidgets.QApplication.primaryScreen()
         print_d(self.graph_system.mapToGlobal(self.pos()))
@@ -10,6 +10,7 @@ from PyQt6.QtGui import QColor
 from src.core.point_system import Point
 from src.core.log_system import print_e, print_d
 from src.global_constants import VERSION
+from src.enums import MemoryBudgetPolicy, UnmatchedPointPolicy
 
 
 @dataclass()
@@ -31,15 +32,33 @@ class GraphSettings:
     point_size: float
 
 
+@dataclass
+class ClusterSettings:
+    # Ограничение памяти на запуск кластеризации, МБ (0 - без ограничения)
+    memory_budget_mb: int
+    memory_budget_policy: MemoryBudgetPolicy
+    # Приближённый режим: размер выборки и обработка точек, не попавших ни в один кластер
+    sample_size: int
+    unmatched_policy: UnmatchedPointPolicy
+    # Ограничение памяти истории запусков, МБ
+    history_memory_mb: int
+    # Количество процессов параллельной кластеризации (0 - по количеству ядер)
+    workers: int
+
+
 class SettingsDataObject:
     def __init__(self):
         self.system_settings = SystemSettings(form_width=1600, form_height=900, form_position=Point(-1.0, -1.0),
                                               last_file="", last_folder="", open_dir="", open_filename="",
                                               console_height=206, version=f"{VERSION}")
         self.graph_settings = GraphSettings(px_mode=False, point_size=5.)
+        self.cluster_settings = ClusterSettings(memory_budget_mb=0, memory_budget_policy=MemoryBudgetPolicy.DOWNGRADE,
+                                                sample_size=100_000,
+                                                unmatched_policy=UnmatchedPointPolicy.NEAREST,
+                                                history_memory_mb=64, workers=0)
 
     def __repr__(self) -> str:
-        return f"SettingsDataObject({self.system_settings}, {self.graph_settings})"
+        return f"SettingsDataObject({self.system_settings}, {self.graph_settings}, {self.cluster_settings})"
 
     @staticmethod
     def data_to_str(data: Any) -> str:
@@ -54,9 +73,8 @@ class SettingsDataObject:
 
     @staticmethod
     def data_from_str(data: str, data_type: type) -> Any:
-        # future
-        # if data_type is EnumClass:
-        #     return data_type[data]  # noqa
+        if isinstance(data_type, type) and issubclass(data_type, Enum):
+            return data_type[data]  # noqa
         if data_type is QColor:
             return QColor(data)
         elif data_type is Point:
@@ -68,7 +86,7 @@ class SettingsDataObject:
 
     def save_to_ini(self, save_path: str) -> None:
         conf = configparser.ConfigParser()
-        for class_field in [self.system_settings, self.graph_settings]:
+        for class_field in [self.system_settings, self.graph_settings, self.cluster_settings]:
             conf.add_section(class_field.__class__.__name__)
             for data_field in fields(class_field):
                 conf.set(class_field.__class__.__name__, data_field.name,
@@ -81,7 +99,7 @@ class SettingsDataObject:
             config = configparser.ConfigParser()
             config.read(file, encoding='UTF-8')
             field_dict: Dict[str, Tuple[object, type]] = {}
-            for class_field in [self.system_settings, self.graph_settings]:
+            for class_field in [self.system_settings, self.graph_settings, self.cluster_settings]:
                 for data_field in fields(class_field):
                     field_dict[data_field.name] = (class_field, data_field.type)
             for each_section in config.sections():
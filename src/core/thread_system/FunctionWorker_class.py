@@ -0,0 +1,28 @@
+from typing import Callable, Any
+
+from PyQt6 import QtCore
+from PyQt6.QtCore import QThread
+
+from src.core.log_system import print_e, print_traceback
+
+
+class FunctionWorker(QThread):
+    """
+    Выполнение функции в отдельном потоке, чтобы не блокировать интерфейс
+    """
+    resultReady = QtCore.pyqtSignal(object)
+    errorRaised = QtCore.pyqtSignal(str)
+
+    def __init__(self, function: Callable[..., Any], *args, **kwargs):
+        super(FunctionWorker, self).__init__()
+        self.function: Callable[..., Any] = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self) -> None:
+        try:
+            self.resultReady.emit(self.function(*self.args, **self.kwargs))
+        except Exception as e:
+            print_e(e)
+            print_traceback()
+            self.errorRaised.emit(str(e))
@@ -0,0 +1 @@
+from .FunctionWorker_class import FunctionWorker
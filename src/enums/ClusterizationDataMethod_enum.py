@@ -4,5 +4,11 @@ from enum import Enum
 class ClusterizationDataMethod(Enum):
     FORWARD = 0,
     REVERSE = 1,
-    SHUFFLE = 2
+    SHUFFLE = 2,
+    # Компоненты графа соседей, результат не зависит от порядка точек
+    NEIGHBOR_GRAPH = 3,
+    # Точный алгоритм на случайной выборке и назначение остальных точек (приближённо, для больших N)
+    SAMPLE_ASSIGN = 4,
+    # Параллельно по областям пространства с объединением кластеров на границах
+    SHARDED = 5
 
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class DistanceMetric(Enum):
+    # Диагональная матрица отклонений, как в `euclid_disp`
+    DIAGONAL = 0,
+    # Полная ковариационная матрица кластера (расстояние Махаланобиса)
+    MAHALANOBIS = 1
@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class MemoryBudgetPolicy(Enum):
+    REJECT = 0,
+    DOWNGRADE = 1
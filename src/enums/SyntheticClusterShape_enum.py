@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class SyntheticClusterShape(Enum):
+    UNIFORM = 0,
+    BLOBS = 1,
+    ANISOTROPIC = 2,
+    VARIED_DENSITY = 3
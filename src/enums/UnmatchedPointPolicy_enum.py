@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class UnmatchedPointPolicy(Enum):
+    NEAREST = 0,
+    NEW_CLUSTERS = 1,
+    NOISE = 2
@@ -1 +1,5 @@
 from .ClusterizationDataMethod_enum import ClusterizationDataMethod
+from .SyntheticClusterShape_enum import SyntheticClusterShape
+from .MemoryBudgetPolicy_enum import MemoryBudgetPolicy
+from .UnmatchedPointPolicy_enum import UnmatchedPointPolicy
+from .DistanceMetric_enum import DistanceMetric
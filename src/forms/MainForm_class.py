@@ -85,6 +85,8 @@ class MainForm(QMainWindow):
     def keyPressEvent(self, event: QKeyEvent):
         if event.key() == Qt.Key.Key_S.value:
             self.point_graph.take_screenshot()
+        elif event.key() == Qt.Key.Key_R.value:
+            self.point_graph.export_snapshot()
 
     def load_ann_models(self) -> None:
         pass
@@ -0,0 +1,131 @@
+import copy
+from dataclasses import dataclass, field
+from typing import Optional, List
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod, DistanceMetric
+from src.function_lib.cluster import ClusterState, threshold_pass, data_order, make_cluster_state
+
+# Начальный шаг контрольных точек и ограничение их памяти: при превышении остаётся каждая вторая точка
+CHECKPOINT_EVERY = 256
+CHECKPOINT_MEMORY = 64 * 1024 * 1024
+
+
+def _snapshot(state: ClusterState) -> ClusterState:
+    """
+    Копия состояния только с заполненной частью массивов
+    """
+    snapshot: ClusterState = copy.copy(state)
+    for name in state._arrays:
+        setattr(snapshot, name, getattr(state, name)[:state.size].copy())
+    return snapshot
+
+
+@dataclass
+class AssignmentTrace:
+    values: np.ndarray
+    threshold: float
+    data_method: ClusterizationDataMethod
+    random_seed: Optional[int]
+    # Для каждого шага прохода: индекс точки, выбранный кластер (начиная с 1), количество проверенных кластеров
+    # и наименьшее расстояние до проверенных кластеров (inf на первом шаге)
+    point_index: np.ndarray
+    cluster: np.ndarray
+    examined: np.ndarray
+    best_distance: np.ndarray
+    # Статистика кластеров перед шагами 0, checkpoint_every, 2 * checkpoint_every, ...
+    checkpoint_every: int = CHECKPOINT_EVERY
+    checkpoints: List[ClusterState] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return self.point_index.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        arrays: tuple = (self.point_index, self.cluster, self.examined, self.best_distance)
+        return sum(array.nbytes for array in arrays) + sum(state.nbytes for state in self.checkpoints)
+
+    def labels_at(self, step: int) -> np.ndarray:
+        """
+        Метки после `step` шагов: метка точки не меняется после назначения, поэтому это метки первых шагов
+
+        :param step: Количество выполненных шагов (0..N)
+        :return: Метки (N,) в исходном порядке точек, 0 - точка ещё не назначена
+        """
+        labels: np.ndarray = np.zeros(len(self), dtype=self.cluster.dtype)
+        labels[self.point_index[:step]] = self.cluster[:step]
+        return labels
+
+    def state_at(self, step: int) -> ClusterState:
+        """
+        Статистика кластеров после `step` шагов: ближайшая предыдущая контрольная точка и не больше
+        `checkpoint_every` повторённых добавлений точек (те же операции, что и в проходе)
+
+        :param step: Количество выполненных шагов (0..N)
+        :return: Новое состояние кластеров
+        """
+        position: int = min(step // self.checkpoint_every, len(self.checkpoints) - 1)
+        state: ClusterState = _snapshot(self.checkpoints[position])
+        for elem_index in range(position * self.checkpoint_every, step):
+            point: np.ndarray = np.asarray(self.values[self.point_index[elem_index]], dtype=float)
+            cluster_index: int = int(self.cluster[elem_index]) - 1
+            if cluster_index == state.size:
+                state.new_cluster(point)
+            else:
+                state.add(cluster_index, point)
+        return state
+
+
+def record_trace(input_array: np.ndarray,
+                 threshold: float,
+                 data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                 random_seed: Optional[int] = None,
+                 metric: DistanceMetric = DistanceMetric.DIAGONAL,
+                 checkpoint_every: int = CHECKPOINT_EVERY,
+                 checkpoint_memory: int = CHECKPOINT_MEMORY) -> AssignmentTrace:
+    """
+    Последовательная кластеризация с записью каждого шага для пошагового просмотра. Метки совпадают
+    с `clusterization_threshold` с теми же параметрами
+
+    :param input_array: Входной массив (N, d)
+    :param threshold: Порог
+    :param data_method: Метод пред-обработки данных (FORWARD, REVERSE или SHUFFLE)
+    :param random_seed: Seed для SHUFFLE
+    :param metric: Мера расстояния
+    :param checkpoint_every: Начальный шаг контрольных точек статистики
+    :param checkpoint_memory: Ограничение памяти контрольных точек, байты
+    :return: Запись прохода
+    """
+    if data_method not in (ClusterizationDataMethod.FORWARD, ClusterizationDataMethod.REVERSE,
+                           ClusterizationDataMethod.SHUFFLE):
+        raise ValueError(f"Assignment trace is not supported for {data_method.name}")
+    values: np.ndarray = np.asarray(input_array, dtype=float)
+    array_size: int = values.shape[0]
+    index_dtype: type = np.int32 if array_size < 2 ** 31 else np.int64
+    indexes: np.ndarray = data_order(array_size, data_method, random_seed).astype(index_dtype)
+    ordered: np.ndarray = values if data_method is ClusterizationDataMethod.FORWARD else values[indexes]
+    cluster: np.ndarray = np.zeros(array_size, dtype=np.int32)
+    examined: np.ndarray = np.zeros(array_size, dtype=np.int32)
+    best_distance: np.ndarray = np.zeros(array_size, dtype=np.float32)
+    state: ClusterState = make_cluster_state(values, metric)
+
+    trace = AssignmentTrace(values=input_array, threshold=threshold, data_method=data_method, random_seed=random_seed,
+                            point_index=indexes, cluster=cluster, examined=examined, best_distance=best_distance,
+                            checkpoint_every=checkpoint_every)
+    start: int = 0
+    while True:
+        if start % trace.checkpoint_every == 0:
+            trace.checkpoints.append(_snapshot(state))
+            if sum(checkpoint.nbytes for checkpoint in trace.checkpoints) > checkpoint_memory \
+                    and len(trace.checkpoints) > 1:
+                # Прореживание: шаг контрольных точек удваивается
+                trace.checkpoints = trace.checkpoints[::2]
+                trace.checkpoint_every *= 2
+        if start >= array_size:
+            break
+        end: int = min((start // trace.checkpoint_every + 1) * trace.checkpoint_every, array_size)
+        threshold_pass(ordered[:end], threshold, cluster[:end], state, start,
+                       examined=examined[:end], best_dist=best_distance[:end])
+        start = end
+    return trace
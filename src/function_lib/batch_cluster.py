@@ -0,0 +1,156 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union, Sequence, List
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.cluster import disp_weights, data_order
+from src.function_lib.shared_dataset import SharedDataset, SharedArraySpec, attach, detach
+
+# Количество наборов, обрабатываемых одним векторным проходом (и одной задачей пула процессов)
+BATCH_SETS = 2048
+
+
+def _batch_pass(values: np.ndarray,
+                starts: np.ndarray,
+                lengths: np.ndarray,
+                thresholds: np.ndarray,
+                labels_out: np.ndarray) -> None:
+    """
+    Пороговая кластеризация нескольких наборов одновременно: шаг `i` выполняется сразу для `i`-х точек всех
+    наборов, поэтому количество итераций Python - длина самого большого набора, а не количество всех точек.
+    Каждый набор обрабатывается ровно так же, как `threshold_pass`.
+
+    :param values: Все точки (N, d)
+    :param starts: Начала наборов в `values`, наборы упорядочены по убыванию длины
+    :param lengths: Длины наборов (по убыванию)
+    :param thresholds: Пороги наборов
+    :param labels_out: Буфер меток всех точек (N,), заполняется на месте (метки каждого набора начинаются с 1)
+    """
+    n_sets: int = starts.shape[0]
+    dim: int = values.shape[1]
+    capacity: int = 16
+    size: np.ndarray = np.zeros(n_sets, dtype=np.int64)
+    counts: np.ndarray = np.zeros((n_sets, capacity), dtype=np.int64)
+    means: np.ndarray = np.zeros((n_sets, capacity, dim))
+    m2: np.ndarray = np.zeros((n_sets, capacity, dim))
+    weights: np.ndarray = np.zeros((n_sets, capacity, dim))
+    # Длины по убыванию: на шаге `step` активны первые `active[step]` наборов
+    active: np.ndarray = np.searchsorted(-lengths, -np.arange(int(lengths[0]) if n_sets else 0), side='left')
+    for step, count in enumerate(active):
+        rows: np.ndarray = np.arange(count)
+        position: np.ndarray = starts[:count] + step
+        point: np.ndarray = values[position]
+        cluster: np.ndarray = size[:count].copy()
+        matched: np.ndarray = np.zeros(count, dtype=bool)
+        if step:
+            width: int = int(size[:count].max())
+            delta: np.ndarray = means[:count, :width] - point[:, None]
+            dist: np.ndarray = (delta * delta * weights[:count, :width]).sum(axis=2)
+            accepted: np.ndarray = (dist <= thresholds[:count, None]) & (np.arange(width) < size[:count, None])
+            first: np.ndarray = accepted.argmax(axis=1)
+            matched = accepted[rows, first]
+            cluster[matched] = first[matched]
+
+        # Точки, принятые существующими кластерами (метод Уэлфорда)
+        rows_add, cluster_add, point_add = rows[matched], cluster[matched], point[matched]
+        counts[rows_add, cluster_add] += 1
+        shift: np.ndarray = point_add - means[rows_add, cluster_add]
+        means[rows_add, cluster_add] += shift / counts[rows_add, cluster_add][:, None]
+        m2[rows_add, cluster_add] += shift * (point_add - means[rows_add, cluster_add])
+        weights[rows_add, cluster_add] = disp_weights(np.sqrt(m2[rows_add, cluster_add] /
+                                                              counts[rows_add, cluster_add][:, None]))
+
+        # Новые кластеры
+        rows_new: np.ndarray = rows[~matched]
+        if rows_new.size and int(size[rows_new].max()) == capacity:
+            capacity *= 2
+            counts = np.pad(counts, ((0, 0), (0, capacity - counts.shape[1])))
+            means, m2, weights = (np.pad(array, ((0, 0), (0, capacity - array.shape[1]), (0, 0)))
+                                  for array in (means, m2, weights))
+        cluster_new: np.ndarray = cluster[~matched]
+        counts[rows_new, cluster_new] = 1
+        means[rows_new, cluster_new] = point[~matched]
+        size[rows_new] += 1
+        labels_out[position] = cluster + 1
+
+
+def _batch_pass_shared(points_spec: SharedArraySpec,
+                       labels_spec: SharedArraySpec,
+                       starts: np.ndarray,
+                       lengths: np.ndarray,
+                       thresholds: np.ndarray) -> None:
+    try:
+        _batch_pass(attach(points_spec), starts, lengths, thresholds, attach(labels_spec))
+    finally:
+        detach(points_spec, labels_spec)
+
+
+def batch_clusterization(values: np.ndarray,
+                         offsets: np.ndarray,
+                         threshold: Union[float, Sequence[float], np.ndarray],
+                         data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                         random_seed: Optional[int] = None,
+                         workers: Optional[int] = None,
+                         batch_sets: int = BATCH_SETS) -> np.ndarray:
+    """
+    Пороговая кластеризация множества небольших независимых наборов точек за один вызов.
+    Наборы хранятся подряд: набор `i` - строки `values[offsets[i]:offsets[i + 1]]`. Наборы группируются по
+    `batch_sets` близкой длины и кластеризуются векторно по шагам (см. `_batch_pass`); группы распределяются
+    по процессам, точки и метки передаются через общую память. Результат для каждого набора совпадает
+    с `clusterization_threshold` этого набора.
+
+    :param values: Точки всех наборов (N, d)
+    :param offsets: Границы наборов (M + 1,): offsets[0] = 0, offsets[-1] = N, по неубыванию
+    :param threshold: Порог, общий или для каждого набора (M,)
+    :param data_method: Метод пред-обработки данных (FORWARD, REVERSE или SHUFFLE), применяется к каждому набору
+    :param random_seed: Seed для SHUFFLE, одинаковый для всех наборов
+    :param workers: Количество процессов. По умолчанию - количество ядер, 1 - без пула процессов
+    :param batch_sets: Количество наборов в группе
+    :return: Метки (N,) в том же порядке, для каждого набора начиная с 1
+    """
+    values = np.asarray(values, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if offsets.ndim != 1 or not offsets.size or offsets[0] != 0 or offsets[-1] != values.shape[0] \
+            or (np.diff(offsets) < 0).any():
+        raise ValueError("offsets must be non-decreasing, start at 0 and end at len(values)")
+    if data_method not in (ClusterizationDataMethod.FORWARD, ClusterizationDataMethod.REVERSE,
+                           ClusterizationDataMethod.SHUFFLE):
+        raise ValueError(f"Batched clusterization is not supported for {data_method.name}")
+    lengths: np.ndarray = np.diff(offsets)
+    thresholds: np.ndarray = np.broadcast_to(np.asarray(threshold, dtype=float), lengths.shape)
+
+    # Порядок перебора внутри каждого набора - перестановка строк всего массива
+    order: Optional[np.ndarray] = None
+    if data_method is ClusterizationDataMethod.REVERSE:
+        order = np.repeat(offsets[1:] - 1, lengths) - (np.arange(values.shape[0]) - np.repeat(offsets[:-1], lengths))
+    elif data_method is ClusterizationDataMethod.SHUFFLE:
+        order = np.concatenate([start + data_order(length, data_method, random_seed)
+                                for start, length in zip(offsets[:-1], lengths)] + [np.zeros(0, dtype=np.int64)])
+    ordered: np.ndarray = values[order] if order is not None else values
+
+    # Группы наборов близкой длины, чтобы в каждом шаге было меньше закончившихся наборов
+    by_length: np.ndarray = np.argsort(-lengths, kind='stable')
+    by_length = by_length[lengths[by_length] > 0]
+    groups: List[np.ndarray] = [by_length[start:start + batch_sets]
+                                for start in range(0, by_length.shape[0], batch_sets)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(groups) <= 1:
+        labels: np.ndarray = np.zeros(values.shape[0], dtype=np.int64)
+        for group in groups:
+            _batch_pass(ordered, offsets[group], lengths[group], thresholds[group], labels)
+    else:
+        with SharedDataset(ordered) as dataset, \
+                ProcessPoolExecutor(max_workers=min(workers, len(groups))) as executor:
+            list(executor.map(_batch_pass_shared, [dataset.points_spec] * len(groups),
+                              [dataset.labels_spec] * len(groups), [offsets[group] for group in groups],
+                              [lengths[group] for group in groups], [thresholds[group] for group in groups]))
+            labels = dataset.labels.array.astype(np.int64)
+
+    if order is not None:
+        restored: np.ndarray = np.empty_like(labels)
+        restored[order] = labels
+        labels = restored
+    return labels
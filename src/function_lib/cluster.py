@@ -1,8 +1,9 @@
+import copy
 from typing import Optional
 
 import numpy as np
 
-from src.enums import ClusterizationDataMethod
+from src.enums import ClusterizationDataMethod, DistanceMetric
 
 
 def euclid_disp(v_x: np.ndarray, e_cl: np.ndarray) -> np.ndarray:
@@ -28,10 +29,280 @@ def euclid_disp(v_x: np.ndarray, e_cl: np.ndarray) -> np.ndarray:
     return np.dot(delta @ d_mat_inv, delta.T)
 
 
+def disp_weights(std: np.ndarray) -> np.ndarray:
+    """
+    Веса признаков для расстояния с учётом дисперсии (векторный аналог `euclid_disp` для набора кластеров).
+
+    Если матрица дисперсий кластера вырождена (есть нулевое отклонение), `euclid_disp` использует её саму вместо
+    обратной, поэтому для таких кластеров весами остаются сами отклонения.
+
+    :param std: Среднеквадратичные отклонения кластеров (K, d)
+    :return: Веса (K, d), расстояние равно sum(delta ** 2 * weights)
+    """
+    std = np.atleast_2d(np.asarray(std, dtype=float))
+    singular: np.ndarray = (std == 0).any(axis=1)
+    with np.errstate(divide='ignore'):
+        weights: np.ndarray = 1.0 / std
+    weights[singular] = std[singular]
+    return weights
+
+
+class ClusterState:
+    """
+    Инкрементальная статистика кластеров: количество точек, среднее и сумма квадратов отклонений (метод Уэлфорда).
+    Номер кластера в состоянии начинается с 0, в массиве меток - с 1.
+    """
+    # Массивы по кластерам (первая ось - номер кластера)
+    _arrays: tuple = ('counts', 'means', 'm2', 'weights')
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.dim: int = dim
+        self.size: int = 0
+        self.counts: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.means: np.ndarray = np.zeros((capacity, dim))
+        self.m2: np.ndarray = np.zeros((capacity, dim))
+        self.weights: np.ndarray = np.zeros((capacity, dim))
+
+    def _grow(self) -> None:
+        capacity: int = max(16, self.counts.shape[0] * 2)
+        for name in self._arrays:
+            old: np.ndarray = getattr(self, name)
+            new: np.ndarray = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self._arrays)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2[:self.size] / self.counts[:self.size, None])
+
+    def distances(self, point: np.ndarray) -> np.ndarray:
+        """
+        Расстояния от точки до всех кластеров (та же мера, что и в `euclid_disp`)
+
+        :param point: Вектор признаков
+        :return: Массив расстояний (K,)
+        """
+        delta: np.ndarray = self.means[:self.size] - point
+        return (delta * delta * self.weights[:self.size]).sum(axis=1)
+
+    def new_cluster(self, point: np.ndarray) -> int:
+        if self.size == self.counts.shape[0]:
+            self._grow()
+        index: int = self.size
+        self.size += 1
+        self.counts[index] = 1
+        self.means[index] = point
+        self.m2[index] = 0.0
+        self.weights[index] = 0.0
+        return index
+
+    def add(self, index: int, point: np.ndarray) -> None:
+        self.counts[index] += 1
+        delta: np.ndarray = point - self.means[index]
+        self.means[index] += delta / self.counts[index]
+        self.m2[index] += delta * (point - self.means[index])
+        self.weights[index] = disp_weights(np.sqrt(self.m2[index] / self.counts[index]))[0]
+
+    def copy(self) -> 'ClusterState':
+        state: 'ClusterState' = copy.copy(self)
+        for name in self._arrays:
+            setattr(state, name, getattr(self, name).copy())
+        return state
+
+    @classmethod
+    def from_labels(cls, values: np.ndarray, labels: np.ndarray, n_clusters: Optional[int] = None) -> 'ClusterState':
+        """
+        Восстановление статистики по готовым меткам (векторно, без последовательного прохода)
+
+        :param values: Точки (N, d)
+        :param labels: Метки кластеров (N,), начиная с 1
+        :param n_clusters: Количество кластеров. По умолчанию - максимальная метка
+        :return: Состояние кластеров
+        """
+        values = np.asarray(values, dtype=float)
+        index: np.ndarray = np.asarray(labels, dtype=np.int64) - 1
+        size: int = int(index.max()) + 1 if n_clusters is None and index.size else (n_clusters or 0)
+        state = cls(values.shape[1], max(16, size))
+        state.size = size
+        if not index.size:
+            return state
+        counts: np.ndarray = np.bincount(index, minlength=size)
+        sums: np.ndarray = np.zeros((size, values.shape[1]))
+        np.add.at(sums, index, values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means: np.ndarray = sums / counts[:, None]
+        delta: np.ndarray = values - means[index]
+        m2: np.ndarray = np.zeros((size, values.shape[1]))
+        np.add.at(m2, index, delta * delta)
+        # Одинаковые значения признака дают ровно нулевое отклонение, как и при последовательном расчёте
+        low: np.ndarray = np.full((size, values.shape[1]), np.inf)
+        high: np.ndarray = np.full((size, values.shape[1]), -np.inf)
+        np.minimum.at(low, index, values)
+        np.maximum.at(high, index, values)
+        constant: np.ndarray = low == high
+        means[constant] = low[constant]
+        m2[constant] = 0.0
+        state.counts[:size] = counts
+        state.means[:size] = means
+        state.m2[:size] = m2
+        filled: np.ndarray = counts > 0
+        state.weights[:size][filled] = disp_weights(np.sqrt(m2[filled] / counts[filled, None]))
+        return state
+
+
+def make_cluster_state(input_array: np.ndarray,
+                       metric: DistanceMetric = DistanceMetric.DIAGONAL,
+                       prior_strength: float = 1.0) -> ClusterState:
+    """
+    Пустое состояние кластеров для меры расстояния
+
+    :param input_array: Входной массив (N, d), для MAHALANOBIS задаёт априорную дисперсию признаков
+    :param metric: Мера расстояния
+    :param prior_strength: Вес априорной ковариации в точках для MAHALANOBIS
+    :return: Состояние кластеров
+    """
+    if metric is DistanceMetric.MAHALANOBIS:
+        from src.function_lib.mahalanobis import CovarianceClusterState, feature_variance
+        return CovarianceClusterState(input_array.shape[1], prior=feature_variance(input_array),
+                                      prior_strength=prior_strength)
+    return ClusterState(input_array.shape[1])
+
+
+def data_order(array_size: int,
+               data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+               random_seed: Optional[int] = None) -> np.ndarray:
+    """
+    Порядок перебора точек для метода пред-обработки данных
+
+    :param array_size: Количество точек
+    :param data_method: Метод пред-обработки данных
+    :param random_seed: Seed для случайного перемешивания точек. По умолчанию отключено
+    :return: Массив индексов точек в порядке перебора
+    """
+    indexes: np.ndarray = np.arange(array_size)
+    if data_method is ClusterizationDataMethod.SHUFFLE:
+        np.random.seed(random_seed)
+        np.random.shuffle(indexes)
+    elif data_method is ClusterizationDataMethod.REVERSE:
+        indexes = indexes[::-1]
+    return indexes
+
+
+def restore_order(cluster: np.ndarray, indexes: np.ndarray) -> np.ndarray:
+    """
+    Возвращение меток к исходному порядку точек
+
+    :param cluster: Метки в порядке перебора
+    :param indexes: Порядок перебора (см. `data_order`)
+    :return: Метки в исходном порядке точек
+    """
+    restored: np.ndarray = np.empty_like(cluster)
+    restored[indexes] = cluster
+    return restored
+
+
+def threshold_pass(values: np.ndarray,
+                   threshold: float,
+                   cluster: np.ndarray,
+                   state: ClusterState,
+                   start: int = 0,
+                   reject_min: Optional[np.ndarray] = None,
+                   accept_dist: Optional[np.ndarray] = None,
+                   max_clusters: Optional[int] = None,
+                   order: Optional[np.ndarray] = None,
+                   examined: Optional[np.ndarray] = None,
+                   best_dist: Optional[np.ndarray] = None) -> int:
+    """
+    Последовательный проход пороговой кластеризации по упорядоченным точкам, начиная с точки `start`.
+    Точка попадает в первый по номеру кластер, расстояние до которого не больше порога, иначе создаёт новый.
+
+    :param values: Упорядоченные точки (N, d)
+    :param threshold: Порог
+    :param cluster: Массив меток (N,), заполняется на месте с позиции `start`
+    :param state: Статистика кластеров, соответствующая меткам `cluster[:start]`
+    :param start: Позиция, с которой продолжить проход
+    :param reject_min: Необязательный массив (N,) для минимального расстояния до отвергнутых кластеров на каждом шаге
+    :param accept_dist: Необязательный массив (N,) для расстояния до выбранного кластера (-inf для нового кластера)
+    :param max_clusters: Остановить проход, как только количество кластеров превысит это значение
+    :param order: Порядок перебора точек, если `values` не упорядочены заранее (без копирования массива)
+    :param examined: Необязательный массив (N,) для количества проверенных кластеров на каждом шаге
+    :param best_dist: Необязательный массив (N,) для наименьшего расстояния до проверенных кластеров (inf, если нет)
+    :return: Позиция, до которой выполнен проход (N, если проход не остановлен)
+    """
+    array_size: int = values.shape[0]
+    if start == 0 and array_size:
+        state.new_cluster(values[order[0] if order is not None else 0])
+        cluster[0] = 1
+        if reject_min is not None:
+            reject_min[0] = np.inf
+        if accept_dist is not None:
+            accept_dist[0] = -np.inf
+        if examined is not None:
+            examined[0] = 0
+        if best_dist is not None:
+            best_dist[0] = np.inf
+        start = 1
+    for elem_index in range(start, array_size):
+        if max_clusters is not None and state.size > max_clusters:
+            return elem_index
+        elem_val: np.ndarray = values[order[elem_index] if order is not None else elem_index]
+        dist: np.ndarray = state.distances(elem_val)
+        accepted: np.ndarray = dist <= threshold
+        cluster_index: int = int(accepted.argmax())
+        if accepted[cluster_index]:
+            state.add(cluster_index, elem_val)
+        else:
+            cluster_index = state.new_cluster(elem_val)
+        cluster[elem_index] = cluster_index + 1
+        if reject_min is not None:
+            reject_min[elem_index] = dist[:cluster_index].min() if cluster_index else np.inf
+        if accept_dist is not None:
+            accept_dist[elem_index] = dist[cluster_index] if cluster_index < dist.shape[0] else -np.inf
+        if examined is not None or best_dist is not None:
+            # Кластеры проверяются по порядку до первого подходящего
+            checked: int = min(cluster_index + 1, dist.shape[0])
+            if examined is not None:
+                examined[elem_index] = checked
+            if best_dist is not None:
+                best_dist[elem_index] = dist[:checked].min() if checked else np.inf
+    return array_size
+
+
+def clusterization_threshold_append(input_array: np.ndarray,
+                                    threshold: float,
+                                    cluster: np.ndarray,
+                                    state: ClusterState) -> np.ndarray:
+    """
+    Дополнение прямой (FORWARD) кластеризации точками, добавленными в конец массива.
+    Метки уже обработанных точек не меняются, новые точки распределяются так же, как при полном прогоне.
+
+    :param input_array: Весь входной массив, начало которого уже кластеризовано
+    :param threshold: Порог, с которым получены `cluster` и `state`
+    :param cluster: Метки начала массива
+    :param state: Статистика кластеров для `cluster`, обновляется на месте
+    :return: Метки всего массива
+    """
+    input_array = np.asarray(input_array, dtype=float)
+    start: int = cluster.shape[0]
+    new_cluster: np.ndarray = np.zeros(input_array.shape[0], dtype=cluster.dtype)
+    new_cluster[:start] = cluster
+    threshold_pass(input_array, threshold, new_cluster, state, start)
+    return new_cluster
+
+
 def clusterization_threshold(input_array: np.ndarray,
                              threshold: float,
                              data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
-                             random_seed: Optional[int] = None) -> np.ndarray:
+                             random_seed: Optional[int] = None,
+                             state: Optional[ClusterState] = None,
+                             compact: bool = False,
+                             metric: DistanceMetric = DistanceMetric.DIAGONAL,
+                             prior_strength: float = 1.0,
+                             workers: Optional[int] = None) -> np.ndarray:
     """
     Выполнение кластеризации с использованием порогового метода
 
@@ -39,44 +310,54 @@ def clusterization_threshold(input_array: np.ndarray,
     :param threshold: Порог
     :param data_method: Метод пред-обработки данных
     :param random_seed: Seed для случайного перемешивания точек. По умолчанию отключено
-    :return: None
+    :param state: Пустое состояние кластеров, которое нужно заполнить (например, для последующего дополнения точек).
+                  Для NEIGHBOR_GRAPH, SAMPLE_ASSIGN и SHARDED не используется
+    :param compact: Экономный режим: перемешанные точки не копируются, метки хранятся в int32
+    :param metric: Мера расстояния. MAHALANOBIS - только для последовательных методов (FORWARD, REVERSE, SHUFFLE)
+    :param prior_strength: Вес априорной ковариации (дисперсии всего набора) в точках для MAHALANOBIS
+    :param workers: Количество процессов для SHARDED. По умолчанию - количество ядер
+    :return: Метки кластеров (начиная с 1) в исходном порядке точек
     """
+    input_array = np.asarray(input_array, dtype=float)
+    if metric is DistanceMetric.MAHALANOBIS and data_method not in (ClusterizationDataMethod.FORWARD,
+                                                                    ClusterizationDataMethod.REVERSE,
+                                                                    ClusterizationDataMethod.SHUFFLE):
+        raise ValueError(f"Mahalanobis distance is not supported for {data_method.name}")
+    if data_method is ClusterizationDataMethod.NEIGHBOR_GRAPH:
+        # Импорт внутри функции: модули остальных режимов сами используют этот модуль
+        from src.function_lib.neighbor_graph import neighbor_graph_labels
+        labels: np.ndarray = neighbor_graph_labels(input_array, threshold)
+        return labels.astype(np.int32) if compact else labels
+    if data_method is ClusterizationDataMethod.SAMPLE_ASSIGN:
+        from src.function_lib.sample_assign import sample_assign_clusterization
+        labels = sample_assign_clusterization(input_array, threshold, random_seed=random_seed).labels
+        return labels.astype(np.int32) if compact else labels
+    if data_method is ClusterizationDataMethod.SHARDED:
+        from src.function_lib.sharded_cluster import sharded_clusterization
+        labels = sharded_clusterization(input_array, threshold, workers=workers).labels
+        return labels.astype(np.int32) if compact else labels
     array_size: int = input_array.shape[0]
-    cluster: np.ndarray = np.zeros((array_size), dtype=int)  # noqa
+    cluster: np.ndarray = np.zeros((array_size), dtype=np.int32 if compact else int)  # noqa
 
-    # Предобработка данных
-    indexes: np.ndarray = np.arange(array_size)
-    if data_method is ClusterizationDataMethod.SHUFFLE:
-        np.random.seed(random_seed)
-        np.random.shuffle(indexes)
-        input_array = input_array[indexes]
-    elif data_method is ClusterizationDataMethod.REVERSE:
-        indexes = indexes[::-1]
-        input_array = input_array[indexes]
-
-    # region Кластеризация
-    cluster[0] = 1
-    for elem_index, elem_val in enumerate(input_array[1:]):
-        elem_val: np.ndarray
-        for cluster_index in range(1, cluster.max() + 1):
-            cluster_vals = input_array[np.where(cluster == cluster_index)]
-            dist = euclid_disp(elem_val, cluster_vals)
-            if (np.abs(dist) <= threshold).all():
-                cluster[elem_index + 1] = cluster_index
-                break
-            else:
-                continue
+    # Предобработка данных (обратный порядок - представление без копирования)
+    indexes: np.ndarray = data_order(array_size, data_method, random_seed)
+    order: Optional[np.ndarray] = None
+    if data_method is ClusterizationDataMethod.REVERSE:
+        input_array = input_array[::-1]
+    elif data_method is ClusterizationDataMethod.SHUFFLE:
+        if compact:
+            order = indexes
         else:
-            cluster[elem_index + 1] = cluster.max() + 1
-    # endregion
+            input_array = input_array[indexes]
+
+    # Кластеризация
+    if state is None:
+        state = make_cluster_state(input_array, metric, prior_strength)
+    threshold_pass(input_array, threshold, cluster, state, order=order)
 
     # Постобработка данных (возвращение нормальных значений для массива)
-    if data_method is ClusterizationDataMethod.SHUFFLE:
-        reverse_indexes = [ind[1] for ind in sorted(dict(zip(indexes, np.arange(array_size))).items())]
-        cluster = cluster[reverse_indexes]
-    elif data_method is ClusterizationDataMethod.REVERSE:
-        reverse_indexes = np.arange(array_size)[::-1]
-        cluster = cluster[reverse_indexes]
+    if data_method is not ClusterizationDataMethod.FORWARD:
+        cluster = restore_order(cluster, indexes)
     return cluster
 
 
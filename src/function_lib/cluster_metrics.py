@@ -0,0 +1,207 @@
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.function_lib.cluster import ClusterState
+
+# Наибольшее количество кластеров, для которых индекс Дэвиса-Боулдина считается точно (затраты O(K^2))
+DAVIES_BOULDIN_LIMIT = 256
+
+
+@dataclass
+class ClusterQualityMetrics:
+    n_clusters: int
+    inertia: float
+    davies_bouldin: float
+    silhouette: float
+    silhouette_ci: Tuple[float, float]
+    silhouette_sample_size: int
+    # Индекс Дэвиса-Боулдина оценён по выборке кластеров
+    davies_bouldin_approximate: bool = False
+
+
+def davies_bouldin_index(centroids: np.ndarray,
+                         scatter: np.ndarray,
+                         block_size: int = 1024,
+                         max_clusters: Optional[int] = None,
+                         random_seed: Optional[int] = None) -> float:
+    """
+    Индекс Дэвиса-Боулдина по центрам кластеров и среднему расстоянию точек до центра.
+    Матрица расстояний между центрами считается блоками, чтобы не хранить K x K целиком.
+    Если кластеров больше `max_clusters`, худшее отношение считается только для случайных `max_clusters` кластеров
+    (против всех центров), и индекс - среднее по ним: O(max_clusters K) вместо O(K^2)
+
+    :param centroids: Центры кластеров (K, d)
+    :param scatter: Среднее расстояние точек кластера до его центра (K,)
+    :param block_size: Количество строк матрицы расстояний в блоке
+    :param max_clusters: Наибольшее количество строк матрицы расстояний. По умолчанию - без ограничения
+    :param random_seed: Seed выборки кластеров
+    :return: Индекс Дэвиса-Боулдина (0 для одного кластера)
+    """
+    n_clusters: int = centroids.shape[0]
+    if n_clusters < 2:
+        return 0.0
+    rows: np.ndarray = np.arange(n_clusters)
+    if max_clusters is not None and n_clusters > max_clusters:
+        rows = np.sort(np.random.default_rng(random_seed).choice(n_clusters, max_clusters, replace=False))
+    # Блок - не больше ~4 млн расстояний, сколько бы ни было кластеров
+    block_size = max(1, min(block_size, (1 << 22) // n_clusters))
+    worst: np.ndarray = np.zeros(rows.shape[0])
+    squares: np.ndarray = (centroids * centroids).sum(axis=1)
+    for start in range(0, rows.shape[0], block_size):
+        block: np.ndarray = rows[start:start + block_size]
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b - матричное умножение вместо массива (блок, K, d)
+        norms: np.ndarray = squares[block, None] + squares[None, :]
+        distance: np.ndarray = norms - 2 * centroids[block] @ centroids.T
+        # Совпадающие центры дают не ноль, а ошибку округления
+        distance[distance <= 1e-12 * norms] = 0.0
+        distance = np.sqrt(distance)
+        distance[distance == 0] = np.inf
+        ratio: np.ndarray = (scatter[block, None] + scatter[None, :]) / distance
+        ratio[np.arange(block.shape[0]), block] = 0.0
+        worst[start:start + block.shape[0]] = ratio.max(axis=1)
+    return float(worst.mean())
+
+
+def stratified_sample(labels: np.ndarray, sample_size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Стратифицированная выборка индексов не больше `sample_size`: из каждого кластера берётся до двух точек,
+    остаток выборки распределяется пропорционально размеру кластеров. Если по две точки из всех кластеров
+    не помещаются в выборку, сначала выбираются случайные `sample_size // 2` кластеров, из них - по две точки.
+
+    :param labels: Метки кластеров (N,), начиная с 1
+    :param sample_size: Наибольший размер выборки
+    :param rng: Генератор случайных чисел
+    :return: Индексы выбранных точек, упорядоченные по кластеру
+    """
+    order: np.ndarray = np.argsort(labels, kind='stable')
+    counts: np.ndarray = np.bincount(labels)[1:]
+    starts: np.ndarray = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    quota: np.ndarray = np.minimum(counts, 2)
+    if quota.sum() > sample_size:
+        present: np.ndarray = np.flatnonzero(counts)
+        chosen_clusters: np.ndarray = rng.choice(present, min(present.shape[0], sample_size // 2), replace=False)
+        quota = np.zeros_like(quota)
+        quota[chosen_clusters] = np.minimum(counts[chosen_clusters], 2)
+    else:
+        rest: np.ndarray = counts - quota
+        if rest.sum():
+            share: float = min(1.0, (sample_size - quota.sum()) / rest.sum())
+            quota += np.floor(rest * share).astype(np.int64)
+    chosen: list = []
+    for start, count, take in zip(starts, counts, quota):
+        if take:
+            chosen.append(order[start + rng.choice(count, take, replace=False)])
+    return np.concatenate(chosen) if chosen else np.zeros(0, dtype=np.int64)
+
+
+def silhouette_estimate(values: np.ndarray,
+                        labels: np.ndarray,
+                        sample_size: int = 2000,
+                        confidence: float = 0.95,
+                        random_seed: Optional[int] = None,
+                        block_size: int = 256) -> Tuple[float, Tuple[float, float], int]:
+    """
+    Оценка силуэта по стратифицированной выборке (точный силуэт требует O(N^2)).
+    Средние расстояния до кластеров оцениваются по точкам выборки, доверительный интервал -
+    по дисперсии стратифицированного среднего с поправкой на конечность кластеров.
+
+    :param values: Точки (N, d)
+    :param labels: Метки кластеров (N,), начиная с 1
+    :param sample_size: Наибольший размер выборки
+    :param confidence: Уровень доверия интервала
+    :param random_seed: Seed выборки
+    :param block_size: Количество строк матрицы расстояний в блоке
+    :return: Оценка силуэта, доверительный интервал, фактический размер выборки
+    """
+    rng: np.random.Generator = np.random.default_rng(random_seed)
+    sample: np.ndarray = stratified_sample(labels, sample_size, rng)
+    sample_labels: np.ndarray = labels[sample]
+    points: np.ndarray = values[sample]
+    cluster_ids, starts, sample_counts = np.unique(sample_labels, return_index=True, return_counts=True)
+    if cluster_ids.shape[0] < 2:
+        return 0.0, (0.0, 0.0), int(sample.shape[0])
+    own: np.ndarray = np.searchsorted(cluster_ids, sample_labels)
+
+    silhouette: np.ndarray = np.zeros(sample.shape[0])
+    for start in range(0, sample.shape[0], block_size):
+        stop: int = min(start + block_size, sample.shape[0])
+        distance: np.ndarray = np.sqrt(((points[start:stop, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+        sums: np.ndarray = np.add.reduceat(distance, starts, axis=1)
+        rows: np.ndarray = np.arange(stop - start)
+        block_own: np.ndarray = own[start:stop]
+        own_count: np.ndarray = sample_counts[block_own] - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            a: np.ndarray = sums[rows, block_own] / own_count
+        means: np.ndarray = sums / sample_counts
+        means[rows, block_own] = np.inf
+        b: np.ndarray = means.min(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            score: np.ndarray = (b - a) / np.maximum(a, b)
+        # Точки кластеров из одной точки имеют силуэт 0
+        score[own_count == 0] = 0.0
+        silhouette[start:stop] = np.nan_to_num(score)
+
+    all_population: np.ndarray = np.bincount(labels)
+    population: np.ndarray = all_population[cluster_ids].astype(float)
+    weights: np.ndarray = population / population.sum()
+    strata_mean: np.ndarray = np.bincount(own, silhouette) / sample_counts
+    deviation: np.ndarray = silhouette - strata_mean[own]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        strata_var: np.ndarray = np.nan_to_num(np.bincount(own, deviation * deviation) / (sample_counts - 1))
+    variance: float = float((weights ** 2 * strata_var / sample_counts * (1 - sample_counts / population)).sum())
+    estimate: float = float((weights * strata_mean).sum())
+    total_clusters: int = int(np.count_nonzero(all_population[1:]))
+    if cluster_ids.shape[0] < total_clusters:
+        # Выбрана только часть кластеров: добавляется разброс между кластерами
+        chosen: int = cluster_ids.shape[0]
+        between: float = float((weights * (strata_mean - estimate) ** 2).sum()) * chosen / (chosen - 1)
+        variance += between / chosen * (1 - chosen / total_clusters)
+    z: float = NormalDist().inv_cdf(0.5 + confidence / 2)
+    half_width: float = z * np.sqrt(max(variance, 0.0))
+    return estimate, (estimate - half_width, estimate + half_width), int(sample.shape[0])
+
+
+def cluster_quality(values: np.ndarray,
+                    labels: np.ndarray,
+                    state: Optional[ClusterState] = None,
+                    sample_size: int = 2000,
+                    confidence: float = 0.95,
+                    random_seed: Optional[int] = None) -> ClusterQualityMetrics:
+    """
+    Метрики качества кластеризации: инерция, индекс Дэвиса-Боулдина и оценка силуэта
+
+    :param values: Точки (N, d)
+    :param labels: Метки кластеров (N,), начиная с 1
+    :param state: Статистика кластеров для меток. По умолчанию восстанавливается по меткам
+    :param sample_size: Размер выборки для силуэта
+    :param confidence: Уровень доверия интервала силуэта
+    :param random_seed: Seed выборки для силуэта
+    :return: Метрики качества
+    """
+    values = np.asarray(values, dtype=float)
+    labels = np.asarray(labels, dtype=np.int64)
+    if state is None:
+        state = ClusterState.from_labels(values, labels)
+    counts: np.ndarray = state.counts[:state.size]
+    centroids: np.ndarray = state.means[:state.size]
+    inertia: float = float(state.m2[:state.size].sum())
+
+    distance: np.ndarray = np.sqrt(((values - centroids[labels - 1]) ** 2).sum(axis=1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scatter: np.ndarray = np.nan_to_num(np.bincount(labels - 1, distance, minlength=state.size) / counts)
+    filled: np.ndarray = counts > 0
+    davies_bouldin: float = davies_bouldin_index(centroids[filled], scatter[filled],
+                                                 max_clusters=DAVIES_BOULDIN_LIMIT, random_seed=random_seed)
+
+    silhouette, silhouette_ci, sample_count = silhouette_estimate(values, labels, sample_size, confidence,
+                                                                  random_seed)
+    return ClusterQualityMetrics(n_clusters=int(filled.sum()),
+                                 inertia=inertia,
+                                 davies_bouldin=davies_bouldin,
+                                 silhouette=silhouette,
+                                 silhouette_ci=silhouette_ci,
+                                 silhouette_sample_size=sample_count,
+                                 davies_bouldin_approximate=int(filled.sum()) > DAVIES_BOULDIN_LIMIT)
@@ -0,0 +1,372 @@
+"""
+Локальный сервис пороговой кластеризации (HTTP/JSON и бинарные массивы) без зависимости от Qt.
+
+Запуск:
+    python -m src.function_lib.cluster_service --port 8765 --workers 4
+
+POST /cluster?threshold=5&data_method=FORWARD&seed=1
+    application/json: {"points": [[x, y, z], ...], "threshold": 5.0, ...} -> {"labels": [...], ...}
+    application/octet-stream: точки float64 (или ?dtype=float32) построчно, размерность в ?dim=3 -> метки int32
+GET /stats - глубина очереди, количество запросов и задержки
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, Future, CancelledError
+from dataclasses import dataclass, field
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, List, Tuple, Dict, Any
+from urllib.parse import urlparse, parse_qs, urlencode
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.cluster import clusterization_threshold
+from src.function_lib.batch_cluster import batch_clusterization
+
+# Методы, задания которых объединяются в один векторный проход
+BATCH_METHODS = (ClusterizationDataMethod.FORWARD, ClusterizationDataMethod.REVERSE, ClusterizationDataMethod.SHUFFLE)
+
+
+@dataclass
+class ClusterJob:
+    points: np.ndarray
+    threshold: float
+    data_method: ClusterizationDataMethod
+    random_seed: Optional[int]
+    queue_depth: int = 0
+    created: float = field(default_factory=time.perf_counter)
+    started: float = 0.0
+    compute_time: float = 0.0
+    labels: Optional[np.ndarray] = None
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def latency(self) -> float:
+        return time.perf_counter() - self.created
+
+
+def _cluster_batch(jobs: List[Tuple[np.ndarray, float, str, Optional[int]]]) -> List[Tuple[np.ndarray, float]]:
+    """
+    Кластеризация пачки заданий в процессе пула. Задания последовательных методов с одинаковыми методом, seed
+    и размерностью считаются одним вызовом `batch_clusterization`, время делится пропорционально количеству точек
+
+    :param jobs: Список (точки, порог, имя метода пред-обработки, seed)
+    :return: Список (метки, время расчёта в секундах)
+    """
+    results: List[Optional[Tuple[np.ndarray, float]]] = [None] * len(jobs)
+    groups: Dict[tuple, List[int]] = {}
+    for index, (points, threshold, data_method, random_seed) in enumerate(jobs):
+        if ClusterizationDataMethod[data_method] in BATCH_METHODS and points.ndim == 2:
+            groups.setdefault((data_method, random_seed, points.shape[1]), []).append(index)
+        else:
+            start: float = time.perf_counter()
+            labels: np.ndarray = clusterization_threshold(points, threshold, ClusterizationDataMethod[data_method],
+                                                          random_seed)
+            results[index] = (labels.astype(np.int32), time.perf_counter() - start)
+    for (data_method, random_seed, _), indexes in groups.items():
+        start = time.perf_counter()
+        sizes: np.ndarray = np.array([jobs[index][0].shape[0] for index in indexes])
+        offsets: np.ndarray = np.concatenate(([0], np.cumsum(sizes)))
+        labels = batch_clusterization(np.concatenate([jobs[index][0] for index in indexes]), offsets,
+                                      np.array([jobs[index][1] for index in indexes], dtype=float),
+                                      ClusterizationDataMethod[data_method], random_seed, workers=1)
+        elapsed: float = time.perf_counter() - start
+        for index, size, begin, end in zip(indexes, sizes, offsets[:-1], offsets[1:]):
+            results[index] = (labels[begin:end].astype(np.int32), elapsed * size / max(int(offsets[-1]), 1))
+    return results
+
+
+class ClusterService:
+    """
+    Очередь заданий ограниченного размера, пул процессов и объединение мелких заданий в пачки
+    """
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 workers: int = 2,
+                 max_queue: int = 256,
+                 batch_max_points: int = 5_000,
+                 batch_wait: float = 0.002,
+                 use_processes: bool = True):
+        """
+        :param host: Адрес (только локальный)
+        :param port: Порт. 0 - свободный порт
+        :param workers: Количество процессов пула
+        :param max_queue: Максимальное количество заданий в очереди, при переполнении запрос отклоняется (503)
+        :param batch_max_points: Задания меньше этого размера объединяются в пачку до этого суммарного размера
+        :param batch_wait: Время ожидания следующего мелкого задания для пачки, с
+        :param use_processes: Пул процессов, иначе пул потоков (для отладки)
+        """
+        self.workers: int = workers
+        self.batch_max_points: int = batch_max_points
+        self.batch_wait: float = batch_wait
+        self.jobs: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.executor: Executor = ProcessPoolExecutor(workers) if use_processes else ThreadPoolExecutor(workers)
+        # Не больше двух пачек на процесс одновременно, остальное ждёт в очереди
+        self.in_flight = threading.BoundedSemaphore(workers * 2)
+        self.stats_lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.processed: int = 0
+        self.rejected: int = 0
+        self.batches: int = 0
+        self.running: bool = False
+
+        service = self
+
+        class Handler(_ClusterRequestHandler):
+            cluster_service = service
+
+        self.server = _ClusterHTTPServer((host, port), Handler)
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'ClusterService':
+        self.running = True
+        self.dispatcher.start()
+        self.server_thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.running:
+            self.running = False
+            self.server.shutdown()
+            self.dispatcher.join()
+        self.server.server_close()
+        self.executor.shutdown(cancel_futures=True)
+        # Задания, не попавшие в пул, завершаются ошибкой, чтобы клиенты не ждали до таймаута
+        remaining: List[ClusterJob] = []
+        while True:
+            try:
+                remaining.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        self._fail(remaining, "Service stopped")
+
+    def submit(self, job: ClusterJob) -> bool:
+        """
+        Постановка задания в очередь без ожидания
+
+        :param job: Задание
+        :return: False, если очередь заполнена
+        """
+        job.queue_depth = self.jobs.qsize()
+        try:
+            self.jobs.put_nowait(job)
+            return True
+        except queue.Full:
+            with self.stats_lock:
+                self.rejected += 1
+            return False
+
+    def _dispatch(self) -> None:
+        pending: Optional[ClusterJob] = None
+        while self.running:
+            if pending is None:
+                try:
+                    pending = self.jobs.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            batch: List[ClusterJob] = [pending]
+            pending = None
+            points: int = batch[0].points.shape[0]
+            # Мелкие задания собираются в пачку, пока не наберётся batch_max_points или не истечёт batch_wait
+            deadline: float = time.perf_counter() + self.batch_wait
+            while points < self.batch_max_points:
+                try:
+                    job: ClusterJob = self.jobs.get(timeout=max(deadline - time.perf_counter(), 0.0))
+                except queue.Empty:
+                    break
+                if points + job.points.shape[0] > self.batch_max_points:
+                    pending = job
+                    break
+                batch.append(job)
+                points += job.points.shape[0]
+            if not self.running:
+                self._fail(batch, "Service stopped")
+                break
+            self.in_flight.acquire()
+            started: float = time.perf_counter()
+            for job in batch:
+                job.started = started
+            future: Future = self.executor.submit(
+                _cluster_batch, [(job.points, job.threshold, job.data_method.name, job.random_seed) for job in batch])
+            future.add_done_callback(lambda result, jobs=batch: self._complete(jobs, result))
+        if pending is not None:
+            self._fail([pending], "Service stopped")
+
+    @staticmethod
+    def _fail(jobs: List[ClusterJob], error: str) -> None:
+        for job in jobs:
+            job.error = error
+            job.done.set()
+
+    def _complete(self, batch: List[ClusterJob], future: Future) -> None:
+        self.in_flight.release()
+        try:
+            results: List[Tuple[np.ndarray, float]] = future.result()
+        except (Exception, CancelledError) as e:
+            results = []
+            for job in batch:
+                job.error = str(e) or type(e).__name__
+        for job, (labels, compute_time) in zip(batch, results):
+            job.labels = labels
+            job.compute_time = compute_time
+        with self.stats_lock:
+            self.batches += 1
+            self.processed += len(batch)
+            for job in batch:
+                self.latencies.append(job.latency)
+            del self.latencies[:-1000]
+        for job in batch:
+            job.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.stats_lock:
+            latencies: np.ndarray = np.array(self.latencies) * 1000
+            return {'queue_depth': self.jobs.qsize(),
+                    'processed': self.processed,
+                    'rejected': self.rejected,
+                    'batches': self.batches,
+                    'workers': self.workers,
+                    'latency_ms_p50': float(np.percentile(latencies, 50)) if latencies.size else None,
+                    'latency_ms_p95': float(np.percentile(latencies, 95)) if latencies.size else None}
+
+
+class _ClusterHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь подключений ОС должна вмещать всплеск клиентов, ограничение нагрузки - очередь заданий
+    request_queue_size = 1024
+
+
+class _ClusterRequestHandler(BaseHTTPRequestHandler):
+    cluster_service: ClusterService = None
+    timeout_seconds: float = 600.0
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send(self, code: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(code, json.dumps(data).encode('UTF-8'), 'application/json', headers)
+
+    def do_GET(self) -> None:
+        if urlparse(self.path).path == '/stats':
+            self._send_json(200, self.cluster_service.stats())
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != '/cluster':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        binary: bool = self.headers.get('Content-Type', '') == 'application/octet-stream'
+        try:
+            body: bytes = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            params: Dict[str, Any] = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if binary:
+                dim: int = int(params.get('dim', 3))
+                dtype: np.dtype = np.dtype(params.get('dtype', 'float64')).newbyteorder('<')
+                points: np.ndarray = np.frombuffer(body, dtype=dtype)
+                points = points.reshape((-1, dim)).astype(float)
+            else:
+                data: Dict[str, Any] = json.loads(body.decode('UTF-8'))
+                params.update({key: value for key, value in data.items() if key != 'points'})
+                points = np.asarray(data['points'], dtype=float)
+            assert points.ndim == 2 and points.shape[0] > 0, "Points must be a non-empty 2D array"
+            seed = params.get('seed', params.get('random_seed'))
+            job = ClusterJob(points=points,
+                             threshold=float(params.get('threshold', 5.0)),
+                             data_method=ClusterizationDataMethod[params.get('data_method', 'FORWARD')],
+                             random_seed=int(seed) if seed not in (None, '', 'null') else None)
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        if not self.cluster_service.submit(job):
+            self._send_json(503, {'error': 'Queue is full', 'queue_depth': self.cluster_service.jobs.qsize()})
+            return
+        if not job.done.wait(self.timeout_seconds) or job.error is not None:
+            self._send_json(500, {'error': job.error or 'Timeout'})
+            return
+
+        report: Dict[str, str] = {'X-Latency-Ms': f"{job.latency * 1000:.3f}",
+                                  'X-Queue-Wait-Ms': f"{(job.started - job.created) * 1000:.3f}",
+                                  'X-Compute-Ms': f"{job.compute_time * 1000:.3f}",
+                                  'X-Queue-Depth': str(job.queue_depth)}
+        if binary:
+            self._send(200, job.labels.astype('<i4').tobytes(), 'application/octet-stream', report)
+        else:
+            self._send_json(200, {'labels': job.labels.tolist(),
+                                  'latency_ms': float(report['X-Latency-Ms']),
+                                  'queue_wait_ms': float(report['X-Queue-Wait-Ms']),
+                                  'compute_ms': float(report['X-Compute-Ms']),
+                                  'queue_depth': job.queue_depth}, report)
+
+
+def cluster_remote(url: str,
+                   points: np.ndarray,
+                   threshold: float,
+                   data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                   random_seed: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    Клиент сервиса: отправка точек бинарным массивом
+
+    :param url: Адрес сервиса, например http://127.0.0.1:8765
+    :param points: Точки (N, d)
+    :param threshold: Порог
+    :param data_method: Метод пред-обработки данных
+    :param random_seed: Seed для случайного перемешивания точек
+    :return: Метки кластеров и отчёт сервиса (задержка, ожидание в очереди, расчёт в мс, глубина очереди)
+    """
+    points = np.ascontiguousarray(points, dtype='<f8')
+    query: Dict[str, Any] = {'threshold': threshold, 'data_method': data_method.name, 'dim': points.shape[1]}
+    if random_seed is not None:
+        query['seed'] = random_seed
+    request = Request(f"{url}/cluster?{urlencode(query)}", data=points.tobytes(), method='POST',
+                      headers={'Content-Type': 'application/octet-stream'})
+    with urlopen(request) as response:
+        labels: np.ndarray = np.frombuffer(response.read(), dtype='<i4').astype(int)
+        report: Dict[str, float] = {key: float(response.headers[f"X-{name}"]) for key, name in
+                                    (('latency_ms', 'Latency-Ms'), ('queue_wait_ms', 'Queue-Wait-Ms'),
+                                     ('compute_ms', 'Compute-Ms'), ('queue_depth', 'Queue-Depth'))}
+    return labels, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local threshold clustering service")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-queue', type=int, default=256)
+    parser.add_argument('--batch-max-points', type=int, default=5_000)
+    arguments = parser.parse_args()
+    cluster_service = ClusterService(port=arguments.port, workers=arguments.workers, max_queue=arguments.max_queue,
+                                     batch_max_points=arguments.batch_max_points).start()
+    print(f"Cluster service: {cluster_service.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        cluster_service.stop()
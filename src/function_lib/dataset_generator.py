@@ -0,0 +1,135 @@
+from typing import Iterator, Tuple, Union, Dict, Any
+
+import numpy as np
+
+from src.enums import SyntheticClusterShape, ClusterizationDataMethod
+from src.function_lib.session_io import SessionSnapshot, create_session
+
+
+class SyntheticDataset:
+    """
+    Синтетический набор кластеров с истинными метками. Параметры кластеров выбираются один раз,
+    точки генерируются частями, поэтому размер набора ограничен только диском.
+    Метки кластеров начинаются с 1, точки фонового шума имеют метку 0.
+    """
+    BLOCK_SIZE = 65_536
+
+    def __init__(self,
+                 n_points: int,
+                 dim: int = 3,
+                 n_clusters: int = 5,
+                 shape: SyntheticClusterShape = SyntheticClusterShape.BLOBS,
+                 cluster_std: float = 1.0,
+                 noise_fraction: float = 0.0,
+                 box: Tuple[float, float] = (-20.0, 20.0),
+                 seed: Union[int, np.random.Generator, None] = None):
+        """
+        :param n_points: Количество точек
+        :param dim: Размерность пространства
+        :param n_clusters: Количество кластеров
+        :param shape: Форма кластеров. UNIFORM - только равномерный шум
+        :param cluster_std: Базовое СКО кластеров
+        :param noise_fraction: Доля точек фонового шума, равномерного в `box`
+        :param box: Границы области по каждой оси
+        :param seed: Seed или генератор `np.random.Generator`
+        """
+        self.n_points: int = n_points
+        self.dim: int = dim
+        self.shape: SyntheticClusterShape = shape
+        self.box: Tuple[float, float] = box
+        if shape is SyntheticClusterShape.UNIFORM:
+            n_clusters, noise_fraction = 0, 1.0
+        self.n_clusters: int = n_clusters
+        self.noise_fraction: float = noise_fraction
+
+        parameter_rng: np.random.Generator = np.random.default_rng(seed)
+        # Точки генерируются блоками фиксированного размера со своим seed, поэтому результат
+        # не зависит от размера частей, которыми читается набор
+        self.sample_entropy: int = int(parameter_rng.integers(2 ** 63))
+        low, high = box
+        margin: float = 3 * cluster_std
+        self.centers: np.ndarray = parameter_rng.uniform(low + margin, high - margin, (n_clusters, dim))
+        # Линейное преобразование стандартного нормального распределения для каждого кластера
+        self.transforms: np.ndarray = np.repeat(np.eye(dim)[None] * cluster_std, n_clusters, axis=0)
+        self.weights: np.ndarray = np.full(n_clusters, 1.0 / max(n_clusters, 1))
+        if shape is SyntheticClusterShape.ANISOTROPIC:
+            self.transforms = parameter_rng.normal(0.0, cluster_std, (n_clusters, dim, dim))
+        elif shape is SyntheticClusterShape.VARIED_DENSITY:
+            self.transforms *= parameter_rng.uniform(0.3, 2.5, n_clusters)[:, None, None]
+            weights: np.ndarray = parameter_rng.uniform(0.2, 1.0, n_clusters) ** 2
+            self.weights = weights / weights.sum()
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {'generator': self.shape.name, 'n_points': self.n_points, 'dim': self.dim,
+                'n_clusters': self.n_clusters, 'noise_fraction': self.noise_fraction, 'box': list(self.box)}
+
+    def chunks(self, chunk_size: int = 100_000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Генерация набора частями
+
+        :param chunk_size: Количество точек в части
+        :return: Итератор пар (точки (n, dim), истинные метки (n,))
+        """
+        points_parts: list = []
+        labels_parts: list = []
+        buffered: int = 0
+        for block in range(0, (self.n_points + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE):
+            points, labels = self._block(block)
+            points_parts.append(points)
+            labels_parts.append(labels)
+            buffered += points.shape[0]
+            while buffered >= chunk_size or (buffered and block == (self.n_points - 1) // self.BLOCK_SIZE):
+                all_points: np.ndarray = np.concatenate(points_parts)
+                all_labels: np.ndarray = np.concatenate(labels_parts)
+                yield all_points[:chunk_size], all_labels[:chunk_size]
+                points_parts, labels_parts = [all_points[chunk_size:]], [all_labels[chunk_size:]]
+                buffered = max(buffered - chunk_size, 0)
+
+    def _block(self, block: int) -> Tuple[np.ndarray, np.ndarray]:
+        rng: np.random.Generator = np.random.default_rng(np.random.SeedSequence(self.sample_entropy,
+                                                                                spawn_key=(block,)))
+        size: int = min(self.BLOCK_SIZE, self.n_points - block * self.BLOCK_SIZE)
+        probabilities: np.ndarray = np.concatenate(([self.noise_fraction], self.weights * (1 - self.noise_fraction)))
+        labels: np.ndarray = rng.choice(self.n_clusters + 1, size, p=probabilities).astype(np.int32)
+        points: np.ndarray = np.empty((size, self.dim))
+        noise: np.ndarray = labels == 0
+        points[noise] = rng.uniform(*self.box, (int(noise.sum()), self.dim))
+        clustered: np.ndarray = ~noise
+        index: np.ndarray = labels[clustered] - 1
+        standard: np.ndarray = rng.standard_normal((index.shape[0], self.dim))
+        points[clustered] = self.centers[index] + np.einsum('nj,nij->ni', standard, self.transforms[index])
+        return points, labels
+
+    def generate(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Генерация всего набора в памяти
+
+        :return: Точки (N, dim), истинные метки (N,)
+        """
+        parts = list(self.chunks())
+        if not parts:
+            return np.zeros((0, self.dim)), np.zeros(0, dtype=np.int32)
+        return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
+
+    def write_session(self, path: str, chunk_size: int = 100_000, threshold: float = 5.0) -> None:
+        """
+        Потоковая запись набора в файл сессии (точки и истинные метки) без хранения всего набора в памяти
+
+        :param path: Путь к файлу
+        :param chunk_size: Количество точек в части
+        :param threshold: Порог кластеризации, сохраняемый в сессии
+        :return: None
+        """
+        arrays: Dict[str, np.memmap] = create_session(
+            path,
+            {'points': ((self.n_points, self.dim), np.float64), 'truth_labels': ((self.n_points,), np.int32)},
+            SessionSnapshot(points=np.zeros((0, self.dim)), threshold=threshold,
+                            data_method=ClusterizationDataMethod.FORWARD, extra=self.params))
+        position: int = 0
+        for points, labels in self.chunks(chunk_size):
+            arrays['points'][position:position + points.shape[0]] = points
+            arrays['truth_labels'][position:position + points.shape[0]] = labels
+            position += points.shape[0]
+        for array in arrays.values():
+            array.flush()
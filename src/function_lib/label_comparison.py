@@ -0,0 +1,310 @@
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple, List
+
+import numpy as np
+
+from src.function_lib.neighbor_graph import UnionFind
+
+# Наибольшее количество кластеров с одной стороны компоненты, для которой паросочетание ищется точно
+HUNGARIAN_LIMIT = 1500
+# То же для согласования цветов при каждом запуске кластеризации в интерфейсе: время важнее точности
+ALIGN_HUNGARIAN_LIMIT = 200
+
+
+@dataclass
+class ContingencyTable:
+    """
+    Разреженная таблица сопряжённости: только ненулевые ячейки
+    """
+    # Исходные значения меток, номер строки (столбца) - индекс в этих массивах
+    values_a: np.ndarray
+    values_b: np.ndarray
+    rows: np.ndarray
+    columns: np.ndarray
+    counts: np.ndarray
+    sizes_a: np.ndarray
+    sizes_b: np.ndarray
+
+    @property
+    def total(self) -> int:
+        return int(self.sizes_a.sum())
+
+
+def _dense_index(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Значения меток и индекс каждой метки в них. Для неотрицательных целых меток без больших пропусков - `bincount`
+    за O(N), иначе сортировка
+    """
+    labels = np.asarray(labels)
+    if labels.size and np.issubdtype(labels.dtype, np.integer) and labels.min() >= 0 \
+            and labels.max() < 2 * labels.shape[0] + 1024:
+        present: np.ndarray = np.flatnonzero(np.bincount(labels))
+        remap: np.ndarray = np.zeros(int(present[-1]) + 1, dtype=np.int64)
+        remap[present] = np.arange(present.shape[0])
+        return present, remap[labels]
+    values, index = np.unique(labels, return_inverse=True)
+    return values, index.ravel().astype(np.int64)
+
+
+def contingency_table(labels_a: np.ndarray, labels_b: np.ndarray) -> ContingencyTable:
+    """
+    Таблица сопряжённости двух разбиений. Плотная таблица строится `bincount`, если она не больше нескольких N,
+    иначе ненулевые ячейки находятся сортировкой ключей
+
+    :param labels_a: Метки первого разбиения (N,)
+    :param labels_b: Метки второго разбиения (N,)
+    :return: Разреженная таблица
+    """
+    if labels_a.shape != labels_b.shape:
+        raise ValueError("Label arrays must have the same shape")
+    values_a, index_a = _dense_index(labels_a)
+    values_b, index_b = _dense_index(labels_b)
+    size_b: int = values_b.shape[0]
+    keys: np.ndarray = index_a * size_b + index_b
+    if values_a.shape[0] * size_b <= 4 * keys.shape[0] + 1024:
+        dense: np.ndarray = np.bincount(keys, minlength=values_a.shape[0] * size_b)
+        cells: np.ndarray = np.flatnonzero(dense)
+        counts: np.ndarray = dense[cells]
+    else:
+        cells, counts = np.unique(keys, return_counts=True)
+    return ContingencyTable(values_a=values_a, values_b=values_b, rows=cells // max(size_b, 1),
+                            columns=cells % max(size_b, 1), counts=counts,
+                            sizes_a=np.bincount(index_a, minlength=values_a.shape[0]),
+                            sizes_b=np.bincount(index_b, minlength=size_b))
+
+
+def _comb2(counts: np.ndarray) -> float:
+    counts = counts.astype(float)
+    return float((counts * (counts - 1) / 2).sum())
+
+
+def adjusted_rand_index(labels_a: np.ndarray, labels_b: np.ndarray,
+                        table: Optional[ContingencyTable] = None) -> float:
+    """
+    Adjusted Rand Index двух разбиений по таблице сопряжённости
+
+    :param labels_a: Метки первого разбиения
+    :param labels_b: Метки второго разбиения
+    :param table: Готовая таблица сопряжённости этих разбиений
+    :return: ARI
+    """
+    if table is None:
+        table = contingency_table(labels_a, labels_b)
+    index: float = _comb2(table.counts)
+    sum_a: float = _comb2(table.sizes_a)
+    sum_b: float = _comb2(table.sizes_b)
+    total: float = _comb2(np.array([table.total]))
+    expected: float = sum_a * sum_b / total if total else 0.0
+    maximum: float = (sum_a + sum_b) / 2
+    if maximum == expected:
+        return 1.0
+    return (index - expected) / (maximum - expected)
+
+
+def normalized_mutual_info(labels_a: np.ndarray, labels_b: np.ndarray,
+                           table: Optional[ContingencyTable] = None) -> float:
+    """
+    Нормированная взаимная информация (нормировка на среднее арифметическое энтропий)
+
+    :param labels_a: Метки первого разбиения
+    :param labels_b: Метки второго разбиения
+    :param table: Готовая таблица сопряжённости этих разбиений
+    :return: NMI от 0 до 1
+    """
+    if table is None:
+        table = contingency_table(labels_a, labels_b)
+    total: float = float(table.total)
+    if not total:
+        return 1.0
+    probability: np.ndarray = table.counts / total
+    expected: np.ndarray = table.sizes_a[table.rows] * table.sizes_b[table.columns].astype(float)
+    mutual: float = float((probability * np.log(table.counts * total / expected)).sum())
+    entropy_a: float = float(-(table.sizes_a / total * np.log(table.sizes_a / total)).sum())
+    entropy_b: float = float(-(table.sizes_b / total * np.log(table.sizes_b / total)).sum())
+    if entropy_a == 0 and entropy_b == 0:
+        return 1.0
+    return max(0.0, min(1.0, mutual / ((entropy_a + entropy_b) / 2)))
+
+
+def _hungarian(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Паросочетание наибольшего веса (венгерский алгоритм с потенциалами, O(n^2 m), внутренний цикл векторный)
+
+    :param weights: Матрица весов (n, m), n <= m
+    :return: Номера строк и столбцов пар
+    """
+    n, m = weights.shape
+    cost: np.ndarray = -weights.astype(float)
+    u: np.ndarray = np.zeros(n + 1)
+    v: np.ndarray = np.zeros(m + 1)
+    match: np.ndarray = np.zeros(m + 1, dtype=np.int64)
+    way: np.ndarray = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        match[0] = row
+        column: int = 0
+        min_value: np.ndarray = np.full(m + 1, np.inf)
+        used: np.ndarray = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row: int = int(match[column])
+            reduced: np.ndarray = cost[current_row - 1] - u[current_row] - v[1:]
+            free: np.ndarray = ~used[1:]
+            better: np.ndarray = free & (reduced < min_value[1:])
+            min_value[1:][better] = reduced[better]
+            way[1:][better] = column
+            masked: np.ndarray = np.where(free, min_value[1:], np.inf)
+            next_column: int = int(masked.argmin()) + 1
+            delta: float = float(masked[next_column - 1])
+            u[match[used]] += delta
+            v[used] -= delta
+            min_value[1:][free] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        while column:
+            previous: int = int(way[column])
+            match[column] = match[previous]
+            column = previous
+    columns: np.ndarray = np.flatnonzero(match[1:])
+    return match[1:][columns] - 1, columns
+
+
+def best_matching(table: ContingencyTable, hungarian_limit: int = HUNGARIAN_LIMIT) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Взаимно однозначное сопоставление кластеров с наибольшим количеством общих точек. Кластеры сопоставляются
+    только внутри компонент связности графа пересечений; компоненты из одной пары решаются векторно, остальные -
+    венгерским алгоритмом (или жадно, если с обеих сторон больше `hungarian_limit` кластеров)
+
+    :param table: Таблица сопряжённости
+    :param hungarian_limit: Наибольшее количество кластеров с одной стороны компоненты для точного решения
+    :return: Строки и столбцы сопоставленных кластеров (индексы в `values_a` и `values_b`)
+    """
+    size_a: int = table.values_a.shape[0]
+    forest = UnionFind(size_a + table.values_b.shape[0])
+    forest.union(table.rows, table.columns + size_a)
+    component: np.ndarray = forest.find(table.rows)
+    cells_in_component: np.ndarray = np.bincount(component, minlength=forest.parent.shape[0])
+    single: np.ndarray = cells_in_component[component] == 1
+    rows: List[np.ndarray] = [table.rows[single]]
+    columns: List[np.ndarray] = [table.columns[single]]
+
+    order: np.ndarray = np.flatnonzero(~single)
+    order = order[np.argsort(component[order], kind='stable')]
+    bounds: np.ndarray = np.flatnonzero(np.diff(component[order])) + 1
+    for cells in np.split(order, bounds) if order.size else []:
+        row_values, row_index = np.unique(table.rows[cells], return_inverse=True)
+        column_values, column_index = np.unique(table.columns[cells], return_inverse=True)
+        if min(row_values.shape[0], column_values.shape[0]) > hungarian_limit:
+            # Жадно: пары по убыванию пересечения, если оба кластера ещё свободны
+            taken_rows: np.ndarray = np.zeros(row_values.shape[0], dtype=bool)
+            taken_columns: np.ndarray = np.zeros(column_values.shape[0], dtype=bool)
+            for cell in np.argsort(-table.counts[cells], kind='stable'):
+                if not taken_rows[row_index[cell]] and not taken_columns[column_index[cell]]:
+                    taken_rows[row_index[cell]] = taken_columns[column_index[cell]] = True
+                    rows.append(row_values[row_index[cell:cell + 1]])
+                    columns.append(column_values[column_index[cell:cell + 1]])
+            continue
+        weights: np.ndarray = np.zeros((row_values.shape[0], column_values.shape[0]))
+        weights[row_index, column_index] = table.counts[cells]
+        if weights.shape[0] <= weights.shape[1]:
+            pair_rows, pair_columns = _hungarian(weights)
+        else:
+            pair_columns, pair_rows = _hungarian(weights.T)
+        # Пары без общих точек не считаются сопоставленными
+        overlap: np.ndarray = weights[pair_rows, pair_columns] > 0
+        rows.append(row_values[pair_rows[overlap]])
+        columns.append(column_values[pair_columns[overlap]])
+    return np.concatenate(rows), np.concatenate(columns)
+
+
+@dataclass
+class LabelComparison:
+    adjusted_rand_index: float
+    normalized_mutual_info: float
+    # Сопоставленные кластеры: значения меток первого и второго разбиения
+    matched_a: np.ndarray
+    matched_b: np.ndarray
+    # Точек в сопоставленных парах кластеров и всего
+    matched_points: int
+    size: int
+    clusters_a: int
+    clusters_b: int
+
+    @property
+    def matched_fraction(self) -> float:
+        return self.matched_points / self.size if self.size else 1.0
+
+    def __str__(self) -> str:
+        return f"ARI {self.adjusted_rand_index:.4f}, NMI {self.normalized_mutual_info:.4f}, " \
+               f"совпадает {self.matched_fraction:.1%} точек, кластеров {self.clusters_a} / {self.clusters_b}"
+
+
+def compare_labels(labels_a: np.ndarray, labels_b: np.ndarray) -> LabelComparison:
+    """
+    Сравнение двух разбиений одних и тех же точек
+
+    :param labels_a: Метки первого разбиения (N,)
+    :param labels_b: Метки второго разбиения (N,)
+    :return: ARI, NMI и наилучшее взаимно однозначное сопоставление кластеров
+    """
+    table: ContingencyTable = contingency_table(labels_a, labels_b)
+    rows, columns = best_matching(table)
+    # Пересечение сопоставленной пары - ячейка таблицы (ключи ячеек отсортированы)
+    cell_keys: np.ndarray = table.rows * table.values_b.shape[0] + table.columns
+    matched_keys: np.ndarray = rows * table.values_b.shape[0] + columns
+    overlap: np.ndarray = table.counts[np.searchsorted(cell_keys, matched_keys)] if matched_keys.size \
+        else np.zeros(0, dtype=np.int64)
+    return LabelComparison(adjusted_rand_index=adjusted_rand_index(labels_a, labels_b, table),
+                           normalized_mutual_info=normalized_mutual_info(labels_a, labels_b, table),
+                           matched_a=table.values_a[rows],
+                           matched_b=table.values_b[columns],
+                           matched_points=int(overlap.sum()),
+                           size=table.total,
+                           clusters_a=table.values_a.shape[0],
+                           clusters_b=table.values_b.shape[0])
+
+
+def pairwise_comparison(label_sets: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ARI и NMI для всех пар разбиений
+
+    :param label_sets: Разбиения одних и тех же точек
+    :return: Матрицы ARI и NMI (k, k)
+    """
+    count: int = len(label_sets)
+    ari: np.ndarray = np.eye(count)
+    nmi: np.ndarray = np.eye(count)
+    for first in range(count):
+        for second in range(first + 1, count):
+            table: ContingencyTable = contingency_table(label_sets[first], label_sets[second])
+            ari[first, second] = ari[second, first] = adjusted_rand_index(label_sets[first], label_sets[second], table)
+            nmi[first, second] = nmi[second, first] = normalized_mutual_info(label_sets[first], label_sets[second],
+                                                                             table)
+    return ari, nmi
+
+
+def align_colors(reference_labels: np.ndarray,
+                 reference_colors: np.ndarray,
+                 labels: np.ndarray,
+                 random_seed: Optional[int] = None,
+                 hungarian_limit: int = ALIGN_HUNGARIAN_LIMIT) -> np.ndarray:
+    """
+    Цвета кластеров нового разбиения: кластер, сопоставленный кластеру прошлого разбиения, получает его цвет,
+    остальные - случайные
+
+    :param reference_labels: Метки прошлого разбиения (N,), начиная с 1
+    :param reference_colors: Цвета кластеров прошлого разбиения (K_ref, 4)
+    :param labels: Метки нового разбиения (N,), начиная с 1
+    :param random_seed: Seed случайных цветов
+    :param hungarian_limit: Ограничение точного сопоставления (см. `best_matching`)
+    :return: Цвета кластеров нового разбиения (K, 4)
+    """
+    count: int = int(labels.max()) if labels.size else 0
+    colors: np.ndarray = np.random.default_rng(random_seed).random((count, 4))
+    colors[:, 3] = 1.0
+    table: ContingencyTable = contingency_table(reference_labels, labels)
+    rows, columns = best_matching(table, hungarian_limit)
+    matched_a, matched_b = table.values_a[rows], table.values_b[columns]
+    known: np.ndarray = (matched_a > 0) & (matched_a <= reference_colors.shape[0]) & (matched_b > 0)
+    colors[matched_b[known] - 1] = reference_colors[matched_a[known] - 1]
+    return colors
@@ -0,0 +1,120 @@
+from typing import Optional
+
+import numpy as np
+
+from src.function_lib.cluster import ClusterState
+
+
+def feature_variance(values: np.ndarray) -> np.ndarray:
+    """
+    Дисперсия признаков всего набора для априорной ковариации кластеров. Нулевая дисперсия заменяется единицей
+
+    :param values: Точки (N, d)
+    :return: Дисперсии (d,)
+    """
+    variance: np.ndarray = np.asarray(values, dtype=float).var(axis=0) if values.shape[0] else np.ones(values.shape[1])
+    variance[~(variance > 0)] = 1.0
+    return variance
+
+
+class CovarianceClusterState(ClusterState):
+    """
+    Статистика кластеров с полной ковариационной матрицей для расстояния Махаланобиса.
+
+    Ковариация кластера регуляризуется априорной диагональной ковариацией с весом `prior_strength` точек:
+    C = (S + k P) / (n + k), где S - матрица рассеяния кластера, P - диагональ `prior`. Поэтому у малых кластеров
+    ковариация близка к априорной и не вырождена, а у больших - к выборочной. Матрица (S + k P)^-1 хранится
+    и обновляется формулой Шермана-Моррисона при каждом добавлении точки (ранг 1, O(d^2)); на степенях двойки
+    количества точек она пересчитывается заново, чтобы не накапливалась ошибка округления.
+    """
+    _arrays: tuple = ClusterState._arrays + ('scatter', 'precision')
+
+    def __init__(self, dim: int, capacity: int = 16, prior: Optional[np.ndarray] = None, prior_strength: float = 1.0):
+        """
+        :param dim: Количество признаков
+        :param capacity: Начальная ёмкость по кластерам
+        :param prior: Априорная дисперсия признаков (d,). По умолчанию - единицы
+        :param prior_strength: Вес априорной ковариации в точках, больше 0
+        """
+        if prior_strength <= 0:
+            raise ValueError("prior_strength must be positive")
+        super(CovarianceClusterState, self).__init__(dim, capacity)
+        self.prior: np.ndarray = np.ones(dim) if prior is None else np.asarray(prior, dtype=float)
+        self.prior_strength: float = prior_strength
+        self.scatter: np.ndarray = np.zeros((capacity, dim, dim))
+        self.precision: np.ndarray = np.zeros((capacity, dim, dim))
+
+    def distances(self, point: np.ndarray) -> np.ndarray:
+        """
+        Квадраты расстояний Махаланобиса от точки до всех кластеров, O(K d^2)
+
+        :param point: Вектор признаков
+        :return: Массив расстояний (K,)
+        """
+        delta: np.ndarray = self.means[:self.size] - point
+        quadratic: np.ndarray = np.einsum('ki,kij,kj->k', delta, self.precision[:self.size], delta)
+        return quadratic * (self.counts[:self.size] + self.prior_strength)
+
+    def new_cluster(self, point: np.ndarray) -> int:
+        index: int = super(CovarianceClusterState, self).new_cluster(point)
+        self.scatter[index] = 0.0
+        self.precision[index] = np.diag(1.0 / (self.prior_strength * self.prior))
+        return index
+
+    def add(self, index: int, point: np.ndarray) -> None:
+        delta: np.ndarray = point - self.means[index]
+        super(CovarianceClusterState, self).add(index, point)
+        count: int = int(self.counts[index])
+        scale: float = (count - 1) / count
+        self.scatter[index] += scale * np.outer(delta, delta)
+        if count & (count - 1) == 0:
+            self.precision[index] = self._inverse(self.scatter[index])
+        else:
+            projected: np.ndarray = self.precision[index] @ delta
+            self.precision[index] -= scale * np.outer(projected, projected) / (1.0 + scale * delta @ projected)
+
+    def _inverse(self, scatter: np.ndarray) -> np.ndarray:
+        return np.linalg.inv(scatter + np.diag(self.prior_strength * self.prior))
+
+    @property
+    def covariance(self) -> np.ndarray:
+        """
+        Регуляризованные ковариационные матрицы кластеров (K, d, d)
+        """
+        counts: np.ndarray = self.counts[:self.size, None, None] + self.prior_strength
+        return (self.scatter[:self.size] + np.diag(self.prior_strength * self.prior)) / counts
+
+    @classmethod
+    def from_labels(cls,
+                    values: np.ndarray,
+                    labels: np.ndarray,
+                    n_clusters: Optional[int] = None,
+                    prior: Optional[np.ndarray] = None,
+                    prior_strength: float = 1.0) -> 'CovarianceClusterState':
+        """
+        Восстановление статистики по готовым меткам (векторно, без последовательного прохода)
+
+        :param values: Точки (N, d)
+        :param labels: Метки кластеров (N,), начиная с 1
+        :param n_clusters: Количество кластеров. По умолчанию - максимальная метка
+        :param prior: Априорная дисперсия признаков (d,). По умолчанию - единицы
+        :param prior_strength: Вес априорной ковариации в точках
+        :return: Состояние кластеров
+        """
+        values = np.asarray(values, dtype=float)
+        state: CovarianceClusterState = super(CovarianceClusterState, cls).from_labels(values, labels, n_clusters)
+        state.prior = np.ones(values.shape[1]) if prior is None else np.asarray(prior, dtype=float)
+        state.prior_strength = prior_strength
+        size: int = state.size
+        if not size:
+            return state
+        index: np.ndarray = np.asarray(labels, dtype=np.int64) - 1
+        delta: np.ndarray = values - state.means[index]
+        # Элементы матриц рассеяния по парам признаков - память O(N), а не O(N d^2)
+        for row in range(values.shape[1]):
+            for column in range(row, values.shape[1]):
+                products: np.ndarray = np.bincount(index, weights=delta[:, row] * delta[:, column], minlength=size)
+                state.scatter[:size, row, column] = products
+                state.scatter[:size, column, row] = products
+        state.precision[:size] = np.linalg.inv(state.scatter[:size] + np.diag(prior_strength * state.prior))
+        return state
@@ -0,0 +1,228 @@
+import ctypes
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Iterator, Tuple
+
+from src.enums import ClusterizationDataMethod, MemoryBudgetPolicy
+from src.function_lib.neighbor_graph import PAIR_BUDGET
+from src.function_lib.sample_assign import SAMPLE_SIZE, ASSIGN_CHUNK
+
+MEGABYTE = 1024 * 1024
+
+
+class MemoryBudgetError(MemoryError):
+    pass
+
+
+@dataclass
+class MemoryReport:
+    label: str
+    # Оценка дополнительной памяти до запуска
+    estimated: int = 0
+    # Текущая и пиковая память Python по tracemalloc или, если трассировка выключена, память процесса
+    # (пик процесса - за всё время его работы). None - замер недоступен
+    current: Optional[int] = None
+    peak: Optional[int] = None
+    # Прирост памяти за время выполнения
+    delta: Optional[int] = None
+    traced: bool = False
+    compact: bool = False
+    # Метод, на который переведён запуск, чтобы уложиться в ограничение (None - без замены)
+    data_method: Optional[ClusterizationDataMethod] = None
+    buffers: Dict[str, int] = field(default_factory=dict)
+    top_sites: List[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        parts: List[str] = [f"{self.label}: оценка {self.estimated / MEGABYTE:.1f} МБ"]
+        if self.peak is not None:
+            source: str = "" if self.traced else " процесса"
+            parts.append(f"пик{source} {self.peak / MEGABYTE:.1f} МБ, текущая {self.current / MEGABYTE:.1f} МБ"
+                         + (f", прирост {self.delta / MEGABYTE:+.1f} МБ" if self.delta is not None else ""))
+        if self.buffers:
+            parts.append(f"буферы {sum(self.buffers.values()) / MEGABYTE:.1f} МБ")
+        if self.compact:
+            parts.append("экономный режим")
+        if self.data_method is not None:
+            parts.append(f"метод заменён на {self.data_method.name}")
+        return ", ".join(parts)
+
+
+def buffer_sizes(**buffers) -> Dict[str, int]:
+    """
+    Размеры буферов в байтах (объекты без `nbytes` и None пропускаются)
+
+    :param buffers: Именованные массивы или объекты с атрибутом `nbytes`
+    :return: Словарь имя -> байты
+    """
+    return {name: int(value.nbytes) for name, value in buffers.items()
+            if value is not None and hasattr(value, 'nbytes')}
+
+
+def estimate_clustering_memory(n_points: int,
+                               dim: int,
+                               data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                               compact: bool = False,
+                               expected_clusters: Optional[int] = None,
+                               sample_size: int = SAMPLE_SIZE) -> int:
+    """
+    Оценка дополнительной памяти для `clusterization_threshold` (без учёта самого входного массива)
+
+    :param n_points: Количество точек
+    :param dim: Размерность
+    :param data_method: Метод пред-обработки данных
+    :param compact: Экономный режим
+    :param expected_clusters: Ожидаемое количество кластеров. По умолчанию - худший случай (N)
+    :param sample_size: Размер выборки для SAMPLE_ASSIGN
+    :return: Байты
+    """
+    clusters: int = n_points if expected_clusters is None else min(max(expected_clusters, 1), n_points)
+    label_size: int = 4 if compact else 8
+    total: int = n_points * 8 + n_points * label_size  # порядок перебора и метки
+    if data_method is ClusterizationDataMethod.SAMPLE_ASSIGN:
+        # Метки, ближайшие кластеры и индексы невыбранных точек; статистика - только кластеров выборки,
+        # расстояния назначения (float64 и признак принятия) - частями по ASSIGN_CHUNK на поток
+        sample_clusters: int = min(clusters, sample_size, n_points)
+        threads: int = os.cpu_count() or 1
+        return 3 * n_points * 8 + n_points + 2 * sample_clusters * (8 + 3 * dim * 8) + \
+            3 * sample_clusters * dim * 8 + \
+            threads * min(n_points * sample_clusters, max(ASSIGN_CHUNK, 1024 * sample_clusters)) * 9
+    if data_method is ClusterizationDataMethod.NEIGHBOR_GRAPH:
+        # Масштабированные точки и ячейки сетки, ключи, лес множеств, временные пары точек
+        return total + 2 * n_points * dim * 8 + 4 * n_points * 8 + PAIR_BUDGET * (3 * 8 + dim * 8)
+    if data_method is ClusterizationDataMethod.SHUFFLE and not compact:
+        total += n_points * dim * 8  # перемешанная копия точек
+    if data_method is not ClusterizationDataMethod.FORWARD:
+        total += n_points * label_size  # метки в исходном порядке
+    # Статистика кластеров с запасом ёмкости и временные массивы расстояний
+    total += 2 * clusters * (8 + 3 * dim * 8) + 3 * clusters * dim * 8
+    return total
+
+
+class MemoryBudget:
+    """
+    Ограничение памяти на запуск кластеризации. При превышении запуск отклоняется или (DOWNGRADE) переводится
+    в экономный режим, а если не укладывается и он - в приближённый режим SAMPLE_ASSIGN, статистика которого
+    ограничена кластерами выборки.
+    """
+    def __init__(self, limit: Optional[int] = None, policy: MemoryBudgetPolicy = MemoryBudgetPolicy.DOWNGRADE):
+        """
+        :param limit: Ограничение в байтах. None или 0 - без ограничения
+        :param policy: Действие при превышении
+        """
+        self.limit: Optional[int] = limit or None
+        self.policy: MemoryBudgetPolicy = policy
+
+    def plan(self,
+             n_points: int,
+             dim: int,
+             data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+             expected_clusters: Optional[int] = None,
+             in_use: int = 0,
+             fallback_method: Optional[ClusterizationDataMethod] = ClusterizationDataMethod.SAMPLE_ASSIGN,
+             sample_size: int = SAMPLE_SIZE) -> MemoryReport:
+        """
+        Выбор режима запуска
+
+        :param n_points: Количество точек
+        :param dim: Размерность
+        :param data_method: Метод пред-обработки данных
+        :param expected_clusters: Ожидаемое количество кластеров
+        :param in_use: Память, уже занятая буферами, байты
+        :param fallback_method: Приближённый метод для последовательных методов, если не хватает и экономного
+                                режима (None - без замены метода)
+        :param sample_size: Размер выборки для SAMPLE_ASSIGN
+        :return: Отчёт с оценкой, признаком экономного режима и заменой метода
+        :raises MemoryBudgetError: Запуск не укладывается в ограничение
+        """
+        estimated: int = estimate_clustering_memory(n_points, dim, data_method, False, expected_clusters)
+        report = MemoryReport("clusterization", estimated=estimated)
+        if self.limit is None or in_use + estimated <= self.limit:
+            return report
+        compact_estimated: int = estimate_clustering_memory(n_points, dim, data_method, True, expected_clusters)
+        if self.policy is MemoryBudgetPolicy.DOWNGRADE and in_use + compact_estimated <= self.limit:
+            report.estimated = compact_estimated
+            report.compact = True
+            return report
+        if self.policy is MemoryBudgetPolicy.DOWNGRADE and fallback_method is not None and data_method in (
+                ClusterizationDataMethod.FORWARD, ClusterizationDataMethod.REVERSE, ClusterizationDataMethod.SHUFFLE):
+            fallback_estimated: int = estimate_clustering_memory(n_points, dim, fallback_method, True,
+                                                                 expected_clusters, sample_size)
+            if in_use + fallback_estimated <= self.limit:
+                report.estimated = fallback_estimated
+                report.data_method = fallback_method
+                return report
+        raise MemoryBudgetError(f"Run needs ~{(in_use + estimated) / MEGABYTE:.1f} MB "
+                                f"(compact ~{(in_use + compact_estimated) / MEGABYTE:.1f} MB), "
+                                f"budget is {self.limit / MEGABYTE:.1f} MB")
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong),
+                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+
+def process_memory() -> Tuple[Optional[int], Optional[int]]:
+    """
+    Текущий и пиковый размер резидентной памяти процесса (рабочего набора в Windows)
+
+    :return: Текущая и пиковая память в байтах, None - недоступно на этой платформе
+    """
+    try:
+        if sys.platform == 'win32':
+            counters = _ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return int(counters.WorkingSetSize), int(counters.PeakWorkingSetSize)
+            return None, None
+        import resource
+        # ru_maxrss - в килобайтах в Linux и в байтах в macOS
+        peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+        current: Optional[int] = None
+        if os.path.exists('/proc/self/statm'):
+            with open('/proc/self/statm') as f:
+                current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        return current if current is not None else peak, peak
+    except (OSError, AttributeError, ImportError, ValueError):
+        return None, None
+
+
+@contextmanager
+def track_memory(label: str, report: Optional[MemoryReport] = None, top: int = 5) -> Iterator[MemoryReport]:
+    """
+    Замер текущей и пиковой памяти блока кода: по tracemalloc, если трассировка включена (см. TRACE), иначе -
+    по памяти процесса. Места наибольшего выделения памяти - только при трассировке
+
+    :param label: Название замера
+    :param report: Отчёт для заполнения (например, из `MemoryBudget.plan`)
+    :param top: Количество мест наибольшего выделения памяти в отчёте
+    :return: Отчёт, заполняемый при выходе из блока
+    """
+    if report is None:
+        report = MemoryReport(label)
+    report.label = label
+    tracing: bool = tracemalloc.is_tracing()
+    if tracing:
+        before: Optional[int] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    else:
+        before = process_memory()[0]
+    try:
+        yield report
+    finally:
+        report.traced = tracing
+        if tracing:
+            report.current, report.peak = tracemalloc.get_traced_memory()
+        else:
+            report.current, report.peak = process_memory()
+        if report.current is not None and before is not None:
+            report.delta = report.current - before
+        if tracing and top:
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:top]
+            report.top_sites = [str(statistic) for statistic in statistics]
@@ -0,0 +1,271 @@
+import itertools
+import math
+from typing import Optional, List
+
+import numpy as np
+
+from src.function_lib.cluster import disp_weights
+
+# Количество пар точек, проверяемых за одну векторную операцию
+PAIR_BUDGET = 1 << 21
+# Наибольшая размерность для сетки по всем осям: количество соседних ячеек растёт как (2 sqrt(d) + 1)^d.
+# При большей размерности сетка строится по 1..`PROJECTED_AXES` осям с наибольшим разбросом
+GRID_DIM_LIMIT = 4
+PROJECTED_AXES = 4
+# Наибольшее количество пар точек-кандидатов в проекционной сетке (иначе граф почти полный - ошибка)
+PROJECTED_PAIR_LIMIT = 1 << 26
+
+
+class UnionFind:
+    """
+    Система непересекающихся множеств с векторными операциями над массивами индексов.
+    Родитель всегда не больше самого элемента, поэтому корень множества - его наименьший индекс.
+    """
+    def __init__(self, size: int):
+        self.parent: np.ndarray = np.arange(size, dtype=np.int64)
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray) -> 'UnionFind':
+        """
+        Множества, заданные готовыми метками
+
+        :param labels: Метки (N,)
+        :return: Система множеств
+        """
+        forest = cls(0)
+        _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        forest.parent = first[inverse].astype(np.int64)
+        return forest
+
+    def find(self, items: np.ndarray) -> np.ndarray:
+        roots: np.ndarray = self.parent[items]
+        while True:
+            up: np.ndarray = self.parent[roots]
+            if np.array_equal(up, roots):
+                break
+            roots = up
+        # Сжатие путей для запрошенных элементов
+        self.parent[items] = roots
+        return roots
+
+    def union(self, items_a: np.ndarray, items_b: np.ndarray) -> None:
+        """
+        Объединение множеств попарно. При нескольких записях в один корень побеждает одна,
+        остальные пары объединяются на следующей итерации.
+        """
+        while items_a.size:
+            roots_a: np.ndarray = self.find(items_a)
+            roots_b: np.ndarray = self.find(items_b)
+            differ: np.ndarray = roots_a != roots_b
+            items_a, items_b = items_a[differ], items_b[differ]
+            roots_a, roots_b = roots_a[differ], roots_b[differ]
+            self.parent[np.maximum(roots_a, roots_b)] = np.minimum(roots_a, roots_b)
+
+    def roots(self) -> np.ndarray:
+        return self.find(np.arange(self.parent.shape[0]))
+
+
+def _local_index(lengths: np.ndarray) -> np.ndarray:
+    """
+    Номер элемента внутри своей группы для групп длиной `lengths`, идущих подряд
+    """
+    total: int = int(lengths.sum())
+    return np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+
+def _half_offsets(dim: int, reach: int) -> List[np.ndarray]:
+    """
+    Смещения соседних ячеек, без нулевого и без симметричных (каждая пара ячеек рассматривается один раз)
+    """
+    offsets: List[np.ndarray] = []
+    for offset in itertools.product(range(-reach, reach + 1), repeat=dim):
+        nonzero: List[int] = [value for value in offset if value]
+        if nonzero and nonzero[0] > 0:
+            offsets.append(np.array(offset, dtype=np.int64))
+    return offsets
+
+
+def _link_rows(forest: UnionFind,
+               scaled: np.ndarray,
+               threshold: float,
+               order: np.ndarray,
+               starts: np.ndarray,
+               counts: np.ndarray,
+               row_point: np.ndarray,
+               row_cell_a: np.ndarray,
+               row_cell_b: np.ndarray,
+               cells_connected: bool = True) -> None:
+    """
+    Проверка строк "точка ячейки `a` против всех точек ячейки `b`" частями не больше `PAIR_BUDGET` пар.
+    Если точки каждой ячейки уже в одной компоненте (`cells_connected`), строки пар ячеек одной компоненты
+    пропускаются
+    """
+    representatives: np.ndarray = order[starts]
+    row_end: np.ndarray = np.cumsum(counts[row_cell_b])
+    low: int = 0
+    while low < row_point.shape[0]:
+        row_begin: int = int(row_end[low - 1]) if low else 0
+        high: int = max(low + 1, int(np.searchsorted(row_end, row_begin + PAIR_BUDGET, side='right')))
+        if cells_connected:
+            keep: np.ndarray = forest.find(representatives[row_cell_a[low:high]]) != \
+                forest.find(representatives[row_cell_b[low:high]])
+        else:
+            keep = np.ones(high - low, dtype=bool)
+        points: np.ndarray = row_point[low:high][keep]
+        cells: np.ndarray = row_cell_b[low:high][keep]
+        lengths: np.ndarray = counts[cells]
+        index_a: np.ndarray = np.repeat(points, lengths)
+        index_b: np.ndarray = order[np.repeat(starts[cells], lengths) + _local_index(lengths)]
+        delta: np.ndarray = scaled[index_a] - scaled[index_b]
+        close: np.ndarray = np.einsum('ij,ij->i', delta, delta) <= threshold
+        forest.union(index_a[close], index_b[close])
+        low = high
+
+
+def _link_cells(forest: UnionFind,
+                scaled: np.ndarray,
+                threshold: float,
+                order: np.ndarray,
+                starts: np.ndarray,
+                counts: np.ndarray,
+                cells_a: np.ndarray,
+                cells_b: np.ndarray) -> None:
+    """
+    Объединение точек пар соседних ячеек, расстояние между которыми не больше порога.
+    Для связности достаточно одного ребра, поэтому точки ячейки `a` проверяются раундами растущего размера
+    (1, 1, 2, 4, ...), а пары ячеек, уже попавших в одну компоненту, отбрасываются после каждого раунда.
+    """
+    representatives: np.ndarray = order[starts]
+    checked: int = 0
+    take: int = 1
+    while cells_a.size:
+        active: np.ndarray = (counts[cells_a] > checked) & \
+            (forest.find(representatives[cells_a]) != forest.find(representatives[cells_b]))
+        cells_a, cells_b = cells_a[active], cells_b[active]
+        row_counts: np.ndarray = np.minimum(counts[cells_a] - checked, take)
+        _link_rows(forest, scaled, threshold, order, starts, counts,
+                   order[np.repeat(starts[cells_a] + checked, row_counts) + _local_index(row_counts)],
+                   np.repeat(cells_a, row_counts), np.repeat(cells_b, row_counts))
+        checked += take
+        take = checked
+
+
+def _grid(coordinates: np.ndarray, cell_size: float, reach: int) -> tuple:
+    """
+    Раскладка точек по ячейкам сетки: ключ ячейки - номер в построчной нумерации с полями `reach` по краям,
+    чтобы ключи соседних ячеек получались прибавлением смещения
+
+    :param coordinates: Координаты (N, k)
+    :param cell_size: Сторона ячейки
+    :param reach: Наибольшее смещение соседней ячейки по оси
+    :return: Порядок точек по ячейкам, шаги ключа по осям, ключи непустых ячеек, их начала и размеры в порядке
+    """
+    cells: np.ndarray = np.floor((coordinates - coordinates.min(axis=0)) / cell_size).astype(np.int64) + reach
+    extent: List[int] = [int(value) + 1 + reach for value in cells.max(axis=0)]
+    if math.prod(extent) >= 2 ** 62:
+        raise ValueError("Threshold is too small for the data range")
+    strides: np.ndarray = np.array([math.prod(extent[axis + 1:]) for axis in range(coordinates.shape[1])],
+                                   dtype=np.int64)
+    keys: np.ndarray = cells @ strides
+    order: np.ndarray = np.argsort(keys, kind='stable')
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    return order, strides, cell_keys, starts, counts
+
+
+def _neighbor_cells(cell_keys: np.ndarray, offset: np.ndarray, strides: np.ndarray) -> tuple:
+    """
+    Пары непустых ячеек, отличающихся на смещение `offset`
+
+    :return: Индексы первых и вторых ячеек пар
+    """
+    target: np.ndarray = cell_keys + offset @ strides
+    neighbor: np.ndarray = np.minimum(np.searchsorted(cell_keys, target), cell_keys.shape[0] - 1)
+    found: np.ndarray = cell_keys[neighbor] == target
+    return np.flatnonzero(found), neighbor[found]
+
+
+def canonical_labels(values: np.ndarray, roots: np.ndarray) -> np.ndarray:
+    """
+    Нумерация компонент, не зависящая от порядка точек: компоненты нумеруются по лексикографически
+    наименьшей точке
+
+    :param values: Точки (N, d)
+    :param roots: Номер компоненты каждой точки (N,)
+    :return: Метки (N,), начиная с 1
+    """
+    _, inverse = np.unique(roots, return_inverse=True)
+    lexicographic: np.ndarray = np.lexsort(values.T[::-1])
+    _, first_position = np.unique(inverse[lexicographic], return_index=True)
+    rank: np.ndarray = np.empty_like(first_position)
+    rank[np.argsort(first_position)] = np.arange(first_position.shape[0])
+    return rank[inverse] + 1
+
+
+def neighbor_graph_labels(input_array: np.ndarray,
+                          threshold: float,
+                          initial: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Кластеризация, не зависящая от порядка точек: компоненты связности графа, в котором точки соединены,
+    если расстояние между ними не больше порога. Расстояние - то же, что в `euclid_disp`, с дисперсией
+    всего набора вместо дисперсии кластера.
+
+    Точки раскладываются по ячейкам сетки со стороной r / sqrt(d), поэтому точки одной ячейки связаны заведомо,
+    а расстояния проверяются только между соседними ячейками. Сортировка по ячейкам - O(N log N).
+    При размерности больше `GRID_DIM_LIMIT` сетка со стороной r строится по k <= `PROJECTED_AXES` осям
+    с наибольшим разбросом (k - с наименьшим количеством пар-кандидатов), и все пары точек соседних по проекции
+    ячеек проверяются по полному расстоянию: соседей 3^k вместо (2 sqrt(d) + 1)^d, но ячейки крупнее и связность
+    внутри них не гарантирована. Если пар больше `PROJECTED_PAIR_LIMIT`, вызывается ValueError.
+
+    :param input_array: Входной массив (N, d)
+    :param threshold: Порог
+    :param initial: Метки, полученные тем же методом при меньшем пороге (их компоненты только укрупняются)
+    :return: Метки кластеров (начиная с 1)
+    """
+    values: np.ndarray = np.asarray(input_array, dtype=float)
+    array_size, dim = values.shape
+    if not array_size:
+        return np.zeros(0, dtype=int)
+    scaled: np.ndarray = values * np.sqrt(disp_weights(values.std(axis=0))[0])
+    forest: UnionFind = UnionFind.from_labels(initial) if initial is not None else UnionFind(array_size)
+
+    if threshold <= 0:
+        # Связаны только совпадающие точки
+        _, first, inverse = np.unique(scaled, axis=0, return_index=True, return_inverse=True)
+        forest.union(np.arange(array_size), first[inverse.ravel()])
+        return canonical_labels(values, forest.roots())
+
+    if dim > GRID_DIM_LIMIT:
+        by_spread: np.ndarray = np.argsort(-scaled.std(axis=0), kind='stable')
+        best: Optional[tuple] = None
+        for axes_count in range(1, min(dim, PROJECTED_AXES) + 1):
+            order, strides, cell_keys, starts, counts = _grid(scaled[:, by_spread[:axes_count]],
+                                                              math.sqrt(threshold), 1)
+            neighbors: List[tuple] = [_neighbor_cells(cell_keys, offset, strides) for offset in
+                                      [np.zeros(axes_count, dtype=np.int64)] + _half_offsets(axes_count, 1)]
+            pairs: int = sum(int((counts[cells_a] * counts[cells_b]).sum()) for cells_a, cells_b in neighbors)
+            if best is None or pairs < best[0]:
+                best = (pairs, order, starts, counts, neighbors)
+        pairs, order, starts, counts, neighbors = best
+        if pairs > PROJECTED_PAIR_LIMIT:
+            raise ValueError(f"Neighbor graph needs {pairs} distance checks for {dim}-dimensional data at this "
+                             f"threshold (limit {PROJECTED_PAIR_LIMIT}); use a smaller threshold or another method")
+        for cells_a, cells_b in neighbors:
+            lengths: np.ndarray = counts[cells_a]
+            _link_rows(forest, scaled, threshold, order, starts, counts,
+                       order[np.repeat(starts[cells_a], lengths) + _local_index(lengths)],
+                       np.repeat(cells_a, lengths), np.repeat(cells_b, lengths), cells_connected=False)
+        return canonical_labels(values, forest.roots())
+
+    cell_size: float = math.sqrt(threshold / dim)
+    reach: int = math.ceil(math.sqrt(dim))
+    order, strides, cell_keys, starts, counts = _grid(scaled, cell_size, reach)
+
+    # Диагональ ячейки не больше порога - точки одной ячейки в одной компоненте
+    forest.union(order, order[np.repeat(starts, counts)])
+    for offset in _half_offsets(dim, reach):
+        gap: np.ndarray = np.maximum(np.abs(offset) - 1, 0)
+        if cell_size ** 2 * float(gap @ gap) > threshold:
+            continue
+        cells_a, cells_b = _neighbor_cells(cell_keys, offset, strides)
+        _link_cells(forest, scaled, threshold, order, starts, counts, cells_a, cells_b)
+    return canonical_labels(values, forest.roots())
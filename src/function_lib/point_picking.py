@@ -0,0 +1,128 @@
+import math
+from typing import Optional, Tuple, List
+
+import numpy as np
+
+from src.function_lib.rasterizer import Camera, project_points
+
+# Точек в листе дерева и радиус поиска по умолчанию, пиксели
+PICK_LEAF = 32
+PICK_RADIUS = 8.0
+# Разрядов на координату в ключе Z-порядка
+MORTON_BITS = 16
+
+
+def morton_keys(coordinates: np.ndarray) -> np.ndarray:
+    """
+    Ключи Z-порядка (чередование разрядов x и y) для экранных координат, квантованных по их общему охвату
+
+    :param coordinates: Координаты (n, 2)
+    :return: Ключи (n,)
+    """
+    low: np.ndarray = coordinates.min(axis=0)
+    extent: float = float((coordinates.max(axis=0) - low).max()) or 1.0
+    quantized: np.ndarray = ((coordinates - low) * (((1 << MORTON_BITS) - 1) / extent)).astype(np.uint64)
+    # Разряды каждой координаты раздвигаются через один
+    for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+        quantized = (quantized | (quantized << np.uint64(shift))) & np.uint64(mask)
+    return quantized[:, 0] | (quantized[:, 1] << np.uint64(1))
+
+
+class ScreenIndex:
+    """
+    Индекс точек в экранных координатах - неявное дерево ограничивающих прямоугольников: точки отсортированы
+    в Z-порядке и разбиты на листы по PICK_LEAF точек, над листами - полное двоичное дерево в порядке кучи.
+    Построение - одна сортировка, поиск ближайшей к курсору точки обходит узлы с отсечением по прямоугольникам,
+    поэтому занимает O(log N) и при плотном скоплении точек на экране.
+    Индекс строится для одной камеры и одного размера экрана; при их изменении его нужно построить заново.
+    """
+    def __init__(self, points: np.ndarray, camera: Camera, width: int, height: int, leaf_size: int = PICK_LEAF):
+        """
+        :param points: Точки (N, 3)
+        :param camera: Камера
+        :param width: Ширина экрана, пиксели
+        :param height: Высота экрана, пиксели
+        :param leaf_size: Точек в листе дерева
+        """
+        screen, depth = project_points(points, camera, width, height)
+        visible: np.ndarray = (depth > 0) & np.isfinite(screen).all(axis=1) & \
+            (screen[:, 0] >= 0) & (screen[:, 0] < width) & (screen[:, 1] >= 0) & (screen[:, 1] < height)
+        index: np.ndarray = np.flatnonzero(visible)
+        self.visible: int = index.shape[0]
+        self.leaf_size: int = leaf_size
+        self.levels: int = max(int(math.ceil(math.log2(max(self.visible, 1) / leaf_size))), 0)
+        self.index: np.ndarray = np.full(leaf_size << self.levels, -1, dtype=np.int64)
+        self.screen: np.ndarray = np.zeros((self.index.shape[0], 2))
+        self.depth: np.ndarray = np.full(self.index.shape[0], np.inf)
+        if self.visible:
+            index = index[np.argsort(morton_keys(screen[index]), kind='stable')]
+            self.index[:self.visible] = index
+            self.screen[:self.visible] = screen[index]
+            self.depth[:self.visible] = depth[index]
+            # Последний лист дополняется копиями последней точки с бесконечной глубиной - они не меняют
+            # прямоугольник листа и не выбираются
+            self.screen[self.visible:] = self.screen[self.visible - 1]
+        # Ограничивающие прямоугольники узлов в порядке кучи: дети узла i - 2i + 1 и 2i + 2
+        leaves: np.ndarray = self.screen.reshape(-1, leaf_size, 2)
+        self.low: np.ndarray = np.empty(((2 << self.levels) - 1, 2))
+        self.high: np.ndarray = np.empty_like(self.low)
+        self.low[(1 << self.levels) - 1:] = leaves.min(axis=1)
+        self.high[(1 << self.levels) - 1:] = leaves.max(axis=1)
+        for level in range(self.levels - 1, -1, -1):
+            nodes: slice = slice((1 << level) - 1, (2 << level) - 1)
+            children: slice = slice((2 << level) - 1, (4 << level) - 1)
+            self.low[nodes] = np.minimum(self.low[children][0::2], self.low[children][1::2])
+            self.high[nodes] = np.maximum(self.high[children][0::2], self.high[children][1::2])
+
+    def __len__(self) -> int:
+        return self.visible
+
+    def box_distance(self, node: int, x: float, y: float) -> float:
+        """
+        Квадрат расстояния от позиции до прямоугольника узла
+
+        :param node: Номер узла
+        :param x: Позиция по горизонтали
+        :param y: Позиция по вертикали
+        :return: Квадрат расстояния, 0 - позиция внутри прямоугольника
+        """
+        dx: float = max(self.low[node, 0] - x, 0.0, x - self.high[node, 0])
+        dy: float = max(self.low[node, 1] - y, 0.0, y - self.high[node, 1])
+        return dx * dx + dy * dy
+
+    def nearest(self, x: float, y: float, radius: float = PICK_RADIUS) -> Optional[int]:
+        """
+        Ближайшая к экранной позиции точка; из точек на одинаковом расстоянии - ближайшая к камере
+
+        :param x: Позиция по горизонтали, пиксели
+        :param y: Позиция по вертикали, пиксели
+        :param radius: Радиус поиска, пиксели
+        :return: Индекс точки в исходном массиве или None, если в радиусе точек нет
+        """
+        if not self.visible:
+            return None
+        first_leaf: int = (1 << self.levels) - 1
+        # Ключ точки - (квадрат расстояния, глубина): точки на границе радиуса проходят, копии-дополнения - нет
+        best: Tuple[float, float] = (radius * radius, math.inf)
+        best_position: int = -1
+        stack: List[int] = [0]
+        while stack:
+            node: int = stack.pop()
+            if self.box_distance(node, x, y) > best[0]:
+                continue
+            if node < first_leaf:
+                left: int = 2 * node + 1
+                # Сначала обходится ближайший ребёнок, он сильнее всего уменьшает радиус
+                if self.box_distance(left, x, y) <= self.box_distance(left + 1, x, y):
+                    stack.extend((left + 1, left))
+                else:
+                    stack.extend((left, left + 1))
+                continue
+            start: int = (node - first_leaf) * self.leaf_size
+            delta: np.ndarray = self.screen[start:start + self.leaf_size] - (x, y)
+            distance: np.ndarray = np.einsum('ij,ij->i', delta, delta)
+            candidate: int = int(np.lexsort((self.depth[start:start + self.leaf_size], distance))[0])
+            key: Tuple[float, float] = (float(distance[candidate]), float(self.depth[start + candidate]))
+            if key < best:
+                best, best_position = key, start + candidate
+        return int(self.index[best_position]) if best_position >= 0 else None
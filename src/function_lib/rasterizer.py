@@ -0,0 +1,237 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Tuple, List
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod, UnmatchedPointPolicy
+from src.function_lib.sample_assign import sample_assign_clusterization, SAMPLE_SIZE
+from src.function_lib.threshold_sweep import threshold_sweep
+
+# Цвет точек без кластера (метка 0), как в основном окне
+NOISE_COLOR = (0.5, 0.5, 0.5, 0.5)
+
+
+@dataclass
+class Camera:
+    """
+    Камера с теми же параметрами, что и у `GLViewWidget` из pyqtgraph (углы в градусах, fov - по горизонтали)
+    """
+    distance: float = 60.0
+    elevation: float = 30.0
+    azimuth: float = 45.0
+    center: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+    fov: float = 60.0
+
+    def view_matrix(self) -> np.ndarray:
+        """
+        Поворот мировых координат в координаты камеры (камера смотрит вдоль -z), как `GLViewWidget.viewMatrix`
+
+        :return: Матрица 3x3
+        """
+        azimuth: float = np.radians(-(self.azimuth + 90))
+        elevation: float = np.radians(self.elevation - 90)
+        rotate_z: np.ndarray = np.array([[np.cos(azimuth), -np.sin(azimuth), 0],
+                                         [np.sin(azimuth), np.cos(azimuth), 0],
+                                         [0, 0, 1]])
+        rotate_x: np.ndarray = np.array([[1, 0, 0],
+                                         [0, np.cos(elevation), -np.sin(elevation)],
+                                         [0, np.sin(elevation), np.cos(elevation)]])
+        return rotate_x @ rotate_z
+
+
+def project_points(points: np.ndarray, camera: Camera, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Перспективная проекция точек на экран
+
+    :param points: Точки (N, 3)
+    :param camera: Камера
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :return: Экранные координаты (N, 2) в пикселях и глубина (N,), точки за камерой имеют глубину <= 0
+    """
+    view: np.ndarray = (np.asarray(points, dtype=float)[:, :3] - np.asarray(camera.center)) @ camera.view_matrix().T
+    depth: np.ndarray = camera.distance - view[:, 2]
+    focal: float = 1.0 / np.tan(np.radians(camera.fov) / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_ndc: np.ndarray = focal * view[:, 0] / depth
+        y_ndc: np.ndarray = focal * (width / height) * view[:, 1] / depth
+    screen: np.ndarray = np.stack(((x_ndc + 1) / 2 * width, (1 - y_ndc) / 2 * height), axis=1)
+    return screen, depth
+
+
+def render_points(points: np.ndarray,
+                  colors: np.ndarray,
+                  camera: Camera,
+                  width: int = 800,
+                  height: int = 600,
+                  point_size: int = 2,
+                  background: Tuple[int, int, int, int] = (10, 10, 10, 255),
+                  density_shading: bool = True) -> np.ndarray:
+    """
+    Программная отрисовка облака точек без OpenGL. В каждом пикселе остаётся ближайшая к камере точка
+    (сортировка по пикселю и глубине вместо z-буфера), точки рисуются квадратами `point_size` x `point_size`.
+    При `density_shading` яркость пикселя растёт с логарифмом количества попавших в него точек,
+    чтобы плотные области миллионов точек не сливались в одно пятно.
+
+    :param points: Точки (N, 3)
+    :param colors: Цвета RGBA (N, 4) в диапазоне 0..1
+    :param camera: Камера
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param point_size: Размер точки в пикселях
+    :param background: Цвет фона RGBA 0..255
+    :param density_shading: Учитывать плотность точек в пикселе
+    :return: Изображение RGBA (height, width, 4), uint8
+    """
+    image: np.ndarray = np.empty((height, width, 4), dtype=np.uint8)
+    image[:] = background
+    screen, depth = project_points(points, camera, width, height)
+    visible: np.ndarray = (depth > camera.distance * 1e-3) & np.isfinite(screen).all(axis=1)
+    pixel: np.ndarray = np.floor(screen[visible]).astype(np.int64)
+    depth = depth[visible]
+    source: np.ndarray = np.flatnonzero(visible)
+
+    # Точка размером больше пикселя размножается смещениями
+    offsets: np.ndarray = np.arange(point_size) - (point_size - 1) // 2
+    shift_x, shift_y = np.meshgrid(offsets, offsets)
+    x: np.ndarray = (pixel[:, 0:1] + shift_x.ravel()).ravel()
+    y: np.ndarray = (pixel[:, 1:2] + shift_y.ravel()).ravel()
+    depth = np.repeat(depth, point_size * point_size)
+    source = np.repeat(source, point_size * point_size)
+    inside: np.ndarray = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    flat: np.ndarray = y[inside] * width + x[inside]
+    depth, source = depth[inside], source[inside]
+    if not flat.size:
+        return image
+
+    order: np.ndarray = np.lexsort((depth, flat))
+    flat, source = flat[order], source[order]
+    nearest_pixels, first, counts = np.unique(flat, return_index=True, return_counts=True)
+    rgba: np.ndarray = np.clip(np.asarray(colors, dtype=float)[source[first]], 0.0, 1.0)
+    if density_shading:
+        shade: np.ndarray = 0.55 + 0.45 * np.log1p(counts) / np.log1p(counts.max())
+        rgba[:, :3] *= shade[:, None]
+    # Альфа-канал цвета смешивается с фоном
+    alpha: np.ndarray = rgba[:, 3:4]
+    blended: np.ndarray = rgba[:, :3] * 255 * alpha + np.asarray(background[:3], dtype=float) * (1 - alpha)
+    image.reshape(-1, 4)[nearest_pixels, :3] = np.round(blended).astype(np.uint8)
+    image.reshape(-1, 4)[nearest_pixels, 3] = 255
+    return image
+
+
+def encode_png(image: np.ndarray, compress_level: int = 6) -> bytes:
+    """
+    Кодирование изображения RGBA (H, W, 4) uint8 в PNG без сторонних библиотек
+
+    :param image: Изображение
+    :param compress_level: Уровень сжатия zlib
+    :return: Байты PNG
+    """
+    height, width = image.shape[:2]
+    # Каждая строка начинается с байта фильтра (0 - без фильтра)
+    raw: np.ndarray = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = np.ascontiguousarray(image, dtype=np.uint8).reshape(height, width * 4)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    return b''.join((b'\x89PNG\r\n\x1a\n',
+                     chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+                     chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level)),
+                     chunk(b'IEND', b'')))
+
+
+def save_png(path: str, image: np.ndarray) -> None:
+    with open(path, 'wb') as f:
+        f.write(encode_png(image))
+
+
+def label_colors(labels: np.ndarray, seed: int = 0, cluster_colors: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Цвета точек по меткам кластеров
+
+    :param labels: Метки (N,), начиная с 1 (0 - точка без кластера)
+    :param seed: Seed палитры
+    :param cluster_colors: Готовая палитра (K, 4). По умолчанию - случайная
+    :return: Цвета RGBA (N, 4)
+    """
+    count: int = int(labels.max()) if labels.size else 0
+    palette: np.ndarray = np.random.default_rng(seed).random((count, 4))
+    palette[:, 3] = 1.0
+    if cluster_colors is not None:
+        known: int = min(count, cluster_colors.shape[0])
+        palette[:known] = cluster_colors[:known]
+    colors: np.ndarray = palette[labels - 1]
+    colors[labels == 0] = NOISE_COLOR
+    return colors
+
+
+@dataclass
+class FrameExport:
+    paths: List[str] = field(default_factory=list)
+    thresholds: List[float] = field(default_factory=list)
+
+
+def export_threshold_frames(points: np.ndarray,
+                            thresholds: Sequence[float],
+                            out_dir: str,
+                            camera: Camera,
+                            width: int = 800,
+                            height: int = 600,
+                            point_size: int = 2,
+                            data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                            random_seed: Optional[int] = None,
+                            palette_seed: int = 0,
+                            batch: int = 16,
+                            workers: int = 4,
+                            sample_size: int = SAMPLE_SIZE,
+                            unmatched_policy: UnmatchedPointPolicy = UnmatchedPointPolicy.NEAREST) -> FrameExport:
+    """
+    Пакетный экспорт кадров: по одному PNG на каждый порог. Метки считаются перебором порогов
+    (`threshold_sweep`) пачками по `batch` порогов, отрисовка и сжатие PNG идут в пуле потоков.
+    Для SAMPLE_ASSIGN кадры показывают все точки с метками приближённого режима для каждого порога.
+
+    :param points: Точки (N, 3)
+    :param thresholds: Пороги
+    :param out_dir: Папка для кадров
+    :param camera: Камера
+    :param width: Ширина кадра
+    :param height: Высота кадра
+    :param point_size: Размер точки в пикселях
+    :param data_method: Метод пред-обработки данных
+    :param random_seed: Seed для случайного перемешивания точек
+    :param palette_seed: Seed палитры кластеров (одинаковый для всех кадров)
+    :param batch: Количество порогов, метки которых держатся в памяти одновременно
+    :param workers: Количество потоков отрисовки
+    :param sample_size: Размер выборки для SAMPLE_ASSIGN
+    :param unmatched_policy: Обработка точек вне порога для SAMPLE_ASSIGN
+    :return: Пути и пороги сохранённых кадров
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    grid: np.ndarray = np.unique(np.asarray(thresholds, dtype=float))
+    export = FrameExport()
+
+    def render_frame(threshold: float, labels: np.ndarray) -> str:
+        path: str = os.path.join(out_dir, f"frame_{threshold:09.4f}.png")
+        image: np.ndarray = render_points(points, label_colors(labels, palette_seed), camera, width, height,
+                                          point_size)
+        save_png(path, image)
+        return path
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, grid.shape[0], batch):
+            part: np.ndarray = grid[start:start + batch]
+            if data_method is ClusterizationDataMethod.SAMPLE_ASSIGN:
+                labels: List[np.ndarray] = [sample_assign_clusterization(points, threshold, sample_size, random_seed,
+                                                                         unmatched_policy).labels
+                                            for threshold in part]
+            else:
+                labels = list(threshold_sweep(points, part, data_method, random_seed, workers=1,
+                                              keep_labels=True).labels)
+            export.paths.extend(executor.map(render_frame, part, labels))
+            export.thresholds.extend(part.tolist())
+    return export
@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod, DistanceMetric
+from src.function_lib.label_comparison import ContingencyTable, contingency_table
+
+# Доля изменённых меток, начиная с которой запуск хранится целиком
+KEYFRAME_RATIO = 0.25
+
+
+def narrowest_dtype(max_value: int) -> np.dtype:
+    """
+    Наименьший беззнаковый тип, вмещающий значения 0..max_value
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+@dataclass
+class RunRecord:
+    threshold: float
+    data_method: ClusterizationDataMethod
+    random_seed: Optional[int]
+    cluster_count: int
+    elapsed: float
+    cluster_colors: Optional[np.ndarray] = None
+    metric: DistanceMetric = DistanceMetric.DIAGONAL
+    # Опорный запуск хранит метки целиком (`full`), остальные - разницу с опорным:
+    # перенумерацию меток опорного запуска и метки, не совпавшие после перенумерации
+    base: Optional['RunRecord'] = None
+    full: Optional[np.ndarray] = None
+    label_map: Optional[np.ndarray] = None
+    changed_index: Optional[np.ndarray] = None
+    changed_labels: Optional[np.ndarray] = None
+    extra: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def is_keyframe(self) -> bool:
+        return self.full is not None
+
+    @property
+    def nbytes(self) -> int:
+        arrays: tuple = (self.full, self.label_map, self.changed_index, self.changed_labels, self.cluster_colors)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def labels(self) -> np.ndarray:
+        """
+        Восстановление меток запуска
+
+        :return: Метки (N,), начиная с 1
+        """
+        if self.is_keyframe:
+            return self.full.astype(np.int64)
+        labels: np.ndarray = self.label_map[self.base.full].astype(np.int64)
+        labels[self.changed_index] = self.changed_labels
+        return labels
+
+
+def encode_labels(labels: np.ndarray, base: Optional[RunRecord], record: RunRecord) -> RunRecord:
+    """
+    Запись меток в `record`: разницей с опорным запуском `base`, если изменённых меток немного, иначе целиком.
+    Перенумерация - самая частая новая метка для каждой метки опорного запуска (по таблице сопряжённости),
+    поэтому запуски с тем же разбиением и другой нумерацией почти ничего не занимают.
+
+    :param labels: Метки (N,), начиная с 1
+    :param base: Опорный запуск с метками той же длины или None
+    :param record: Запись без меток
+    :return: Та же запись
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    label_dtype: np.dtype = narrowest_dtype(int(labels.max()) if labels.size else 0)
+    # Перенумерация занимает место по количеству кластеров, поэтому при большом количестве кластеров
+    # запуск сразу хранится целиком
+    if base is not None and base.full.shape[0] == labels.shape[0] and labels.size \
+            and int(base.full.max()) <= KEYFRAME_RATIO * labels.shape[0]:
+        base_labels: np.ndarray = base.full.astype(np.int64)
+        table: ContingencyTable = contingency_table(base_labels, labels)
+        # Для каждой строки - ячейка с наибольшим количеством (при равенстве - с меньшей новой меткой)
+        order: np.ndarray = np.lexsort((table.columns, -table.counts, table.rows))
+        first: np.ndarray = order[np.r_[True, table.rows[order][1:] != table.rows[order][:-1]]]
+        label_map: np.ndarray = np.zeros(int(base_labels.max()) + 1, dtype=label_dtype)
+        label_map[table.values_a[table.rows[first]]] = table.values_b[table.columns[first]]
+        changed: np.ndarray = np.flatnonzero(label_map[base_labels] != labels)
+        if changed.shape[0] + label_map.shape[0] <= KEYFRAME_RATIO * labels.shape[0]:
+            record.base = base
+            record.label_map = label_map
+            record.changed_index = changed.astype(narrowest_dtype(labels.shape[0]))
+            record.changed_labels = labels[changed].astype(label_dtype)
+            return record
+    record.full = labels.astype(label_dtype)
+    return record
+
+
+class RunHistory:
+    """
+    История запусков кластеризации с компактным хранением меток и ограничением памяти.
+    При превышении ограничения удаляются самые старые запуски; если удаляемый опорный запуск ещё нужен другим,
+    опорным становится первый из них.
+    """
+    def __init__(self, memory_limit: int = 64 * 1024 * 1024):
+        """
+        :param memory_limit: Ограничение памяти на метки и цвета всех запусков, байты
+        """
+        self.memory_limit: int = memory_limit
+        self.records: List[RunRecord] = []
+        self.current: int = -1
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(record.nbytes for record in self.records)
+
+    def clear(self) -> None:
+        self.records = []
+        self.current = -1
+
+    def add(self,
+            labels: np.ndarray,
+            threshold: float,
+            data_method: ClusterizationDataMethod,
+            random_seed: Optional[int],
+            elapsed: float,
+            cluster_colors: Optional[np.ndarray] = None,
+            metric: DistanceMetric = DistanceMetric.DIAGONAL) -> int:
+        """
+        Добавление запуска в конец истории
+
+        :param labels: Метки (N,), начиная с 1
+        :param threshold: Порог
+        :param data_method: Метод пред-обработки данных
+        :param random_seed: Seed
+        :param elapsed: Время кластеризации, с
+        :param cluster_colors: Цвета кластеров
+        :param metric: Мера расстояния, которой получены метки
+        :return: Номер запуска в истории
+        """
+        base: Optional[RunRecord] = next((record if record.is_keyframe else record.base
+                                          for record in reversed(self.records)), None)
+        record = RunRecord(threshold=threshold, data_method=data_method, random_seed=random_seed,
+                           cluster_count=int(labels.max()) if labels.size else 0, elapsed=elapsed,
+                           cluster_colors=None if cluster_colors is None else cluster_colors.astype(np.float32),
+                           metric=metric)
+        self.records.append(encode_labels(labels, base, record))
+        self.current = len(self.records) - 1
+        self._evict()
+        return self.current
+
+    def _evict(self) -> None:
+        while len(self.records) > 1 and self.nbytes > self.memory_limit:
+            oldest: RunRecord = self.records.pop(0)
+            self.current = max(self.current - 1, 0)
+            dependents: List[RunRecord] = [record for record in self.records if record.base is oldest]
+            if dependents:
+                # Первый зависимый запуск становится опорным, остальные перекодируются относительно него
+                new_base: RunRecord = dependents[0]
+                restored: List[np.ndarray] = [record.labels() for record in dependents]
+                for record, labels in zip(dependents, restored):
+                    record.base = record.full = record.label_map = None
+                    record.changed_index = record.changed_labels = None
+                    encode_labels(labels, None if record is new_base else new_base, record)
+
+    def get(self, index: int) -> RunRecord:
+        return self.records[index]
+
+    def step(self, offset: int) -> Optional[RunRecord]:
+        """
+        Переход по истории
+
+        :param offset: -1 - назад, 1 - вперёд
+        :return: Запись, ставшая текущей, или None, если идти некуда
+        """
+        index: int = self.current + offset
+        if not 0 <= index < len(self.records):
+            return None
+        self.current = index
+        return self.records[index]
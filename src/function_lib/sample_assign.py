@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple, Callable
+
+import numpy as np
+
+from src.enums import UnmatchedPointPolicy
+from src.function_lib.cluster import ClusterState, threshold_pass
+
+# Размер выборки по умолчанию и количество расстояний (точек x кластеров) в части для векторного назначения
+SAMPLE_SIZE = 100_000
+ASSIGN_CHUNK = 1 << 22
+# Количество повторных выборок для точек вне порога при NEW_CLUSTERS
+NEW_CLUSTER_ROUNDS = 4
+
+
+@dataclass
+class SampleAssignResult:
+    labels: np.ndarray
+    sample_size: int
+    # Кластеры, найденные точным алгоритмом на выборке (их статистика заморожена)
+    sample_clusters: int
+    # Доля точек вне выборки, не попавших ни в один кластер, и способ их обработки
+    unmatched_fraction: float
+    unmatched_policy: UnmatchedPointPolicy
+    state: ClusterState
+
+    def __str__(self) -> str:
+        handled: str = {UnmatchedPointPolicy.NEAREST: "назначены ближайшему кластеру",
+                        UnmatchedPointPolicy.NEW_CLUSTERS: "кластеризованы отдельно",
+                        UnmatchedPointPolicy.NOISE: "помечены как шум (0)"}[self.unmatched_policy]
+        return f"выборка {self.sample_size}, кластеров в выборке {self.sample_clusters}, " \
+               f"вне порога {self.unmatched_fraction:.2%} ({handled})"
+
+
+def draw_sample(array_size: int, sample_size: int, random_seed: Optional[int] = None) -> np.ndarray:
+    """
+    Индексы случайной выборки в порядке перебора
+
+    :param array_size: Количество точек
+    :param sample_size: Размер выборки (не больше количества точек)
+    :param random_seed: Seed выборки
+    :return: Индексы точек выборки
+    """
+    return np.random.default_rng(random_seed).choice(array_size, min(sample_size, array_size), replace=False)
+
+
+def assign_frozen(values: np.ndarray, state: ClusterState, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Назначение точек замороженным кластерам: первый по номеру кластер, расстояние до которого не больше порога.
+    Расстояние - то же, что в `euclid_disp`, раскрытое как sum(x^2 w) - 2 x (m w) + sum(m^2 w),
+    поэтому считается одним матричным умножением [x^2, x, 1] на коэффициенты кластеров.
+
+    :param values: Точки (n, d)
+    :param state: Статистика кластеров
+    :param threshold: Порог
+    :return: Метки (n,), начиная с 1 (0 - нет подходящего кластера), и номер ближайшего кластера (n,),
+             начиная с 1, для точек без подходящего кластера (для остальных - 0)
+    """
+    means: np.ndarray = state.means[:state.size]
+    weights: np.ndarray = state.weights[:state.size]
+    coefficients: np.ndarray = np.concatenate((weights, -2 * means * weights,
+                                               (means * means * weights).sum(axis=1)[:, None]), axis=1)
+    features: np.ndarray = np.concatenate((values * values, values, np.ones((values.shape[0], 1))), axis=1)
+    dist: np.ndarray = features @ coefficients.T
+    accepted: np.ndarray = dist <= threshold
+    labels: np.ndarray = accepted.argmax(axis=1)
+    unmatched: np.ndarray = ~accepted[np.arange(labels.shape[0]), labels]
+    labels += 1
+    labels[unmatched] = 0
+    nearest: np.ndarray = np.zeros_like(labels)
+    nearest[unmatched] = dist[unmatched].argmin(axis=1) + 1
+    return labels, nearest
+
+
+def _sample_pass(input_array: np.ndarray,
+                 index: np.ndarray,
+                 threshold: float,
+                 sample_size: int,
+                 random_seed: Optional[int],
+                 workers: Optional[int],
+                 chunk_size: int) -> Tuple[np.ndarray, np.ndarray, int, ClusterState]:
+    """
+    Один проход выборка-назначение по подмножеству точек
+
+    :param input_array: Входной массив (N, d)
+    :param index: Возрастающие индексы точек подмножества
+    :param threshold: Порог
+    :param sample_size: Размер выборки
+    :param random_seed: Seed выборки
+    :param workers: Количество потоков назначения
+    :param chunk_size: Количество расстояний (точек x кластеров) в части
+    :return: Метки подмножества (0 - вне порога), номера ближайших кластеров для точек вне порога,
+             размер выборки и статистика кластеров выборки
+    """
+    labels: np.ndarray = np.zeros(index.shape[0], dtype=int)
+    nearest: np.ndarray = np.zeros(index.shape[0], dtype=int)
+    sample: np.ndarray = draw_sample(index.shape[0], sample_size, random_seed)
+    state = ClusterState(input_array.shape[1])
+    sample_labels: np.ndarray = np.zeros(sample.shape[0], dtype=int)
+    # Выборка читается по возрастанию индексов и переставляется в случайный порядок перебора
+    sorted_sample: np.ndarray = np.sort(sample)
+    threshold_pass(np.asarray(input_array[index[sorted_sample]], dtype=float)[np.searchsorted(sorted_sample, sample)],
+                   threshold, sample_labels, state)
+    labels[sample] = sample_labels
+    if not state.size:
+        return labels, nearest, sample.shape[0], state
+
+    chunk_points: int = max(1024, chunk_size // state.size)
+    rest: np.ndarray = np.ones(index.shape[0], dtype=bool)
+    rest[sample] = False
+    rest_position: np.ndarray = np.flatnonzero(rest)
+
+    def assign(position: int) -> None:
+        part: np.ndarray = rest_position[position:position + chunk_points]
+        # Индексы возрастают, поэтому чтение отображённого массива идёт подряд
+        part_labels, part_nearest = assign_frozen(np.asarray(input_array[index[part]], dtype=float), state,
+                                                  threshold)
+        labels[part] = part_labels
+        nearest[part] = part_nearest
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        list(executor.map(assign, range(0, rest_position.shape[0], chunk_points)))
+    return labels, nearest, sample.shape[0], state
+
+
+def sample_assign_clusterization(input_array: np.ndarray,
+                                 threshold: float,
+                                 sample_size: int = SAMPLE_SIZE,
+                                 random_seed: Optional[int] = None,
+                                 unmatched_policy: UnmatchedPointPolicy = UnmatchedPointPolicy.NEAREST,
+                                 workers: Optional[int] = None,
+                                 chunk_size: int = ASSIGN_CHUNK,
+                                 on_unmatched: Optional[Callable[[int, float, UnmatchedPointPolicy], None]] = None
+                                 ) -> SampleAssignResult:
+    """
+    Приближённая кластеризация больших наборов: точный пороговый алгоритм на случайной выборке, затем
+    остальные точки назначаются частями к кластерам с замороженной статистикой. Массив читается частями,
+    поэтому подходит и для отображённых в память сессий.
+    Точки вне порога при NEW_CLUSTERS кластеризуются тем же способом (не больше NEW_CLUSTER_ROUNDS выборок),
+    точно - только если их не больше размера выборки; оставшиеся после последней выборки - к ближайшему кластеру.
+
+    :param input_array: Входной массив (N, d)
+    :param threshold: Порог
+    :param sample_size: Размер выборки
+    :param random_seed: Seed выборки (порядок выборки - случайный, как в SHUFFLE)
+    :param unmatched_policy: Обработка точек, не попавших ни в один кластер
+    :param workers: Количество потоков назначения. По умолчанию - количество ядер
+    :param chunk_size: Количество расстояний (точек x кластеров) в части
+    :param on_unmatched: Вызывается перед обработкой точек вне порога: их количество, доля и способ обработки
+    :return: Результат с метками в исходном порядке точек
+    """
+    array_size: int = input_array.shape[0]
+    labels, nearest, sample_count, state = _sample_pass(input_array, np.arange(array_size), threshold, sample_size,
+                                                        random_seed, workers, chunk_size)
+    sample_clusters: int = state.size
+    rest_count: int = array_size - sample_count
+    unmatched: np.ndarray = np.flatnonzero(labels == 0)
+    unmatched_fraction: float = unmatched.shape[0] / rest_count if rest_count else 0.0
+    if on_unmatched is not None:
+        on_unmatched(unmatched.shape[0], unmatched_fraction, unmatched_policy)
+    if unmatched.size:
+        if unmatched_policy is UnmatchedPointPolicy.NEAREST:
+            labels[unmatched] = nearest[unmatched]
+        elif unmatched_policy is UnmatchedPointPolicy.NEW_CLUSTERS:
+            # Кластеры оставшихся точек нумеруются после уже найденных
+            offset: int = sample_clusters
+            for attempt in range(NEW_CLUSTER_ROUNDS):
+                if unmatched.shape[0] <= sample_size:
+                    # Точный проход не дороже прохода по выборке
+                    extra_state = ClusterState(input_array.shape[1])
+                    extra_labels: np.ndarray = np.zeros(unmatched.shape[0], dtype=int)
+                    threshold_pass(np.asarray(input_array[unmatched], dtype=float), threshold, extra_labels,
+                                   extra_state)
+                    labels[unmatched] = extra_labels + offset
+                    break
+                part_labels, part_nearest, _, extra_state = _sample_pass(
+                    input_array, unmatched, threshold, sample_size,
+                    None if random_seed is None else random_seed + attempt + 1, workers, chunk_size)
+                matched: np.ndarray = part_labels > 0
+                labels[unmatched[matched]] = part_labels[matched] + offset
+                if attempt == NEW_CLUSTER_ROUNDS - 1:
+                    labels[unmatched[~matched]] = part_nearest[~matched] + offset
+                unmatched = unmatched[~matched]
+                offset += extra_state.size
+    return SampleAssignResult(labels=labels,
+                              sample_size=sample_count,
+                              sample_clusters=sample_clusters,
+                              unmatched_fraction=unmatched_fraction,
+                              unmatched_policy=unmatched_policy,
+                              state=state)
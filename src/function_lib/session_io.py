@@ -0,0 +1,179 @@
+import json
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod, DistanceMetric
+
+SESSION_MAGIC = b'CVLABSES'
+SESSION_VERSION = 1
+SESSION_ALIGN = 64
+# Сигнатура, версия формата, длина JSON-заголовка
+_PREFIX = struct.Struct('<8sII')
+
+
+@dataclass
+class SessionSnapshot:
+    points: np.ndarray
+    labels: Optional[np.ndarray] = None
+    colors: Optional[np.ndarray] = None
+    cluster_colors: Optional[np.ndarray] = None
+    # Истинные метки синтетических данных (0 - шум)
+    truth_labels: Optional[np.ndarray] = None
+    threshold: float = 5.0
+    data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD
+    random_seed: Optional[int] = None
+    metric: DistanceMetric = DistanceMetric.DIAGONAL
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + SESSION_ALIGN - 1) // SESSION_ALIGN * SESSION_ALIGN
+
+
+def _session_params(snapshot: SessionSnapshot) -> Dict[str, Any]:
+    return {'threshold': float(snapshot.threshold),
+            'data_method': snapshot.data_method.name,
+            'random_seed': snapshot.random_seed,
+            'metric': snapshot.metric.name,
+            'extra': snapshot.extra}
+
+
+def _write_header(f, params: Dict[str, Any], layout: Dict[str, Tuple[tuple, np.dtype]]) -> Dict[str, int]:
+    """
+    Запись сигнатуры, версии и JSON-заголовка
+
+    :param f: Файл, открытый на запись
+    :param params: Параметры сессии
+    :param layout: Форма и тип каждого массива
+    :return: Смещение каждого массива в файле
+    """
+    table: Dict[str, Dict[str, Any]] = {name: {'dtype': np.dtype(dtype).str, 'shape': list(shape), 'offset': 0}
+                                        for name, (shape, dtype) in layout.items()}
+    # Смещения зависят от длины заголовка, а длина заголовка - от смещений, поэтому заголовок
+    # дополняется пробелами до размера с запасом
+    header: bytes = json.dumps({'params': params, 'arrays': table}).encode('UTF-8')
+    header_size: int = _aligned(_PREFIX.size + len(header) + 32 * len(table) + 64) - _PREFIX.size
+    offset: int = _PREFIX.size + header_size
+    for name, (shape, dtype) in layout.items():
+        table[name]['offset'] = offset
+        offset = _aligned(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    header = json.dumps({'params': params, 'arrays': table}).encode('UTF-8')
+    assert len(header) <= header_size, "Session header overflow"
+
+    f.write(_PREFIX.pack(SESSION_MAGIC, SESSION_VERSION, header_size))
+    f.write(header.ljust(header_size, b' '))
+    f.truncate(offset)
+    return {name: info['offset'] for name, info in table.items()}
+
+
+def save_session(path: str, snapshot: SessionSnapshot) -> None:
+    """
+    Сохранение сессии в бинарный контейнер: сигнатура и версия, JSON-заголовок с параметрами и таблицей массивов,
+    затем сами массивы, выровненные по 64 байта, чтобы их можно было отобразить в память при загрузке.
+
+    :param path: Путь к файлу
+    :param snapshot: Данные сессии
+    :return: None
+    """
+    arrays: Dict[str, np.ndarray] = {name: np.ascontiguousarray(value) for name, value in
+                                     (('points', snapshot.points), ('labels', snapshot.labels),
+                                      ('colors', snapshot.colors), ('cluster_colors', snapshot.cluster_colors),
+                                      ('truth_labels', snapshot.truth_labels))
+                                     if value is not None}
+    # Массивы могут быть отображены из этого же файла (`load_session`), поэтому запись идёт во временный файл
+    # рядом, который затем заменяет исходный
+    temp_path: str = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            offsets: Dict[str, int] = _write_header(f, _session_params(snapshot),
+                                                    {name: (value.shape, value.dtype)
+                                                     for name, value in arrays.items()})
+            for name, value in arrays.items():
+                f.seek(offsets[name])
+                value.tofile(f)
+        try:
+            os.replace(temp_path, path)
+        except PermissionError as e:
+            # Windows не даёт заменить файл, пока он отображён в память (см. `is_mapped_from`)
+            raise PermissionError(f"Cannot replace {path}: the file is in use, probably mapped by a loaded "
+                                  f"session; save the session to a new path") from e
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def is_mapped_from(array: Optional[np.ndarray], path: str) -> bool:
+    """
+    Отображён ли массив из файла (такой файл нельзя заменить в Windows, пока отображение не закрыто)
+
+    :param array: Массив или None
+    :param path: Путь к файлу
+    :return: True, если массив отображён из этого файла
+    """
+    return isinstance(array, np.memmap) and array.filename is not None and \
+        os.path.normcase(os.path.abspath(array.filename)) == os.path.normcase(os.path.abspath(path))
+
+
+def create_session(path: str,
+                   layout: Dict[str, Tuple[tuple, np.dtype]],
+                   snapshot: Optional[SessionSnapshot] = None) -> Dict[str, np.memmap]:
+    """
+    Создание файла сессии заданного размера для потоковой записи массивов по частям
+
+    :param path: Путь к файлу
+    :param layout: Форма и тип каждого массива, например {'points': ((n, 3), np.float64)}
+    :param snapshot: Параметры сессии (массивы в нём не используются). По умолчанию - параметры по умолчанию
+    :return: Массивы, отображённые в файл на запись
+    """
+    if snapshot is None:
+        snapshot = SessionSnapshot(points=np.zeros((0, 0)))
+    with open(path, 'wb') as f:
+        offsets: Dict[str, int] = _write_header(f, _session_params(snapshot), layout)
+    return {name: np.memmap(path, dtype=dtype, mode='r+', offset=offsets[name], shape=shape)
+            for name, (shape, dtype) in layout.items() if np.prod(shape)}
+
+
+def load_session(path: str, mmap: bool = True) -> SessionSnapshot:
+    """
+    Загрузка сессии. Массивы по умолчанию отображаются в память в режиме копирования при записи,
+    поэтому открытие не зависит от размера данных, а изменения не попадают в файл.
+
+    :param path: Путь к файлу
+    :param mmap: Отобразить массивы в память, иначе прочитать целиком
+    :return: Данные сессии
+    """
+    with open(path, 'rb') as f:
+        magic, version, header_size = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != SESSION_MAGIC:
+            raise ValueError(f"Not a session file: {path}")
+        if version > SESSION_VERSION:
+            raise ValueError(f"Unsupported session version {version} (max {SESSION_VERSION})")
+        header: Dict[str, Any] = json.loads(f.read(header_size).decode('UTF-8'))
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, info in header['arrays'].items():
+        dtype: np.dtype = np.dtype(info['dtype'])
+        shape: tuple = tuple(info['shape'])
+        if not np.prod(shape):
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='c', offset=info['offset'], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                       offset=info['offset']).reshape(shape)
+
+    params: Dict[str, Any] = header['params']
+    return SessionSnapshot(points=arrays['points'],
+                           labels=arrays.get('labels'),
+                           colors=arrays.get('colors'),
+                           cluster_colors=arrays.get('cluster_colors'),
+                           truth_labels=arrays.get('truth_labels'),
+                           threshold=params['threshold'],
+                           data_method=ClusterizationDataMethod[params['data_method']],
+                           random_seed=params['random_seed'],
+                           metric=DistanceMetric[params.get('metric', DistanceMetric.DIAGONAL.name)],
+                           extra=params.get('extra', {}))
@@ -0,0 +1,205 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Sequence
+
+import numpy as np
+
+from src.function_lib.cluster import ClusterState, clusterization_threshold
+from src.function_lib.neighbor_graph import UnionFind
+from src.function_lib.sample_assign import draw_sample
+from src.function_lib.shared_dataset import SharedDataset, SharedArraySpec, attach, detach
+
+# Размер выборки для оценки ширины перекрытия
+MARGIN_SAMPLE = 2000
+# Меньше этого количества точек области кластеризуются в текущем процессе: запуск пула дольше самой кластеризации
+SHARDED_MIN_POINTS = 20_000
+
+
+@dataclass
+class ShardedResult:
+    labels: np.ndarray
+    # Сетка областей по осям и количество точек в каждой области (с перекрытием)
+    grid: Tuple[int, ...]
+    shard_sizes: np.ndarray
+    margin: np.ndarray
+    # Пары кластеров соседних областей с общими точками и сколько из них объединено
+    candidate_pairs: int
+    merged_pairs: int
+
+
+def shard_grid(values: np.ndarray, n_shards: int) -> Tuple[int, ...]:
+    """
+    Количество областей по каждой оси: очередное деление достаётся оси с наибольшим размахом на одну область
+
+    :param values: Точки (N, d)
+    :param n_shards: Желаемое количество областей
+    :return: Количество областей по осям, произведение не больше `n_shards`
+    """
+    span: np.ndarray = np.ptp(values, axis=0) if values.size else np.zeros(values.shape[1])
+    counts: List[int] = [1] * values.shape[1]
+    for factor in _prime_factors(n_shards):
+        axis: int = int(np.argmax(span / np.array(counts)))
+        counts[axis] *= factor
+    return tuple(counts)
+
+
+def _prime_factors(value: int) -> List[int]:
+    factors: List[int] = []
+    divisor: int = 2
+    while divisor * divisor <= value:
+        while value % divisor == 0:
+            factors.append(divisor)
+            value //= divisor
+        divisor += 1
+    if value > 1:
+        factors.append(value)
+    return sorted(factors, reverse=True)
+
+
+def estimate_margin(values: np.ndarray, threshold: float, random_seed: Optional[int] = 0) -> np.ndarray:
+    """
+    Ширина перекрытия по осям - радиус, в котором кластер ещё принимает точку по одной оси: sqrt(threshold * std),
+    где std - медианное отклонение кластеров пробной кластеризации случайной выборки
+
+    :param values: Точки (N, d)
+    :param threshold: Порог
+    :param random_seed: Seed выборки
+    :return: Ширина перекрытия (d,)
+    """
+    sample: np.ndarray = values[np.sort(draw_sample(values.shape[0], MARGIN_SAMPLE, random_seed))]
+    state: ClusterState = ClusterState.from_labels(sample, clusterization_threshold(sample, threshold))
+    std: np.ndarray = state.std[state.counts[:state.size] > 1]
+    return np.sqrt(threshold * (np.median(std, axis=0) if std.size else sample.std(axis=0)))
+
+
+def _cluster_shard(points: np.ndarray,
+                   threshold: float,
+                   index: np.ndarray,
+                   own: np.ndarray,
+                   labels_out: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Кластеризация одной области. Метки собственных точек области записываются в общий буфер `labels_out`
+    (области не пересекаются по собственным точкам), метки точек перекрытия возвращаются для объединения
+
+    :param points: Все точки (N, d)
+    :param threshold: Порог
+    :param index: Индексы точек области с перекрытием (по возрастанию)
+    :param own: Принадлежит ли точка области (иначе - перекрытие)
+    :param labels_out: Буфер меток всех точек (N,)
+    :return: Метки точек перекрытия (начиная с 1), средние и веса расстояния кластеров области
+    """
+    values: np.ndarray = np.asarray(points[index], dtype=float)
+    labels: np.ndarray = clusterization_threshold(values, threshold, compact=True)
+    labels_out[index[own]] = labels[own]
+    state: ClusterState = ClusterState.from_labels(values, labels)
+    return labels[~own], state.means[:state.size].copy(), state.weights[:state.size].copy()
+
+
+def _cluster_shard_shared(points_spec: SharedArraySpec,
+                          labels_spec: SharedArraySpec,
+                          threshold: float,
+                          index: np.ndarray,
+                          own: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    try:
+        return _cluster_shard(attach(points_spec), threshold, index, own, attach(labels_spec))
+    finally:
+        detach(points_spec, labels_spec)
+
+
+def sharded_clusterization(input_array: np.ndarray,
+                           threshold: float,
+                           n_shards: Optional[int] = None,
+                           margin: Optional[Sequence[float]] = None,
+                           workers: Optional[int] = None) -> ShardedResult:
+    """
+    Параллельная пороговая кластеризация по областям пространства. Пространство делится сеткой по квантилям осей,
+    каждая область вместе с полосой перекрытия кластеризуется независимо (прямой порядок точек внутри области),
+    затем кластеры соседних областей с общими точками перекрытия объединяются, если среднее одного из них
+    не дальше порога от другого по мере `euclid_disp`. Точка получает кластер области, которой она принадлежит.
+
+    :param input_array: Входной массив (N, d)
+    :param threshold: Порог
+    :param n_shards: Количество областей. По умолчанию - количество процессов
+    :param margin: Ширина перекрытия по осям. По умолчанию - оценка по выборке (см. `estimate_margin`)
+    :param workers: Количество процессов. По умолчанию - количество ядер, 1 - без пула процессов.
+                    Меньше `SHARDED_MIN_POINTS` точек пул процессов не используется
+    :return: Результат с метками (начиная с 1, по порядку первого появления) в исходном порядке точек
+    """
+    values: np.ndarray = np.asarray(input_array, dtype=float)
+    array_size, dim = values.shape
+    if workers is None:
+        workers = os.cpu_count() or 1
+    grid: Tuple[int, ...] = shard_grid(values, n_shards or workers)
+    if not array_size:
+        return ShardedResult(np.zeros(0, dtype=np.int64), grid, np.zeros(int(np.prod(grid)), dtype=int),
+                             np.zeros(dim), 0, 0)
+    margin_width: np.ndarray = estimate_margin(values, threshold) if margin is None else \
+        np.broadcast_to(np.asarray(margin, dtype=float), (dim,))
+
+    # Границы областей по квантилям - одинаковое количество точек по каждой оси
+    bounds: List[np.ndarray] = [np.quantile(values[:, axis], np.linspace(0, 1, count + 1)[1:-1])
+                                for axis, count in enumerate(grid)]
+    cell: np.ndarray = np.stack([np.searchsorted(bounds[axis], values[:, axis], side='right')
+                                 for axis in range(dim)], axis=1)
+    owner: np.ndarray = np.ravel_multi_index(cell.T, grid)
+
+    # Точки каждой области с перекрытием; индексы возрастают, поэтому прямой порядок сохраняется
+    members: List[np.ndarray] = []
+    for shard in range(int(np.prod(grid))):
+        position: Tuple[int, ...] = np.unravel_index(shard, grid)
+        inside: np.ndarray = np.ones(array_size, dtype=bool)
+        for axis in range(dim):
+            low: float = bounds[axis][position[axis] - 1] - margin_width[axis] if position[axis] else -np.inf
+            high: float = bounds[axis][position[axis]] + margin_width[axis] if position[axis] < grid[axis] - 1 \
+                else np.inf
+            inside &= (values[:, axis] >= low) & (values[:, axis] <= high)
+        members.append(np.flatnonzero(inside))
+
+    owned: List[np.ndarray] = [owner[index] == shard for shard, index in enumerate(members)]
+    if workers == 1 or len(members) == 1 or array_size < SHARDED_MIN_POINTS:
+        local_labels: np.ndarray = np.zeros(array_size, dtype=np.int32)
+        results = [_cluster_shard(values, threshold, index, own, local_labels)
+                   for index, own in zip(members, owned)]
+    else:
+        # Точки и буфер меток - в общей памяти, процессам передаются только индексы областей
+        with SharedDataset(values) as dataset, \
+                ProcessPoolExecutor(max_workers=min(workers, len(members))) as executor:
+            results = list(executor.map(_cluster_shard_shared, [dataset.points_spec] * len(members),
+                                        [dataset.labels_spec] * len(members), [threshold] * len(members),
+                                        members, owned))
+            local_labels = dataset.labels.array.copy()
+
+    # Глобальный номер кластера = смещение области + локальный номер
+    offsets: np.ndarray = np.cumsum([0] + [means.shape[0] for _, means, _ in results])
+    means: np.ndarray = np.concatenate([result[1] for result in results])
+    weights: np.ndarray = np.concatenate([result[2] for result in results])
+    point_cluster: np.ndarray = offsets[owner] + local_labels - 1
+    pair_a: List[np.ndarray] = [point_cluster[index[~own]] for index, own in zip(members, owned)]
+    pair_b: List[np.ndarray] = [offsets[shard] + foreign.astype(np.int64) - 1
+                                for shard, (foreign, _, _) in enumerate(results)]
+
+    forest = UnionFind(int(offsets[-1]))
+    candidate_pairs: int = 0
+    merged_pairs: int = 0
+    if pair_a:
+        pairs: np.ndarray = np.unique(np.stack((np.concatenate(pair_a), np.concatenate(pair_b)), axis=1), axis=0)
+        candidate_pairs = pairs.shape[0]
+        if candidate_pairs:
+            delta: np.ndarray = means[pairs[:, 0]] - means[pairs[:, 1]]
+            close: np.ndarray = ((delta * delta * weights[pairs[:, 0]]).sum(axis=1) <= threshold) | \
+                ((delta * delta * weights[pairs[:, 1]]).sum(axis=1) <= threshold)
+            merged_pairs = int(close.sum())
+            forest.union(pairs[close, 0], pairs[close, 1])
+
+    roots: np.ndarray = forest.find(point_cluster)
+    # Нумерация по первому появлению, как в последовательном проходе
+    _, first, inverse = np.unique(roots, return_index=True, return_inverse=True)
+    rank: np.ndarray = np.empty_like(first)
+    rank[np.argsort(first)] = np.arange(first.shape[0])
+    return ShardedResult(labels=rank[inverse] + 1,
+                         grid=grid,
+                         shard_sizes=np.array([index.shape[0] for index in members]),
+                         margin=margin_width,
+                         candidate_pairs=candidate_pairs,
+                         merged_pairs=merged_pairs)
@@ -0,0 +1,187 @@
+import mmap
+import weakref
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Optional, Tuple, Dict, Callable, Any
+
+import numpy as np
+
+# Массивы, подключённые в текущем процессе до `detach`: имя сегмента или путь файла -> (ресурс, массив)
+_ATTACHED: Dict[tuple, Tuple[Any, np.ndarray]] = {}
+
+
+@dataclass(frozen=True)
+class SharedArraySpec:
+    """
+    Описание общего массива, передаваемое в процессы вместо самих данных
+    """
+    shape: Tuple[int, ...]
+    dtype: str
+    # Сегмент `shared_memory` или файл, отображаемый в память (со смещением)
+    name: Optional[str] = None
+    path: Optional[str] = None
+    offset: int = 0
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    Подключение к существующему сегменту. Процессы пула используют `resource_tracker` родителя, где сегмент
+    уже зарегистрирован владельцем, поэтому снимать регистрацию здесь нельзя - иначе владелец потеряет
+    гарантию удаления сегмента при своём падении
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # noqa, Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach(spec: SharedArraySpec) -> np.ndarray:
+    """
+    Массив по описанию без копирования. Подключение кэшируется до `detach`: процессы пула живут дольше задачи,
+    поэтому задача должна отключить массивы в конце, иначе удалённые владельцем сегменты остаются отображёнными
+
+    :param spec: Описание общего массива
+    :return: Массив поверх общей памяти или файла
+    """
+    key: tuple = (spec.name, spec.path, spec.offset)
+    if key not in _ATTACHED:
+        if spec.name is not None:
+            segment: shared_memory.SharedMemory = _open_segment(spec.name)
+            _ATTACHED[key] = (segment, np.ndarray(spec.shape, dtype=spec.dtype, buffer=segment.buf))
+        else:
+            array: np.ndarray = np.memmap(spec.path, dtype=spec.dtype, mode='r', offset=spec.offset, shape=spec.shape)
+            _ATTACHED[key] = (None, array)
+    return _ATTACHED[key][1]
+
+
+def detach(*specs: SharedArraySpec) -> None:
+    """
+    Отключение массивов, подключённых `attach`. Представления этих массивов после вызова использовать нельзя
+
+    :param specs: Описания общих массивов
+    :return: None
+    """
+    for spec in specs:
+        segment, _ = _ATTACHED.pop((spec.name, spec.path, spec.offset), (None, None))
+        if segment is not None:
+            try:
+                segment.close()
+            except BufferError:
+                # Остались представления (например, в результате задачи) - память освободится вместе с ними
+                pass
+
+
+def call_with_array(function: Callable, spec: SharedArraySpec, *args) -> Any:
+    """
+    Вызов функции с общим массивом первым аргументом - для `executor.map` вместо передачи массива
+
+    :param function: Функция уровня модуля
+    :param spec: Описание общего массива
+    :return: Результат функции
+    """
+    try:
+        return function(attach(spec), *args)
+    finally:
+        detach(spec)
+
+
+def _release(segment: Optional[shared_memory.SharedMemory]) -> None:
+    if segment is None:
+        return
+    # Имя удаляется сразу, память освобождается после исчезновения последнего представления
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        segment.close()
+    except BufferError:
+        pass
+
+
+class SharedArray:
+    """
+    Массив в общей памяти, принадлежащий создавшему процессу. Сегмент удаляется при `close`, выходе из `with`,
+    сборке объекта или завершении процесса, поэтому падение исполнителя не оставляет сегментов.
+    Если упадёт сам владелец, сегмент удалит `resource_tracker`.
+    """
+    def __init__(self, shape: Tuple[int, ...], dtype: Any = np.float64, source: Optional[np.ndarray] = None):
+        """
+        :param shape: Форма массива
+        :param dtype: Тип элементов
+        :param source: Данные для заполнения (копируются один раз). По умолчанию - нули
+        """
+        dtype = np.dtype(dtype)
+        size: int = max(1, int(np.prod(shape)) * dtype.itemsize)
+        self.segment: Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(create=True, size=size)
+        self.array: np.ndarray = np.ndarray(shape, dtype=dtype, buffer=self.segment.buf)
+        if source is not None:
+            self.array[...] = source
+        else:
+            self.array.fill(0)
+        self.spec: SharedArraySpec = SharedArraySpec(tuple(shape), dtype.str, name=self.segment.name)
+        self._finalizer = weakref.finalize(self, _release, self.segment)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> 'SharedArray':
+        """
+        Общий массив из существующего. Массив, отображённый в файл (например, из `load_session`), не копируется:
+        исполнители отображают тот же файл. Изменения копии при записи (режим 'c') им не видны.
+
+        :param array: Исходный массив
+        :return: Общий массив
+        """
+        # Только исходное отображение: у срезов те же `filename` и `offset`, но другие данные
+        if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and array.flags.c_contiguous:
+            shared: SharedArray = cls.__new__(cls)
+            shared.segment = None
+            shared.array = array
+            shared.spec = SharedArraySpec(tuple(array.shape), array.dtype.str, path=array.filename,
+                                          offset=array.offset)
+            shared._finalizer = weakref.finalize(shared, _release, None)
+            return shared
+        return cls(array.shape, array.dtype, np.ascontiguousarray(array))
+
+    def close(self) -> None:
+        """
+        Удаление сегмента. Нужные данные следует скопировать из `array` до вызова
+        """
+        self.array = None
+        self._finalizer()
+
+    def __enter__(self) -> 'SharedArray':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class SharedDataset:
+    """
+    Набор точек для нескольких процессов: входные точки и общий буфер меток, в который исполнители пишут результат
+    """
+    def __init__(self, points: np.ndarray, labels_dtype: Any = np.int32):
+        """
+        :param points: Точки (N, d)
+        :param labels_dtype: Тип меток в выходном буфере
+        """
+        self.points: SharedArray = SharedArray.from_array(points)
+        self.labels: SharedArray = SharedArray((points.shape[0],), labels_dtype)
+
+    @property
+    def points_spec(self) -> SharedArraySpec:
+        return self.points.spec
+
+    @property
+    def labels_spec(self) -> SharedArraySpec:
+        return self.labels.spec
+
+    def close(self) -> None:
+        self.points.close()
+        self.labels.close()
+
+    def __enter__(self) -> 'SharedDataset':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
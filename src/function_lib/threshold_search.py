@@ -0,0 +1,247 @@
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Dict, List, Tuple
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.cluster import ClusterState, threshold_pass, data_order, restore_order
+from src.function_lib.neighbor_graph import neighbor_graph_labels
+
+
+@dataclass
+class ThresholdSearchResult:
+    threshold: float
+    cluster_count: int
+    # Найден ли порог, дающий количество кластеров в заданном диапазоне
+    found: bool
+    labels: np.ndarray
+    # Количество проходов и реально обработанных точек (без переиспользованных)
+    passes: int
+    points_processed: int
+    # Количество кластеров для проверенных порогов. Для прерванных проходов - нижняя граница
+    evaluated: Dict[float, int] = field(default_factory=dict)
+
+
+@dataclass
+class _SearchRun:
+    threshold: float
+    cluster: np.ndarray
+    reject_min: np.ndarray
+    accept_dist: np.ndarray
+    # Позиция, до которой выполнен проход, и количество кластеров (точное, если проход завершён)
+    done: int
+    cluster_count: int
+
+
+class _ThresholdSearcher:
+    """
+    Проходы кластеризации по упорядоченным точкам с переиспользованием ближайших предыдущих проходов
+    """
+    def __init__(self, values: np.ndarray, max_clusters: Optional[int]):
+        self.values: np.ndarray = values
+        self.max_clusters: Optional[int] = max_clusters
+        self.runs: Dict[int, _SearchRun] = {}
+        self.passes: int = 0
+        self.points_processed: int = 0
+
+    def _resume_position(self, run: _SearchRun, threshold: float) -> int:
+        """
+        Первый шаг, решение на котором для нового порога может отличаться от решения в проходе `run`.
+        При большем пороге решение меняется, если какой-то отвергнутый кластер оказался не дальше порога,
+        при меньшем - если расстояние до выбранного кластера стало больше порога.
+        """
+        if threshold >= run.threshold:
+            diverged: np.ndarray = np.flatnonzero(run.reject_min[1:run.done] <= threshold)
+        else:
+            diverged = np.flatnonzero(run.accept_dist[1:run.done] > threshold)
+        return int(diverged[0]) + 1 if diverged.size else run.done
+
+    def evaluate(self, index: int, threshold: float) -> _SearchRun:
+        array_size: int = self.values.shape[0]
+        base: Optional[_SearchRun] = None
+        start: int = 0
+        for run in self.runs.values():
+            position: int = self._resume_position(run, threshold)
+            if position > start:
+                base, start = run, position
+        cluster: np.ndarray = np.zeros(array_size, dtype=int)
+        reject_min: np.ndarray = np.full(array_size, np.inf)
+        accept_dist: np.ndarray = np.full(array_size, -np.inf)
+        if base is not None:
+            cluster[:start] = base.cluster[:start]
+            reject_min[:start] = base.reject_min[:start]
+            accept_dist[:start] = base.accept_dist[:start]
+            state: ClusterState = ClusterState.from_labels(self.values[:start], cluster[:start])
+        else:
+            state = ClusterState(self.values.shape[1])
+        done: int = threshold_pass(self.values, threshold, cluster, state, start, reject_min, accept_dist,
+                                   max_clusters=self.max_clusters)
+        self.passes += 1
+        self.points_processed += done - start
+        run = _SearchRun(threshold, cluster, reject_min, accept_dist, done, state.size)
+        self.runs[index] = run
+        return run
+
+    def keep(self, indexes: Sequence[int]) -> None:
+        self.runs = {index: run for index, run in self.runs.items() if index in indexes}
+
+
+def _search_neighbor_graph(values: np.ndarray,
+                           min_clusters: int,
+                           max_clusters: int,
+                           grid: np.ndarray) -> ThresholdSearchResult:
+    """
+    Бисекция по сетке для графа соседей: ищется наименьший порог, при котором кластеров не больше `max_clusters`.
+    Компоненты меньшего проверенного порога используются как начальные для большего.
+    """
+    evaluated: Dict[int, Tuple[int, np.ndarray]] = {}
+
+    def count(position: int) -> int:
+        lower: List[int] = [index for index in evaluated if index < position]
+        initial: Optional[np.ndarray] = evaluated[max(lower)][1] if lower else None
+        labels: np.ndarray = neighbor_graph_labels(values, grid[position], initial=initial)
+        evaluated[position] = (int(labels.max()) if labels.size else 0, labels)
+        return evaluated[position][0]
+
+    low: int = -1
+    high: int = grid.shape[0]
+    while high - low > 1:
+        middle: int = (low + high) // 2
+        if count(middle) > max_clusters:
+            low = middle
+        else:
+            high = middle
+    candidates: List[int] = [index for index in (low, high) if 0 <= index < grid.shape[0]]
+    answer: int = min(candidates, key=lambda index: min(abs(evaluated[index][0] - min_clusters),
+                                                        abs(evaluated[index][0] - max_clusters)))
+    cluster_count, labels = evaluated[answer]
+    return ThresholdSearchResult(threshold=float(grid[answer]),
+                                 cluster_count=cluster_count,
+                                 found=min_clusters <= cluster_count <= max_clusters,
+                                 labels=labels,
+                                 passes=len(evaluated),
+                                 points_processed=len(evaluated) * values.shape[0],
+                                 evaluated={float(grid[index]): value[0] for index, value in sorted(evaluated.items())})
+
+
+def search_threshold(input_array: np.ndarray,
+                     min_clusters: int,
+                     max_clusters: Optional[int] = None,
+                     thresholds: Optional[Sequence[float]] = None,
+                     data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                     random_seed: Optional[int] = None,
+                     start_threshold: Optional[float] = None) -> ThresholdSearchResult:
+    """
+    Подбор порога по желаемому количеству кластеров (галопирующий поиск и бисекция по сетке порогов).
+    Считается, что количество кластеров не растёт с ростом порога. Проход прерывается, как только кластеров
+    становится больше `max_clusters`, а новые проходы продолжаются с первого отличающегося шага ближайшего
+    уже выполненного прохода.
+
+    :param input_array: Входной массив
+    :param min_clusters: Минимальное количество кластеров
+    :param max_clusters: Максимальное количество кластеров. По умолчанию равно `min_clusters`
+    :param thresholds: Сетка порогов. По умолчанию - шкала слайдера 0.1..100.0 с шагом 0.1
+    :param data_method: Метод пред-обработки данных
+    :param random_seed: Seed для случайного перемешивания точек. По умолчанию отключено
+    :param start_threshold: Порог, с которого начинается поиск. По умолчанию - середина сетки
+    :return: Результат поиска. Если подходящего порога нет, возвращается ближайший по количеству кластеров
+    """
+    if max_clusters is None:
+        max_clusters = min_clusters
+    assert 1 <= min_clusters <= max_clusters, "Wrong cluster count range"
+    input_array = np.asarray(input_array, dtype=float)
+    grid: np.ndarray = np.unique(np.asarray(thresholds if thresholds is not None else np.arange(1, 1001) / 10,
+                                            dtype=float))
+    if data_method is ClusterizationDataMethod.NEIGHBOR_GRAPH:
+        return _search_neighbor_graph(input_array, min_clusters, max_clusters, grid)
+    indexes: np.ndarray = data_order(input_array.shape[0], data_method, random_seed)
+    if data_method is not ClusterizationDataMethod.FORWARD:
+        input_array = input_array[indexes]
+
+    searcher = _ThresholdSearcher(input_array, max_clusters)
+    # Количество кластеров и позиция остановки для каждого проверенного индекса сетки
+    evaluated: Dict[int, Tuple[int, int]] = {}
+
+    def check(position: int) -> int:
+        """
+        :return: 0 - количество в диапазоне, 1 - кластеров слишком много, -1 - слишком мало
+        """
+        run: _SearchRun = searcher.evaluate(position, grid[position])
+        evaluated[position] = (run.cluster_count, run.done)
+        if run.cluster_count > max_clusters:
+            return 1
+        if run.cluster_count < min_clusters:
+            return -1
+        return 0
+
+    position: int = grid.shape[0] // 2 if start_threshold is None else \
+        int(np.abs(grid - start_threshold).argmin())
+    # Галопирующий поиск границ: low - порог, где кластеров слишком много, high - слишком мало
+    low: int = -1
+    high: int = grid.shape[0]
+    answer: Optional[int] = None
+    direction: int = check(position)
+    if direction == 0:
+        answer = position
+    else:
+        step: int = 1
+        previous: int = position
+        while answer is None:
+            if direction > 0:
+                low = previous
+                position = min(previous + step, grid.shape[0] - 1)
+            else:
+                high = previous
+                position = max(previous - step, 0)
+            if position == previous:
+                break
+            searcher.keep([previous])
+            current: int = check(position)
+            if current == 0:
+                answer = position
+            elif current != direction:
+                if current > 0:
+                    low = position
+                else:
+                    high = position
+                break
+            previous = position
+            step *= 2
+
+    # Бисекция внутри найденных границ
+    while answer is None and high - low > 1 and low >= 0 and high < grid.shape[0]:
+        searcher.keep([low, high])
+        middle: int = (low + high) // 2
+        current = check(middle)
+        if current == 0:
+            answer = middle
+        elif current > 0:
+            low = middle
+        else:
+            high = middle
+
+    found: bool = answer is not None
+    if answer is None:
+        # Ближайшие к диапазону пороги по обе стороны; прерванный проход даёт лишь нижнюю границу количества
+        candidates: List[int] = [index for index in (low, high) if 0 <= index < grid.shape[0]]
+        if len(candidates) == 2 and evaluated[low][1] < input_array.shape[0]:
+            candidates = [high]
+        answer = min(candidates, key=lambda index: min(abs(evaluated[index][0] - min_clusters),
+                                                       abs(evaluated[index][0] - max_clusters)))
+
+    # Ответ дополняется до полного прохода, если был прерван или уже вытеснен из кэша
+    searcher.max_clusters = None
+    best: Optional[_SearchRun] = searcher.runs.get(answer)
+    if best is None or best.done < input_array.shape[0]:
+        best = searcher.evaluate(answer, grid[answer])
+    labels: np.ndarray = best.cluster
+    if data_method is not ClusterizationDataMethod.FORWARD:
+        labels = restore_order(labels, indexes)
+    return ThresholdSearchResult(threshold=float(best.threshold),
+                                 cluster_count=int(labels.max()) if labels.size else 0,
+                                 found=found,
+                                 labels=labels,
+                                 passes=searcher.passes,
+                                 points_processed=searcher.points_processed,
+                                 evaluated={float(grid[index]): count for index, (count, _) in
+                                            sorted(evaluated.items())})
@@ -0,0 +1,166 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, List, Sequence, Tuple
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.cluster import ClusterState, threshold_pass, data_order, restore_order
+from src.function_lib.neighbor_graph import neighbor_graph_labels
+from src.function_lib.label_comparison import adjusted_rand_index
+from src.function_lib.shared_dataset import SharedArray, call_with_array
+
+
+@dataclass
+class ThresholdSweepResult:
+    thresholds: np.ndarray
+    cluster_count: np.ndarray
+    # Размеры кластеров для каждого порога (по убыванию)
+    cluster_sizes: List[np.ndarray]
+    # ARI с разбиением на предыдущем пороге (для первого порога - 1.0)
+    stability: np.ndarray
+    # Количество шагов, взятых из прогона на предыдущем пороге без пересчёта
+    reused_steps: np.ndarray
+    labels: Optional[np.ndarray] = None
+
+    def size_quantiles(self, q: Sequence[float] = (0.0, 0.25, 0.5, 0.75, 1.0)) -> np.ndarray:
+        """
+        Квантили распределения размеров кластеров для каждого порога
+
+        :param q: Уровни квантилей
+        :return: Массив (T, len(q))
+        """
+        return np.array([np.quantile(sizes, q) for sizes in self.cluster_sizes])
+
+
+def _sweep_chunk(values: np.ndarray,
+                 thresholds: np.ndarray,
+                 keep_labels: bool) -> Tuple[list, np.ndarray, np.ndarray]:
+    """
+    Прогон упорядоченных точек по возрастающей сетке порогов с переиспользованием работы.
+
+    При росте порога решения шагов не меняются, пока все отвергнутые ранее кластеры остаются дальше нового порога,
+    поэтому следующий прогон продолжается с первого шага, где минимальное отвергнутое расстояние не больше порога.
+
+    :param values: Упорядоченные точки (N, d)
+    :param thresholds: Пороги по возрастанию
+    :param keep_labels: Возвращать метки для каждого порога, иначе только для первого и последнего
+    :return: Список (количество кластеров, размеры, ARI с предыдущим, шагов переиспользовано, метки или None),
+             метки на первом и последнем пороге
+    """
+    array_size: int = values.shape[0]
+    reject_min: np.ndarray = np.full(array_size, np.inf)
+    cluster: Optional[np.ndarray] = None
+    first_labels: Optional[np.ndarray] = None
+    rows: list = []
+    for threshold in thresholds:
+        if cluster is None:
+            start: int = 0
+            previous: Optional[np.ndarray] = None
+        else:
+            diverged: np.ndarray = np.flatnonzero(reject_min[1:] <= threshold)
+            start = int(diverged[0]) + 1 if diverged.size else array_size
+            previous = cluster
+        new_cluster: np.ndarray = np.zeros(array_size, dtype=int)
+        if start < array_size:
+            if previous is not None:
+                new_cluster[:start] = previous[:start]
+                state = ClusterState.from_labels(values[:start], new_cluster[:start])
+            else:
+                state = ClusterState(values.shape[1])
+            threshold_pass(values, threshold, new_cluster, state, start, reject_min)
+        else:
+            new_cluster[:] = previous
+        sizes: np.ndarray = np.sort(np.bincount(new_cluster)[1:])[::-1]
+        stability: float = 1.0 if previous is None or start == array_size else \
+            adjusted_rand_index(previous, new_cluster)
+        rows.append((sizes.shape[0], sizes, stability, start if previous is not None else 0,
+                     new_cluster if keep_labels else None))
+        cluster = new_cluster
+        if first_labels is None:
+            first_labels = new_cluster
+    return rows, first_labels, cluster
+
+
+def _graph_sweep_chunk(values: np.ndarray,
+                       thresholds: np.ndarray,
+                       keep_labels: bool) -> Tuple[list, np.ndarray, np.ndarray]:
+    """
+    Перебор порогов для графа соседей: с ростом порога компоненты только укрупняются,
+    поэтому каждый следующий порог начинается с компонент предыдущего.
+    Формат результата - как у `_sweep_chunk`, переиспользованных шагов нет.
+    """
+    cluster: Optional[np.ndarray] = None
+    first_labels: Optional[np.ndarray] = None
+    rows: list = []
+    for threshold in thresholds:
+        new_cluster: np.ndarray = neighbor_graph_labels(values, threshold, initial=cluster)
+        sizes: np.ndarray = np.sort(np.bincount(new_cluster)[1:])[::-1]
+        stability: float = 1.0 if cluster is None else adjusted_rand_index(cluster, new_cluster)
+        rows.append((sizes.shape[0], sizes, stability, 0, new_cluster if keep_labels else None))
+        cluster = new_cluster
+        if first_labels is None:
+            first_labels = new_cluster
+    return rows, first_labels, cluster
+
+
+def threshold_sweep(input_array: np.ndarray,
+                    thresholds: Sequence[float],
+                    data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                    random_seed: Optional[int] = None,
+                    workers: Optional[int] = None,
+                    keep_labels: bool = False) -> ThresholdSweepResult:
+    """
+    Пороговая кластеризация по сетке порогов за один вызов.
+    Сетка делится на непрерывные участки по процессам, внутри участка соседние пороги переиспользуют общий
+    префикс решений.
+
+    :param input_array: Входной массив
+    :param thresholds: Сетка порогов
+    :param data_method: Метод пред-обработки данных
+    :param random_seed: Seed для случайного перемешивания точек. По умолчанию отключено
+    :param workers: Количество процессов. По умолчанию - количество ядер, 1 - без пула процессов
+    :param keep_labels: Сохранить метки (в исходном порядке точек) для каждого порога
+    :return: Результат перебора, упорядоченный по возрастанию порога
+    """
+    input_array = np.asarray(input_array, dtype=float)
+    grid: np.ndarray = np.unique(np.asarray(thresholds, dtype=float))
+    indexes: np.ndarray = data_order(input_array.shape[0], data_method, random_seed)
+    if data_method is not ClusterizationDataMethod.FORWARD:
+        input_array = input_array[indexes]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, grid.shape[0]))
+    chunks: List[np.ndarray] = np.array_split(grid, workers)
+    sweep_chunk = _graph_sweep_chunk if data_method is ClusterizationDataMethod.NEIGHBOR_GRAPH else _sweep_chunk
+    if workers == 1:
+        chunk_results = [sweep_chunk(input_array, chunks[0], keep_labels)]
+    else:
+        # Точки передаются процессам через общую память, а не копией в каждую задачу
+        with SharedArray.from_array(input_array) as shared, ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(call_with_array, [sweep_chunk] * workers, [shared.spec] * workers,
+                                              chunks, [keep_labels] * workers))
+
+    rows: list = []
+    last_labels: Optional[np.ndarray] = None
+    for chunk_rows, first_labels, chunk_last_labels in chunk_results:
+        if last_labels is not None and chunk_rows:
+            # Стабильность на границе участков считается по меткам соседних порогов из разных процессов
+            count, sizes, _, _, labels = chunk_rows[0]
+            chunk_rows[0] = (count, sizes, adjusted_rand_index(last_labels, first_labels), 0, labels)
+        rows.extend(chunk_rows)
+        last_labels = chunk_last_labels
+
+    labels: Optional[np.ndarray] = None
+    if keep_labels:
+        labels = np.array([row[4] for row in rows])
+        if data_method is not ClusterizationDataMethod.FORWARD:
+            labels = np.array([restore_order(row, indexes) for row in labels])
+    return ThresholdSweepResult(thresholds=grid,
+                                cluster_count=np.array([row[0] for row in rows]),
+                                cluster_sizes=[row[1] for row in rows],
+                                stability=np.array([row[2] for row in rows]),
+                                reused_steps=np.array([row[3] for row in rows]),
+                                labels=labels)
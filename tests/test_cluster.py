@@ -0,0 +1,127 @@
+import unittest
+from typing import Optional
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.assignment_trace import record_trace
+from src.function_lib.batch_cluster import batch_clusterization
+from src.function_lib.cluster import clusterization_threshold, euclid_disp
+from src.function_lib.run_history import RunHistory
+from src.function_lib.threshold_search import search_threshold
+from src.function_lib.threshold_sweep import threshold_sweep
+
+SEQUENTIAL_METHODS = (ClusterizationDataMethod.FORWARD, ClusterizationDataMethod.REVERSE,
+                      ClusterizationDataMethod.SHUFFLE)
+
+
+def reference_clusterization(input_array: np.ndarray,
+                             threshold: float,
+                             data_method: ClusterizationDataMethod = ClusterizationDataMethod.FORWARD,
+                             random_seed: Optional[int] = None) -> np.ndarray:
+    """
+    Исходная реализация порогового метода: статистика кластера пересчитывается `euclid_disp` по всем его точкам
+
+    :param input_array: Входной массив
+    :param threshold: Порог
+    :param data_method: Метод пред-обработки данных
+    :param random_seed: Seed для SHUFFLE
+    :return: Метки кластеров (начиная с 1) в исходном порядке точек
+    """
+    array_size: int = input_array.shape[0]
+    cluster: np.ndarray = np.zeros(array_size, dtype=int)
+    indexes: np.ndarray = np.arange(array_size)
+    if data_method is ClusterizationDataMethod.SHUFFLE:
+        np.random.seed(random_seed)
+        np.random.shuffle(indexes)
+    elif data_method is ClusterizationDataMethod.REVERSE:
+        indexes = indexes[::-1]
+    values: np.ndarray = input_array[indexes]
+    cluster[0] = 1
+    for elem_index, elem_val in enumerate(values[1:]):
+        for cluster_index in range(1, cluster.max() + 1):
+            if np.abs(euclid_disp(elem_val, values[cluster == cluster_index])) <= threshold:
+                cluster[elem_index + 1] = cluster_index
+                break
+        else:
+            cluster[elem_index + 1] = cluster.max() + 1
+    restored: np.ndarray = np.empty_like(cluster)
+    restored[indexes] = cluster
+    return restored
+
+
+class ClusterizationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.points: np.ndarray = np.random.default_rng(0).normal(0, 3, (200, 3))
+        self.thresholds: np.ndarray = np.array([0.5, 2.0, 5.0, 10.0])
+
+    def test_matches_reference_implementation(self) -> None:
+        for data_method in SEQUENTIAL_METHODS:
+            for threshold in self.thresholds:
+                with self.subTest(data_method=data_method.name, threshold=threshold):
+                    expected: np.ndarray = reference_clusterization(self.points, threshold, data_method, 7)
+                    np.testing.assert_array_equal(
+                        clusterization_threshold(self.points, threshold, data_method, 7), expected)
+                    np.testing.assert_array_equal(
+                        clusterization_threshold(self.points, threshold, data_method, 7, compact=True), expected)
+
+    def test_sweep_matches_direct_runs(self) -> None:
+        for data_method in SEQUENTIAL_METHODS:
+            for workers in (1, 2):
+                with self.subTest(data_method=data_method.name, workers=workers):
+                    result = threshold_sweep(self.points, self.thresholds, data_method, 7, workers=workers,
+                                             keep_labels=True)
+                    for threshold, labels, count in zip(result.thresholds, result.labels, result.cluster_count):
+                        expected: np.ndarray = clusterization_threshold(self.points, threshold, data_method, 7)
+                        np.testing.assert_array_equal(labels, expected)
+                        self.assertEqual(count, expected.max())
+
+    def test_search_matches_direct_run(self) -> None:
+        for data_method in SEQUENTIAL_METHODS:
+            with self.subTest(data_method=data_method.name):
+                result = search_threshold(self.points, 20, 40, data_method=data_method, random_seed=7)
+                expected: np.ndarray = clusterization_threshold(self.points, result.threshold, data_method, 7)
+                self.assertTrue(result.found)
+                self.assertTrue(20 <= result.cluster_count <= 40)
+                np.testing.assert_array_equal(result.labels, expected)
+
+    def test_batch_matches_direct_runs(self) -> None:
+        offsets: np.ndarray = np.array([0, 1, 40, 40, 120, 200])
+        thresholds: np.ndarray = np.array([2.0, 0.5, 1.0, 5.0, 2.0])
+        for data_method in SEQUENTIAL_METHODS:
+            for workers in (1, 2):
+                with self.subTest(data_method=data_method.name, workers=workers):
+                    labels: np.ndarray = batch_clusterization(self.points, offsets, thresholds, data_method, 7,
+                                                              workers=workers, batch_sets=2)
+                    for start, end, threshold in zip(offsets[:-1], offsets[1:], thresholds):
+                        np.testing.assert_array_equal(
+                            labels[start:end],
+                            clusterization_threshold(self.points[start:end], threshold, data_method, 7))
+
+    def test_trace_matches_direct_run(self) -> None:
+        for data_method in SEQUENTIAL_METHODS:
+            with self.subTest(data_method=data_method.name):
+                trace = record_trace(self.points, 2.0, data_method, 7, checkpoint_every=16)
+                expected: np.ndarray = clusterization_threshold(self.points, 2.0, data_method, 7)
+                np.testing.assert_array_equal(trace.labels_at(len(trace)), expected)
+                state = trace.state_at(len(trace))
+                self.assertEqual(state.size, expected.max())
+
+    def test_history_restores_labels(self) -> None:
+        history = RunHistory()
+        runs: list = []
+        for threshold in (2.0, 2.5, 10.0, 0.5, 2.0):
+            labels: np.ndarray = clusterization_threshold(self.points, threshold)
+            runs.append(labels)
+            history.add(labels, threshold, ClusterizationDataMethod.FORWARD, None, 0.0)
+        for index, labels in enumerate(runs):
+            np.testing.assert_array_equal(history.get(index).labels(), labels)
+        # Удаление старых запусков перекодирует зависимые от них
+        history.memory_limit = history.nbytes - 1
+        history._evict()
+        for record, labels in zip(history.records, runs[-len(history):]):
+            np.testing.assert_array_equal(record.labels(), labels)
+
+
+if __name__ == '__main__':
+    unittest.main()
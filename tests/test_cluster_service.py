@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.cluster import clusterization_threshold
+from src.function_lib.cluster_service import ClusterService, ClusterJob, cluster_remote
+
+
+class ClusterServiceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.points: np.ndarray = np.random.default_rng(0).normal(0, 3, (500, 3))
+
+    def test_round_trip_matches_local_clusterization(self) -> None:
+        service = ClusterService(port=0, workers=2).start()
+        try:
+            for data_method, random_seed in ((ClusterizationDataMethod.FORWARD, None),
+                                             (ClusterizationDataMethod.REVERSE, None),
+                                             (ClusterizationDataMethod.SHUFFLE, 7),
+                                             (ClusterizationDataMethod.NEIGHBOR_GRAPH, None)):
+                with self.subTest(data_method=data_method.name):
+                    labels, report = cluster_remote(service.url, self.points, 2.0, data_method, random_seed)
+                    expected: np.ndarray = clusterization_threshold(self.points, 2.0, data_method, random_seed)
+                    np.testing.assert_array_equal(labels, expected)
+                    self.assertGreaterEqual(report['latency_ms'], report['compute_ms'])
+        finally:
+            service.stop()
+
+    def test_stop_fails_queued_jobs(self) -> None:
+        service = ClusterService(port=0, workers=1, use_processes=False)
+        jobs = [ClusterJob(points=self.points, threshold=2.0, data_method=ClusterizationDataMethod.FORWARD,
+                           random_seed=None) for _ in range(3)]
+        for job in jobs:
+            self.assertTrue(service.submit(job))
+        service.stop()
+        for job in jobs:
+            self.assertTrue(job.done.is_set())
+            self.assertIsNotNone(job.error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from src.enums import ClusterizationDataMethod
+from src.function_lib.cluster import disp_weights
+from src.function_lib.neighbor_graph import neighbor_graph_labels, canonical_labels, UnionFind
+from src.function_lib.threshold_search import search_threshold
+from src.function_lib.threshold_sweep import threshold_sweep
+
+
+def brute_force_labels(values: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Компоненты связности по всем парам точек
+
+    :param values: Точки (N, d)
+    :param threshold: Порог
+    :return: Метки (N,), начиная с 1, в нумерации `canonical_labels`
+    """
+    scaled: np.ndarray = values * np.sqrt(disp_weights(values.std(axis=0))[0])
+    distance: np.ndarray = ((scaled[:, None, :] - scaled[None, :, :]) ** 2).sum(axis=2)
+    first, second = np.nonzero(distance <= threshold)
+    forest = UnionFind(values.shape[0])
+    forest.union(first, second)
+    return canonical_labels(values, forest.roots())
+
+
+class NeighborGraphTest(unittest.TestCase):
+    def test_matches_brute_force(self) -> None:
+        rng = np.random.default_rng(0)
+        for dim in (1, 2, 3, 4, 6, 12):
+            values: np.ndarray = rng.normal(0, 3, (300, dim))
+            # Дубликаты точек и точки ровно на пороге
+            values[1] = values[0]
+            for threshold in (0.0, 0.05 * dim, 0.3 * dim, 1.0 * dim):
+                with self.subTest(dim=dim, threshold=threshold):
+                    np.testing.assert_array_equal(neighbor_graph_labels(values, threshold),
+                                                  brute_force_labels(values, threshold))
+
+    def test_initial_labels_only_merge(self) -> None:
+        values: np.ndarray = np.random.default_rng(1).normal(0, 3, (300, 3))
+        np.testing.assert_array_equal(
+            neighbor_graph_labels(values, 1.0, initial=neighbor_graph_labels(values, 0.3)),
+            brute_force_labels(values, 1.0))
+
+    def test_sweep_and_search_match_direct_runs(self) -> None:
+        values: np.ndarray = np.random.default_rng(2).normal(0, 3, (300, 3))
+        thresholds: np.ndarray = np.array([0.1, 0.3, 0.6, 1.0])
+        result = threshold_sweep(values, thresholds, ClusterizationDataMethod.NEIGHBOR_GRAPH, workers=1,
+                                 keep_labels=True)
+        for threshold, labels in zip(result.thresholds, result.labels):
+            np.testing.assert_array_equal(labels, brute_force_labels(values, threshold))
+        search = search_threshold(values, 20, 60, data_method=ClusterizationDataMethod.NEIGHBOR_GRAPH)
+        np.testing.assert_array_equal(search.labels, brute_force_labels(values, search.threshold))
+
+    def test_projected_grid_rejects_dense_graph(self) -> None:
+        values: np.ndarray = np.random.default_rng(3).normal(0, 1, (9000, 10))
+        with self.assertRaises(ValueError):
+            neighbor_graph_labels(values, 1e6)
+
+
+if __name__ == '__main__':
+    unittest.main()